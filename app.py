@@ -3,38 +3,90 @@
 # ----------------------------------------------------------------------------#
 
 import dateutil.parser
-from datetime import datetime
+from datetime import datetime, timezone
 import babel
-from collections import defaultdict
-from flask import render_template, request, flash, redirect, url_for
+import babel.dates
+from bisect import bisect_left
+from functools import lru_cache, wraps
+import hmac
+import json
+from operator import itemgetter
+from flask import render_template, request, flash, redirect, url_for, abort, jsonify
 import logging
 from logging import Formatter, FileHandler
-from sqlalchemy import text
+from sqlalchemy import delete, select, tuple_
 
 # from flask_wtf import Form
 from forms import VenueForm, ArtistForm, ShowForm
-from models import Venue, Artist, Show, db, app
+from models import Venue, Artist, Show, Area, db, app, invalidate_after_commit
+from search import fallback_indexes, search
+from cache import detail_cache, cached
+from http_cache import conditional, mark_written, table_versions
+import instrumentation  # noqa: F401, registers the per-request timings
+# also register the listeners maintaining the upcoming show counters and the venue directory
+from show_counters import counterpart, counterpart_ids, refresh_show_counters
+from areas import adjust_areas, area_counts, directory, group_areas
+from metrics import render_metrics
+from routing import primary_reads, replica_reads
+import async_api  # noqa: F401, registers the async JSON API
+import compression  # noqa: F401, compresses the responses
+from serializers import model_serializer
+from shows import decode_show_cursor, encode_show_cursor, show_projection
+from scheduling import SchedulingError, calendar_index, read_csv, schedule_shows
 
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
+# named formats accepted by the datetime filter
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    """
+    Resolves and compiles a format once per (format, locale)
+    Returns:
+      Tuple (babel DateTimePattern, babel Locale)
+    """
+    pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    return pattern, babel.Locale.parse(locale)
+
+
+def parse_datetime(value):
+    """Returns a datetime object from a str, ISO 8601 strings take a fast path"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+
+def format_datetime(value, format='medium', locale='en'):
     """Converts a datetime object or string to a formatted string"""
+    # aware datetimes of the same instant are equal, and hash alike, whatever
+    # their zone: the zone is part of the memo key
+    return memoized_format_datetime(value, getattr(value, 'tzinfo', None), format, locale)
+
+
+@lru_cache(maxsize=4096)
+def memoized_format_datetime(value, tzinfo, format, locale):
     if isinstance(value, str):
         # returns a datetime object from a str
-        date = dateutil.parser.parse(value)
+        date = parse_datetime(value)
     else:
         # already datetime                                               #
         # ADJUSTED to allow datetime object
         date = value
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
+    if date.tzinfo is None:
+        # like babel.dates.format_datetime, naive datetimes are taken as UTC
+        date = date.replace(tzinfo=timezone.utc)
+    pattern, locale = datetime_pattern(format, locale)
     # babel takes a datime object and returns a string
-    return babel.dates.format_datetime(date, format, locale='en')
+    return pattern.apply(date, locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -44,53 +96,231 @@ app.jinja_env.filters['datetime'] = format_datetime
 # Helper functions.
 # ----------------------------------------------------------------------------#
 
-def class_to_dict(cls):
+def split_shows(rows, now):
     """
-    Converts a SQLAlchemy model instance to a dictionary.
+    Splits show rows into past and upcoming shows in one pass
+    Args:
+      rows: iterable of rows with a start_time attribute
+      now: datetime, shows starting at or after this time are upcoming
+    Returns:
+      Tuple (past_shows[List], upcoming_shows[List]), both keep input order
+    """
+    past_shows, upcoming_shows = [], []
+    for row in rows:
+        if row.start_time >= now:
+            upcoming_shows.append(row)
+        else:
+            past_shows.append(row)
+    return past_shows, upcoming_shows
+
+
+def venue_detail(venue_id):
+    """
+    Builds the venue page data with past and upcoming shows
     Returns:
-    Dict of key:value pairs from SQLAlchemy model instance.
+      Dict[venue columns, past_shows[List[Dict]], upcoming_shows[List[Dict]], past_shows_count[int], upcoming_shows_count[int]],
+      None if the venue does not exist
     """
-    return {c.key: getattr(cls, c.key) for c in cls.__table__.columns}
+    # plain column rows: nothing for the identity map to track on a read
+    venue = db.session.query(*Venue.__table__.columns).filter(
+        Venue.id == venue_id).one_or_none()
+    if venue is None:
+        return None
+    # artist details come with the shows from one joined query
+    past_shows, upcoming_shows = split_shows(
+        db.session.execute(show_projection(Show.venue_id == venue_id)), datetime.now())
+
+    data = model_serializer(Venue)(venue)
+    data['past_shows'] = [show._asdict() for show in past_shows]
+    data['upcoming_shows'] = [show._asdict() for show in upcoming_shows]
+    data['past_shows_count'] = len(past_shows)
+    data['upcoming_shows_count'] = len(upcoming_shows)
+    return data
 
 
-def show_details(show_id, image):
+def artist_detail(artist_id):
+    """
+    Builds the artist page data with past and upcoming shows
+    Returns:
+      Dict[artist columns, past_shows[List[Dict]], upcoming_shows[List[Dict]], past_shows_count[int], upcoming_shows_count[int]],
+      None if the artist does not exist
     """
-    Converts a Show instance to a dictionary
+    # plain column rows: nothing for the identity map to track on a read
+    artist = db.session.query(*Artist.__table__.columns).filter(
+        Artist.id == artist_id).one_or_none()
+    if artist is None:
+        return None
+    # venue details come with the shows from one joined query
+    past_shows, upcoming_shows = split_shows(
+        db.session.execute(show_projection(Show.artist_id == artist_id)), datetime.now())
+
+    data = model_serializer(Artist)(artist)
+    data['past_shows'] = [show._asdict() for show in past_shows]
+    data['upcoming_shows'] = [show._asdict() for show in upcoming_shows]
+    data['past_shows_count'] = len(past_shows)
+    data['upcoming_shows_count'] = len(upcoming_shows)
+    return data
+
+
+def split_ttl(data):
+    """
+    Seconds cached page data is stored for: CACHE_TTL, or less when its
+    earliest upcoming show starts before, as its split then moves
+    Args:
+      data: Dict built by venue_detail or artist_detail
+    """
+    ttl = app.config['CACHE_TTL']
+    if data['upcoming_shows']:
+        starts_in = (data['upcoming_shows'][0]['start_time'] - datetime.now()).total_seconds()
+        ttl = max(0, min(ttl, starts_in))
+    return ttl
+
+
+def refresh_split(cache, key, data, now):
+    """
+    Keeps the past/upcoming split of cached page data exact without querying
+    shows again. The split only changes when the earliest upcoming show
+    starts, which the entry expires with (see split_ttl), but Redis expires
+    whole seconds: until then data is returned as is, afterwards the shows
+    that have started are moved from upcoming to past in memory and the
+    cache entry is dropped, to be rebuilt by the next request (storing the
+    updated data would restart its TTL, so it would never expire).
     Args:
-      show_id: int, id of the show to convert
-      image: str, 'venue' or 'artist', determines which image and info to return
+      cache: cache holding data under key
+      data: Dict built by venue_detail or artist_detail
+      now: datetime, shows starting at or after this time are upcoming
     Returns:
-      Dict with keys artist_id, artist_name, artist_image_link, start_time.
+      Dict data with an up to date split
     """
-    selected_show = db.session.get(Show, show_id)
-    start_time = selected_show.start_time
-    artist_id = selected_show.artist_id
-    artist = db.session.get(Artist, artist_id)
-    artist_name = artist.name
-    if image == 'venue':          # displays show details on artist page
-        venue = db.session.get(Venue, selected_show.venue_id)
-        venue_image_link = venue.image_link
-        venue_name = venue.name
-        return {
-            "venue_image_link": venue_image_link,
-            # allows to display the venue name in the show details on artist
-            # page
-            "venue_name": venue_name,
-            "start_time": start_time,
-            # allows to navigate to the venue page from the artist page by
-            # clicking on a show venue name link
-            "venue_id": selected_show.venue_id
-        }
-    else:  # image == 'artist':    # displays show details on venue page
-        artist_image_link = artist.image_link
-        return {
-            # allows to navigate to the artist page from the venue page by
-            # clicking on a show artist name link
-            "artist_id": artist_id,
-            "artist_name": artist_name,
-            "artist_image_link": artist_image_link,
-            "start_time": start_time
-        }
+    upcoming_shows = data['upcoming_shows']
+    if not upcoming_shows or upcoming_shows[0]['start_time'] >= now:
+        return data
+    # upcoming shows are ordered by start_time
+    started = bisect_left(upcoming_shows, now, key=itemgetter('start_time'))
+    data = dict(data)
+    data['past_shows'] = data['past_shows'] + upcoming_shows[:started]
+    data['upcoming_shows'] = upcoming_shows[started:]
+    data['past_shows_count'] = len(data['past_shows'])
+    data['upcoming_shows_count'] = len(data['upcoming_shows'])
+    cache.delete(key)
+    return data
+
+
+def venue_page_keys(venue_id):
+    """
+    Cache keys of the pages showing a venue: its own page and the pages of
+    the artists playing there, which display the venue name and image
+    """
+    artist_ids = db.session.query(Show.artist_id).filter(
+        Show.venue_id == venue_id).distinct()
+    return [('venue', venue_id)] + [
+        ('artist', artist_id) for artist_id, in artist_ids]
+
+
+def artist_page_keys(artist_id):
+    """
+    Cache keys of the pages showing an artist: its own page and the pages
+    of the venues hosting the artist, which display the artist name and image
+    """
+    venue_ids = db.session.query(Show.venue_id).filter(
+        Show.artist_id == artist_id).distinct()
+    return [('artist', artist_id)] + [
+        ('venue', venue_id) for venue_id, in venue_ids]
+
+
+def delete_entities(model, ids):
+    """
+    Deletes venues or artists, with their shows, in one transaction of a
+    few set-based statements: the database deletes the shows (ON DELETE
+    CASCADE) without them being loaded. The show counters of the
+    counterparts, the venue directory and the cached pages are refreshed
+    as the ORM listeners would have done.
+    Args:
+      model: Venue or Artist
+      ids: iterable of ids, unknown ones are ignored
+    Returns:
+      List of the ids deleted
+    """
+    other, _ = counterpart(model)
+    connection = db.session.connection()
+    ids = [entity_id for entity_id, in connection.execute(
+        select(model.id).where(model.id.in_(set(ids))).order_by(model.id))]
+    if not ids:
+        return ids
+    # read while the shows still exist
+    other_ids = counterpart_ids(connection, model, ids)
+    areas = area_counts(connection, Venue.id.in_(ids)) if model is Venue else {}
+    connection.execute(delete(model).where(model.id.in_(ids)))
+    # the cascade went around the ORM events
+    mark_written(connection, model, Show)
+    invalidate_after_commit(db.session, calendar_index, fallback_indexes[model])
+    if other_ids:
+        refresh_show_counters(connection, other, datetime.now(), other.id.in_(other_ids))
+    adjust_areas(connection, {key: -count for key, count in areas.items()})
+    db.session.commit()
+    detail_cache.delete(*(
+        [(model.__name__.lower(), entity_id) for entity_id in ids]
+        + [(other.__name__.lower(), other_id) for other_id in other_ids]))
+    return ids
+
+
+def show_page_keys(shows):
+    """Cache keys of the venue and artist pages listing new shows"""
+    return ({('venue', show['venue_id']) for show in shows}
+            | {('artist', show['artist_id']) for show in shows})
+
+
+def detail_page_version(model, entity_id):
+    """
+    Summarizes everything a venue or artist page displays, for its ETag,
+    from its own row: the writes to the entity bump its version, the
+    writes to its shows its counters or updated_at (see show_counters.py).
+    The names and images of its artists or venues are covered by the
+    version of their table.
+    Args:
+      model: Venue or Artist
+      entity_id: int
+    Returns:
+      Tuple of the entity version, last update, upcoming show counters,
+      whether its next show has started (the split moves with time, before
+      the counters are aged) and the counterparts' table version, None if
+      the entity does not exist
+    """
+    row = db.session.query(
+        model.version, model.updated_at, model.upcoming_show_count, model.next_show_at
+    ).filter(model.id == entity_id).one_or_none()
+    if row is None:
+        return None
+    version, updated_at, upcoming_show_count, next_show_at = row
+    started = next_show_at is not None and next_show_at <= datetime.now()
+    # next_show_at as a str until it starts: a future date is no Last-Modified
+    return (version, updated_at, upcoming_show_count,
+            next_show_at if started else str(next_show_at), started
+            ) + table_versions(counterpart(model)[0])
+
+
+def venue_areas(per_page=None, after=None):
+    """
+    Lists the venues grouped by city and state with their count of upcoming
+    shows, in a single query on the venues and the area rollup maintained
+    by areas.py
+    Args:
+      per_page: int, number of venues to return, all of them if None; a
+        page can end and the next one start within an area
+      after: Tuple (state, city, venue id), only the venues after this one
+        are returned
+    Returns:
+      Tuple (areas[List[Dict[city, state, venue_count, venues[List[Dict[id, name, num_upcoming_shows]]]]]],
+      next_venue[Tuple (state, city, venue id)] or None when there are no more venues)
+    """
+    query = directory(after)
+    if per_page is None:
+        return group_areas(db.session.execute(query)), None
+    # one row more than needed tells whether a next page exists
+    rows = db.session.execute(query.limit(per_page + 1)).all()
+    last = rows[per_page - 1] if len(rows) > per_page else None
+    next_venue = (last.state, last.city, last.id) if last is not None else None
+    return group_areas(rows[:per_page]), next_venue
 
 
 # ----------------------------------------------------------------------------#
@@ -110,49 +340,42 @@ def index():
 # DELETE method deletes all request method info in the back end
 
 @app.route('/venues')  # typical GET method
+@replica_reads
+@conditional(lambda: table_versions(Area))
 def venues():
     """
-    Return all venues grouped by city and state with count of upcoming shows
+    Return the venues grouped by city and state with count of upcoming
+    shows, all venues or one page of ?per_page= venues
     Returns:
-      data[List[Dict[city, state, venues[List[Dict]]]]]
-    """
-    # get all venues
-    all_venues = Venue.query.all()
-    # group by (city, state) and serialize using class_to_dict
-    grouped = defaultdict(list)
-    for venue in all_venues:
-        grouped[(venue.city, venue.state)].append(class_to_dict(venue))
-    data = []
-    # reformat into List[Dict[city, state, venues[List[Dict]]]]
-    for city, state in grouped.keys():
-        list_venues = grouped[city, state]
-        # count upcoming shows for each venue
-        for venue in list_venues:
-            venue['num_upcoming_shows'] = Show.query.filter_by(
-                venue_id=venue['id']).filter(
-                Show.start_time > datetime.now()).count()
-        data.append({"city": city, "state": state, "venues": list_venues})
-
-    return render_template('pages/venues.html', areas=data)
+      data[List[Dict[city, state, venue_count, venues[List[Dict]]]]]
+    """
+    per_page = request.args.get('per_page', type=int)
+    if per_page is not None:
+        if per_page < 1:
+            abort(400)
+        per_page = min(per_page, app.config['VENUES_MAX_PER_PAGE'])
+    after = None
+    if 'after_state' in request.args:
+        after = (request.args['after_state'], request.args.get('after_city', ''),
+                 request.args.get('after_id', 0, type=int))
+    data, next_venue = venue_areas(per_page, after)
+    return render_template('pages/venues.html', areas=data, next_venue=next_venue,
+                           per_page=per_page, first_page=after is None)
 
 #  search Venue
 #  ----------------------------------------------------------------
 
 
 @app.route('/venues/search', methods=['POST'])
+@replica_reads
 def search_venues():
     # search on venues with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live
     # Music & Coffee"
     search_term = request.form.get('search_term', '')
-    matches = Venue.query.filter(Venue.name.ilike(f"%{search_term}%")).all()
-    matches = [{"id": match.id, "name": match.name, "num_upcoming_shows": Show.query.filter_by(
-        venue_id=match.id).filter(Show.start_time >= datetime.now()).count()} for match in matches]
-    response = {
-        "count": len(matches),
-        "data": matches
-    }
+    response = search(Venue, search_term,
+                      app.config['SEARCH_RESULTS_LIMIT'])
     return render_template(
         'pages/search_venues.html',
         results=response,
@@ -165,35 +388,22 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@replica_reads
+@conditional(lambda venue_id: detail_page_version(Venue, venue_id))
 def show_venue(venue_id):
     """
     Return venue details with past and upcoming shows
     Returns:
       data[Dict[venue, past_shows[List[Dict]], upcoming_shows[List[Dict]], past_shows_count[int], upcoming_shows_count[int]]]
     """
-    venue = db.session.get(Venue, venue_id)
-    past_shows = Show.query.filter_by(
-        venue_id=venue_id).filter(
-        Show.start_time < datetime.now()).order_by(
-            Show.start_time).all()
-    upcoming_shows = Show.query.filter_by(
-        venue_id=venue_id).filter(
-        Show.start_time >= datetime.now()).order_by(
-            Show.start_time).all()
-    past_shows_count = len(past_shows)
-    upcoming_shows_count = len(upcoming_shows)
-    # extract artist details from shows
-    if upcoming_shows:
-        upcoming_shows = [show_details(show.id, 'artist')
-                          for show in upcoming_shows]
-    if past_shows:
-        past_shows = [show_details(show.id, 'artist') for show in past_shows]
-
-    data = class_to_dict(venue)
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = past_shows_count
-    data['upcoming_shows_count'] = upcoming_shows_count
+    # the cache is shared: filled from a lagging replica, it would keep
+    # serving what a write has just invalidated
+    with primary_reads():
+        data = cached(detail_cache, ('venue', venue_id),
+                      lambda: venue_detail(venue_id), ttl=split_ttl)
+    if data is None:
+        abort(404)
+    data = refresh_split(detail_cache, ('venue', venue_id), data, datetime.now())
     return render_template('pages/show_venue.html', venue=data)
 
 
@@ -232,9 +442,7 @@ def create_venue_submission():
         except Exception as e:
             db.session.rollback()
             flash(
-                f'An error occurred. Venue {
-                    form.name.data} could not be listed. Error: {
-                    str(e)}')
+                f'An error occurred. Venue {form.name.data} could not be listed. Error: {str(e)}')
         finally:
             db.session.close()
     else:
@@ -288,6 +496,7 @@ def edit_venue_submission(venue_id):
             venue.seeking_talent = form.seeking_talent.data
             venue.seeking_description = form.seeking_description.data
             db.session.commit()
+            detail_cache.delete(*venue_page_keys(venue_id))
             flash('Venue ' + venue.name + ' was successfully updated!')
         except BaseException:
             flash(
@@ -305,37 +514,36 @@ def edit_venue_submission(venue_id):
 #  Delete Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-    # called with DELETE request to delete a venue
+    # called with DELETE request to delete a venue, its shows go with it
     try:
-        venue = db.session.get(Venue, venue_id)
-        if venue is None:
-            flash('An error occurred. Venue not found.')
-            abort(404)
-        db.session.delete(venue)
-        db.session.commit()
-        flash('Venue ' + venue.name + ' was successfully deleted!')
+        deleted = delete_entities(Venue, [venue_id])
     except BaseException:
         db.session.rollback()
-        flash(
-            'An error occurred. Venue ' +
-            venue.name +
-            ' could not be deleted.')
+        flash('An error occurred. Venue ' + str(venue_id) + ' could not be deleted.')
+        return jsonify({'success': False}), 500
     finally:
         db.session.close()
+    if not deleted:
+        abort(404)
+    flash('Venue ' + str(venue_id) + ' was successfully deleted!')
 
     # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
     # clicking that button delete it from the db then redirect the user to the
     # homepage
-    return None
+    return jsonify({'success': True})
 
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@replica_reads
+@conditional(lambda: table_versions(Artist))
 def artists():
-    data = Artist.query.all()
+    # the page only shows id and name: named tuples of those two columns
+    # instead of full entities (genres, links, descriptions)
+    data = db.session.query(Artist.id, Artist.name).order_by(Artist.id).all()
     return render_template('pages/artists.html', artists=data)
 
 #  search Artist
@@ -343,19 +551,14 @@ def artists():
 
 
 @app.route('/artists/search', methods=['POST'])
+@replica_reads
 def search_artists():
     # search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
     search_term = request.form.get('search_term', '')
-    matches = Artist.query.filter(Artist.name.ilike(f"%{search_term}%")).all()
-    matches = [{"id": match.id, "name": match.name, "num_upcoming_shows": Show.query.filter_by(
-        artist_id=match.id).filter(Show.start_time >= datetime.now()).count()} for match in matches]
-
-    response = {
-        "count": len(matches),
-        "data": matches
-    }
+    response = search(Artist, search_term,
+                      app.config['SEARCH_RESULTS_LIMIT'])
 
     return render_template(
         'pages/search_artists.html',
@@ -369,36 +572,22 @@ def search_artists():
 #  ----------------------------------------------------------------
 
 @app.route('/artists/<int:artist_id>')
+@replica_reads
+@conditional(lambda artist_id: detail_page_version(Artist, artist_id))
 def show_artist(artist_id):
     """
     Return artist details with past and upcoming shows
     Returns:
       data[Dict[artist, past_shows[List[Dict]], upcoming_shows[List[Dict]], past_shows_count[int], upcoming_shows_count[int]]]
     """
-    artist = db.session.get(Artist, artist_id)
-    past_shows = Show.query.filter_by(
-        artist_id=artist_id).filter(
-        Show.start_time < datetime.now()).order_by(
-            Show.start_time).all()
-    upcoming_shows = Show.query.filter_by(
-        artist_id=artist_id).filter(
-        Show.start_time >= datetime.now()).order_by(
-            Show.start_time).all()
-    past_shows_count = len(past_shows)
-    upcoming_shows_count = len(upcoming_shows)
-    # extract artist details from shows
-    if upcoming_shows:
-        upcoming_shows = [show_details(show.id, 'venue')
-                          for show in upcoming_shows]
-    if past_shows:
-        past_shows = [show_details(show.id, 'venue') for show in past_shows]
-
-    data = class_to_dict(artist)
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = past_shows_count
-    data['upcoming_shows_count'] = upcoming_shows_count
-
+    # the cache is shared: filled from a lagging replica, it would keep
+    # serving what a write has just invalidated
+    with primary_reads():
+        data = cached(detail_cache, ('artist', artist_id),
+                      lambda: artist_detail(artist_id), ttl=split_ttl)
+    if data is None:
+        abort(404)
+    data = refresh_split(detail_cache, ('artist', artist_id), data, datetime.now())
     return render_template('pages/show_artist.html', artist=data)
 
 
@@ -444,6 +633,7 @@ def edit_artist_submission(artist_id):
             artist.seeking_venue = form.seeking_venue.data
             artist.seeking_description = form.seeking_description.data
             db.session.commit()
+            detail_cache.delete(*artist_page_keys(artist_id))
             flash('Artist ' + artist.name + ' was successfully updated!')
         except BaseException:
             flash(
@@ -491,9 +681,7 @@ def create_artist_submission():
         except Exception as e:
             db.session.rollback()
             flash(
-                f'An error occurred. Artist {
-                    form.name.data} could not be listed. Error: {
-                    str(e)}')
+                f'An error occurred. Artist {form.name.data} could not be listed. Error: {str(e)}')
         finally:
             db.session.close()
     else:
@@ -505,40 +693,35 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@replica_reads
+@conditional(lambda: table_versions(Show, Artist, Venue))
 def shows():
-    # displays list of shows at /shows
-    shows = Show.query.order_by(Show.start_time).all()
-    shows = [class_to_dict(show) for show in shows]
-    data = []
-    for show in shows:
-
-        # option 1: cleanest one-liner
-        show['venue_name'] = db.session.get(Venue, show['venue_id']).name
-
-        # option 2 : significantly more complicated
-        """show['venue_name'] = (
-    db.session.query(Venue.name)
-    .join(Show, Show.venue_id == Venue.id)
-    .filter(Show.id == show.id)
-    .scalar()
-    )"""
-
-        '''# option 3 : raw sql style using sql text
-    sql = text("""
-    SELECT v.name
-    FROM "Venue" v
-    JOIN "Show" s ON s.venue_id = v.id
-    WHERE s.id = :show_id
-    """)
-    show['venue_name'] = db.session.execute(sql, {"show_id": show['id']}).fetchone()'''
-
-        del show['id']
-        show['artist_name'] = db.session.get(Artist, show['artist_id']).name
-        show['artist_image_link'] = db.session.get(
-            Artist, show['artist_id']).image_link
-        data.append(show)
-
-    return render_template('pages/shows.html', shows=data)
+    # displays list of shows at /shows, one page at a time
+    per_page = min(
+        request.args.get('per_page', app.config['SHOWS_PER_PAGE'], type=int),
+        app.config['SHOWS_MAX_PER_PAGE'])
+    if per_page < 1:
+        abort(400)
+    criteria = []
+    cursor = request.args.get('after')
+    if cursor:
+        try:
+            start_time, show_id = decode_show_cursor(cursor)
+        except ValueError:
+            abort(400)
+        # keyset pagination: seek past the last (start_time, id) of the
+        # previous page instead of counting an OFFSET through the table
+        criteria.append(tuple_(Show.start_time, Show.id) > (start_time, show_id))
+    # one row more than needed tells whether a next page exists
+    data = db.session.execute(show_projection(*criteria).limit(per_page + 1)).all()
+    next_cursor = None
+    if len(data) > per_page:
+        data = data[:per_page]
+        next_cursor = encode_show_cursor(data[-1])
+
+    return render_template('pages/shows.html', shows=data,
+                           next_cursor=next_cursor, per_page=per_page,
+                           first_page=not cursor)
 
 #  Create Show
 #  ----------------------------------------------------------------
@@ -558,19 +741,20 @@ def create_show_submission():
     form = ShowForm()  # request.form
     if form.validate_on_submit():
         try:
-            new_show = Show(
-                artist_id=form.artist_id.data,
-                venue_id=form.venue_id.data,
-                start_time=form.start_time.data
-            )
-            db.session.add(new_show)
-            db.session.commit()
+            # the venue and artist are checked before the insert
+            shows = schedule_shows([{
+                'artist_id': form.artist_id.data,
+                'venue_id': form.venue_id.data,
+                'start_time': form.start_time.data.isoformat(),
+            }])
+            detail_cache.delete(*show_page_keys(shows))
             flash('Show was successfully listed!')
+        except SchedulingError as e:
+            flash(f"An error occurred. Show could not be listed. Error: {e.errors[0]['error']}")
         except Exception as e:
             db.session.rollback()
             flash(
-                f'An error occurred. Show could not be listed. Error: {
-                    str(e)}')
+                f'An error occurred. Show could not be listed. Error: {str(e)}')
         finally:
             db.session.close()
     else:
@@ -578,6 +762,110 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+@app.route('/shows/bulk', methods=['POST'])
+def create_shows_bulk():
+    """
+    Schedules many shows at once, all or none: a JSON array of
+    {"venue_id", "artist_id", "start_time"} objects, or CSV with these
+    columns, sent as the body (text/csv) or as an uploaded file
+    """
+    upload = request.files.get('file')
+    try:
+        if upload is not None:
+            content = upload.read().decode('utf-8-sig')
+            records = read_csv(content) if upload.filename.endswith('.csv') else json.loads(content)
+        elif request.mimetype == 'text/csv':
+            records = read_csv(request.get_data().decode('utf-8-sig'))
+        else:
+            records = request.get_json(silent=True)
+    except ValueError:  # includes undecodable uploads
+        records = None
+    # same format as the errors of the records, without a record index
+    if not isinstance(records, list):
+        error = 'expected a JSON array or CSV of shows'
+    elif len(records) > app.config['SHOWS_BULK_MAX']:
+        error = f"at most {app.config['SHOWS_BULK_MAX']} shows"
+    else:
+        error = None
+    if error:
+        return jsonify({'errors': [{'index': None, 'error': error}]}), 400
+    try:
+        shows = schedule_shows(records)
+    except SchedulingError as e:
+        return jsonify({'errors': e.errors}), 422
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+    detail_cache.delete(*show_page_keys(shows))
+    return jsonify({'created': len(shows), 'shows': shows}), 201
+
+
+#  Admin
+#  ----------------------------------------------------------------
+
+def admin_required(view):
+    """
+    Lets through the requests carrying the ADMIN_TOKEN bearer token; the
+    view does not exist (404) while ADMIN_TOKEN is unset
+    """
+    @wraps(view)
+    def wrapper(**kwargs):
+        token = app.config['ADMIN_TOKEN']
+        if not token:
+            abort(404)
+        authorization = request.authorization
+        if (authorization is None or authorization.type != 'bearer'
+                or not hmac.compare_digest(authorization.token or '', token)):
+            abort(403)
+        return view(**kwargs)
+    return wrapper
+
+
+ADMIN_MODELS = {'venues': Venue, 'artists': Artist}
+
+
+@app.route('/admin/<any(venues, artists):kind>/delete', methods=['POST'])
+@admin_required
+def admin_delete(kind):
+    # {"ids": [1, 2, ...]} deletes these venues or artists, and their
+    # shows, in one transaction
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if (not isinstance(ids, list) or not ids
+            or not all(isinstance(entity_id, int) for entity_id in ids)):
+        abort(400, description='expected {"ids": [int, ...]}')
+    if len(ids) > app.config['ADMIN_DELETE_MAX_IDS']:
+        abort(400, description=f"at most {app.config['ADMIN_DELETE_MAX_IDS']} ids")
+    try:
+        deleted = delete_entities(ADMIN_MODELS[kind], ids)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+    return jsonify({'deleted': deleted, 'not_found': sorted(set(ids) - set(deleted))})
+
+
+#  Cache
+#  ----------------------------------------------------------------
+
+@app.route('/cache/stats')
+def cache_stats():
+    # hit/miss/eviction counters of the detail page cache, to size it
+    return jsonify(detail_cache.stats())
+
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format, of all the workers with PROMETHEUS_MULTIPROC_DIR
+    return app.response_class(render_metrics(),
+                              mimetype='text/plain; version=0.0.4')
+
+
 #  Error handlers
 #  ----------------------------------------------------------------
 
@@ -596,7 +884,8 @@ if not app.debug:
     file_handler.setFormatter(Formatter(
         '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
     app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
+    # warnings and errors only: the request lines have their own logger
+    file_handler.setLevel(logging.WARNING)
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
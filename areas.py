@@ -0,0 +1,158 @@
+from collections import Counter
+
+from sqlalchemy import and_, delete, event, func, inspect, literal_column, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Venue, Area, db
+from http_cache import mark_written
+
+
+# ----------------------------------------------------------------------------#
+# Area rollup.
+# ----------------------------------------------------------------------------#
+
+def area_key(city, state):
+    # missing cities or states make one area, stored as ''
+    return (city or '', state or '')
+
+
+def area_column(column):
+    # as written in ix_Venue_area, '' inline so the index matches
+    return func.coalesce(column, literal_column("''"))
+
+
+def area_counts(connection, *criteria):
+    """
+    Returns:
+      Counter of the venues matching criteria by (city, state) area
+    """
+    counts = Counter()
+    for city, state, count in connection.execute(select(
+            Venue.city, Venue.state, func.count()).where(*criteria).group_by(Venue.city, Venue.state)):
+        # NULL and '' are one area
+        counts[area_key(city, state)] += count
+    return counts
+
+
+def insert_areas():
+    dialects = {'postgresql': postgresql, 'sqlite': sqlite}
+    return dialects[db.engine.dialect.name].insert(Area.__table__)
+
+
+def adjust_areas(connection, deltas):
+    """
+    Adds venues to the venue counts of some areas, or removes them, in the
+    caller's transaction: only the rows of these areas are written, with
+    increments, which stay right under concurrent writers (the row lock
+    serializes them); areas left without venues are deleted. The rows are
+    written in (state, city) order, so concurrent adjustments don't
+    deadlock.
+    Args:
+      connection: connection (or session) running the statements
+      deltas: Dict[(city, state), int] of venues added (or removed if
+        negative) by area, see area_key
+    """
+    keys = sorted((key for key, delta in deltas.items() if delta),
+                  key=lambda key: (key[1], key[0]))
+    if not keys:
+        return
+    mark_written(connection, Area)
+    statement = insert_areas()
+    # updated_at comes from the column default
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=['state', 'city'],
+        set_={'venue_count': Area.venue_count + statement.excluded.venue_count,
+              'updated_at': statement.excluded.updated_at}), [
+        {"city": city, "state": state, "venue_count": deltas[city, state]} for city, state in keys])
+    connection.execute(delete(Area).where(Area.venue_count <= 0, or_(*(
+        and_(Area.city == city, Area.state == state) for city, state in keys))))
+
+
+def touch_areas(connection):
+    """
+    Records that the directory changed without any venue being added or
+    removed, e.g. a venue renamed or its counters updated: the listing reads
+    them from Venue, only its validators (http_cache) need to know
+    """
+    mark_written(connection, Area)
+
+
+def rebuild_areas(connection):
+    """Recounts the venues of every area, e.g. after bulk changes"""
+    mark_written(connection, Area)
+    connection.execute(delete(Area))
+    counts = area_counts(connection)
+    if counts:
+        connection.execute(insert_areas(), [
+            {"city": city, "state": state, "venue_count": count}
+            for (city, state), count in counts.items()])
+
+
+def directory(after=None):
+    """
+    Selects the venues in the order of the directory, by area then id, with
+    their count of upcoming shows and the venue count of their area, served
+    by ix_Venue_area
+    Args:
+      after: Tuple (state, city, venue id), only the venues after this one
+        are selected (keyset pagination)
+    Returns:
+      Select of rows with state, city, venue_count, id, name and
+      num_upcoming_shows
+    """
+    state, city = area_column(Venue.state), area_column(Venue.city)
+    query = select(
+        state.label('state'), city.label('city'), Area.venue_count, Venue.id, Venue.name,
+        Venue.upcoming_show_count.label('num_upcoming_shows')
+    ).join(Area, and_(Area.state == state, Area.city == city)).order_by(state, city, Venue.id)
+    if after is not None:
+        query = query.where(tuple_(state, city, Venue.id) > after)
+    return query
+
+
+def group_areas(rows, fields=('id', 'name', 'num_upcoming_shows')):
+    """
+    Groups directory rows (see directory) by area
+    Returns:
+      List[Dict[city, state, venue_count, venues[List[Dict]]]], the venues
+      with the fields given
+    """
+    areas = []
+    for row in rows:
+        if not areas or (areas[-1]['state'], areas[-1]['city']) != (row.state, row.city):
+            areas.append({"city": row.city, "state": row.state,
+                          "venue_count": row.venue_count, "venues": []})
+        areas[-1]['venues'].append({field: getattr(row, field) for field in fields})
+    return areas
+
+
+@event.listens_for(db.session, 'after_flush')
+def refresh_venue_areas(session, flush_context):
+    """
+    Counts the venues added, deleted or moved by the ORM in their areas,
+    in the same transaction; a renamed venue only changes the directory.
+    Venue counters changes are handled where they are made, in
+    show_counters.py.
+    """
+    deltas = Counter()
+    changed = False
+    for venue in session.new:
+        if isinstance(venue, Venue):
+            deltas[area_key(venue.city, venue.state)] += 1
+    for venue in session.deleted:
+        if isinstance(venue, Venue):
+            deltas[area_key(venue.city, venue.state)] -= 1
+    for venue in session.dirty:
+        if isinstance(venue, Venue):
+            attrs = inspect(venue).attrs
+            city, state, name = (attrs[key].history for key in ('city', 'state', 'name'))
+            if city.has_changes() or state.has_changes():
+                # from the area before the change to the one after
+                deltas[area_key(*(
+                    (history.deleted or history.unchanged or [None])[0] for history in (city, state)))] -= 1
+                deltas[area_key(venue.city, venue.state)] += 1
+            changed = changed or city.has_changes() or state.has_changes() or name.has_changes()
+    if any(deltas.values()):
+        adjust_areas(session.connection(), deltas)
+    elif changed:
+        touch_areas(session.connection())
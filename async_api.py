@@ -0,0 +1,262 @@
+import asyncio
+import os
+import threading
+from datetime import datetime
+from uuid import uuid4
+
+from flask import abort, jsonify, request
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from models import Venue, Artist, Show, db, app
+from areas import directory, group_areas
+from serializers import columns, serializer
+from shows import decode_show_cursor, encode_show_cursor, show_projection
+
+
+# ----------------------------------------------------------------------------#
+# Event loop and engine.
+# ----------------------------------------------------------------------------#
+
+# asyncio drivers replacing the synchronous ones of SQLALCHEMY_DATABASE_URI
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+class EventLoopThread:
+    """
+    One event loop per process, running in a daemon thread, on which the
+    async views run. Flask would otherwise run each async view in a new
+    event loop, and connections bound to a loop could not be pooled across
+    requests. Coroutines of concurrent requests interleave on this loop,
+    each request thread waiting for its own result.
+    """
+
+    def __init__(self):
+        self.pid = None
+        self.loop = None
+        self.engine = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        # (re)started lazily in each process: threads don't survive a fork
+        with self.lock:
+            if self.pid != os.getpid():
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name='async-views',
+                                 daemon=True).start()
+                self.engine = create_async_engine(async_database_uri(), **async_engine_options())
+                self.pid = os.getpid()
+        return self.loop
+
+    def run(self, coroutine):
+        # the task gets a copy of the calling thread's context, so request,
+        # g and current_app work in the view
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start()).result()
+
+
+def async_database_uri():
+    if app.config['ASYNC_DATABASE_URI']:
+        return app.config['ASYNC_DATABASE_URI']
+    # db.engine.url has relative SQLite paths already resolved
+    url = db.engine.url
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def async_engine_options():
+    options = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'], pool_logging_name='async')
+    if db.engine.dialect.name != 'postgresql':
+        return options
+    if app.config['PGBOUNCER_TRANSACTION_MODE']:
+        # NullPool (from the config) leaves the pooling to PgBouncer; asyncpg
+        # prepares its statements, which don't survive PgBouncer moving the
+        # connection to another server connection between transactions:
+        # no statement cache, and unique names for the unnamed ones
+        options['connect_args'] = {
+            'statement_cache_size': 0,
+            'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__'}
+    else:
+        # the API only reads: the read timeout applies to the whole session
+        options['connect_args'] = {'server_settings': {
+            'statement_timeout': str(int(app.config['STATEMENT_TIMEOUT_MS']['read']))}}
+    return options
+
+
+event_loop = EventLoopThread()
+
+
+def async_to_sync(view):
+    def run(*args, **kwargs):
+        return event_loop.run(view(*args, **kwargs))
+    return run
+
+
+# Flask calls this for every async view function
+app.async_to_sync = async_to_sync
+
+
+async def fetch(statement):
+    """
+    Runs a statement on its own pooled connection, so that several can be
+    awaited together with asyncio.gather
+    Returns:
+      List of rows
+    """
+    async with event_loop.engine.connect() as connection:
+        return (await connection.execute(statement)).all()
+
+
+# ----------------------------------------------------------------------------#
+# Queries.
+# ----------------------------------------------------------------------------#
+
+def requested_fields(allowed, default=None):
+    """
+    Parses the ?fields= selection, e.g. ?fields=id,name
+    Args:
+      allowed: tuple of the fields that can be selected
+      default: tuple of the fields returned without ?fields=, all the
+        allowed ones by default
+    Returns:
+      Tuple of the selected fields, in the order of allowed
+    """
+    if not request.args.get('fields'):
+        return default or allowed
+    selected = {field.strip() for field in request.args['fields'].split(',')} - {''}
+    unknown = selected.difference(allowed)
+    if unknown:
+        abort(400, description=f"unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in allowed if field in selected)
+
+
+def search_rows(model, search_term, limit):
+    """
+    Case-insensitive partial name search, best matches first on Postgres
+    (pg_trgm similarity) and by name elsewhere
+    """
+    statement = select(
+        model.id, model.name, model.upcoming_show_count.label('num_upcoming_shows')
+    ).where(model.name.icontains(search_term, autoescape=True)).limit(limit)
+    if db.engine.dialect.name == 'postgresql':
+        return statement.order_by(
+            func.similarity(model.name, search_term).desc(), model.name, model.id)
+    return statement.order_by(model.name, model.id)
+
+
+async def entity_detail(model, entity_id, fields):
+    """
+    Fetches the selected fields of a venue or artist, with its past and
+    upcoming shows when selected, the queries running concurrently
+    Args:
+      fields: tuple of columns of model and of DETAIL_FIELDS
+    Returns:
+      Dict of the selected fields, None if the entity does not exist
+    """
+    show_fk = Show.venue_id if model is Venue else Show.artist_id
+    now = datetime.now()
+    entity_fields = tuple(field for field in fields if field in columns(model))
+    # the shows are only queried if some of their fields are selected
+    splits = [(name, criterion) for name, criterion in (
+        ('past', Show.start_time < now), ('upcoming', Show.start_time >= now))
+        if f'{name}_shows' in fields or f'{name}_shows_count' in fields]
+    entity, *shows = await asyncio.gather(
+        fetch(select(*(model.__table__.c[field] for field in entity_fields or ('id',))).where(
+            model.id == entity_id)),
+        *(fetch(show_projection(show_fk == entity_id, criterion)) for name, criterion in splits))
+    if not entity:
+        return None
+    data = serializer(entity_fields)(entity[0])
+    show_dict = serializer(SHOW_FIELDS)
+    for (name, criterion), rows in zip(splits, shows):
+        if f'{name}_shows' in fields:
+            data[f'{name}_shows'] = [show_dict(row) for row in rows]
+        if f'{name}_shows_count' in fields:
+            data[f'{name}_shows_count'] = len(rows)
+    return data
+
+
+# ----------------------------------------------------------------------------#
+# Controllers.
+# ----------------------------------------------------------------------------#
+
+# bumped, next to the current one, on incompatible changes of the responses
+API_PREFIX = '/api/v1'
+
+# fields selectable with ?fields=, besides the model columns
+SHOW_FIELDS = ('show_id', 'start_time', 'artist_id', 'artist_name', 'artist_image_link',
+               'venue_id', 'venue_name', 'venue_image_link')
+DETAIL_FIELDS = ('past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count')
+SUMMARY_FIELDS = ('id', 'name', 'num_upcoming_shows')
+
+
+@app.route(f'{API_PREFIX}/venues')
+async def api_venues():
+    # venues grouped by city and state, from the same query as /venues
+    fields = requested_fields(SUMMARY_FIELDS)
+    return jsonify(group_areas(await fetch(directory()), fields))
+
+
+@app.route(f'{API_PREFIX}/venues/<int:venue_id>')
+async def api_venue(venue_id):
+    data = await entity_detail(
+        Venue, venue_id, requested_fields(columns(Venue) + DETAIL_FIELDS))
+    if data is None:
+        abort(404)
+    return jsonify(data)
+
+
+@app.route(f'{API_PREFIX}/artists')
+async def api_artists():
+    # only the selected columns are queried
+    fields = requested_fields(columns(Artist), default=('id', 'name'))
+    rows = await fetch(select(*(Artist.__table__.c[field] for field in fields)).order_by(Artist.id))
+    return jsonify([serializer(fields)(row) for row in rows])
+
+
+@app.route(f'{API_PREFIX}/artists/<int:artist_id>')
+async def api_artist(artist_id):
+    data = await entity_detail(
+        Artist, artist_id, requested_fields(columns(Artist) + DETAIL_FIELDS))
+    if data is None:
+        abort(404)
+    return jsonify(data)
+
+
+@app.route(f'{API_PREFIX}/shows')
+async def api_shows():
+    # one page of shows, same cursor and page size as /shows
+    fields = requested_fields(SHOW_FIELDS)
+    per_page = min(
+        request.args.get('per_page', app.config['SHOWS_PER_PAGE'], type=int),
+        app.config['SHOWS_MAX_PER_PAGE'])
+    if per_page < 1:
+        abort(400)
+    criteria = []
+    cursor = request.args.get('after')
+    if cursor:
+        try:
+            criteria.append(tuple_(Show.start_time, Show.id) > decode_show_cursor(cursor))
+        except ValueError:
+            abort(400)
+    rows = await fetch(show_projection(*criteria).limit(per_page + 1))
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_show_cursor(rows[-1])
+    show_dict = serializer(fields)
+    return jsonify({"data": [show_dict(row) for row in rows], "next": next_cursor})
+
+
+@app.route(f'{API_PREFIX}/search')
+async def api_search():
+    # ?q=term searches venues and artists at once
+    fields = requested_fields(SUMMARY_FIELDS)
+    search_term = request.args.get('q', '')
+    limit = app.config['SEARCH_RESULTS_LIMIT']
+    venues, artists = await asyncio.gather(
+        fetch(search_rows(Venue, search_term, limit)),
+        fetch(search_rows(Artist, search_term, limit)))
+    result_dict = serializer(fields)
+    return jsonify({
+        kind: {"count": len(rows), "data": [result_dict(row) for row in rows]}
+        for kind, rows in (('venues', venues), ('artists', artists))
+    })
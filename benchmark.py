@@ -0,0 +1,229 @@
+"""
+Benchmark suite driving every route of app.py on a synthetic dataset.
+
+usage: python benchmark.py [--database-url URL] [--scale {1k,100k,1m}]
+                           [--shows N] [--iterations N] [--cold]
+                           [--skip-seed] [--concurrency N]
+                           [--duration SECONDS] [--servers NAMES]
+                           [--routes REGEX] [--serializers N]
+                           [--calendar N] [--datetime-filter N]
+                           [--output FILE]
+
+Generates venues, artists and shows (about 1 venue per 20 shows and 1
+artist per 10 shows) into the database, then requests each route through
+the Flask test client and records latency percentiles, SQL statement
+counts and peak Python memory. Results are written as JSON so they can be
+compared across commits. The database must be empty, or already seeded
+with --skip-seed; SQLite tables are created automatically, Postgres ones
+by running the migrations first.
+
+Optional benchmarks, each in a module of benchmarks/:
+  --concurrency N   the GET routes are hammered by N threads for
+                    --duration seconds to check the connection pool copes
+                    (throughput, errors and peak pool usage), routes.py
+  --servers NAMES   e.g. dev,gunicorn: each server is started in turn on
+                    the same database and its throughput over HTTP
+                    compared; 'dev' is app.run() as in `python app.py`,
+                    'gunicorn' is wsgi.py with gunicorn.conf.py, servers.py
+  --serializers N   times the conversion of N objects per model to dicts
+                    and JSON, compiled serializers and orjson against the
+                    former class_to_dict, micro.py
+  --calendar N      times the double booking checks of the scheduling on
+                    an in-memory calendar of N shows, against a scan,
+                    micro.py
+  --datetime-filter N
+                    times the datetime filter of the templates on N
+                    datetimes and ISO strings, the former implementation
+                    against format_datetime on a cache miss and a hit,
+                    micro.py
+--routes limits the route measurements to the routes whose name matches,
+e.g. 'show_venue|api_venue' to compare the HTML and async JSON detail
+pages under load.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks.dataset import seed
+from benchmarks.micro import calendar_benchmark, datetime_filter_benchmark, serializer_benchmark
+from benchmarks.routes import load_test, measure, routes
+from benchmarks.servers import SERVERS, server_benchmark
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def benchmark_routes(app, route_list, iterations, counter, cold):
+    """
+    Measures every route of route_list, see benchmarks.routes.measure
+    Returns:
+      Dict of the measurements by route name
+    """
+    from cache import detail_cache
+
+    def before_request():
+        if cold:
+            detail_cache.clear()
+
+    client = app.test_client()
+    results = {}
+    for name, method, path, data in route_list:
+        results[name] = measure(client, method, path, data, iterations,
+                                counter, before_request)
+        print(f"{name:28} p50 {results[name]['latency_ms']['p50']:9.2f}ms "
+              f"{results[name]['statements']:4} statements", file=sys.stderr)
+    return results
+
+
+def benchmark_load(app, engine, route_list, concurrency, duration):
+    load = load_test(app, engine, route_list, concurrency, duration)
+    print(f"load test: {load['throughput_rps']} req/s, {load['errors']} errors, "
+          f"peak {load['pool']['peak_checked_out']} connections checked out",
+          file=sys.stderr)
+    return load
+
+
+def benchmark_serializers(db, models, limit):
+    serializers = serializer_benchmark(db, models, limit)
+    for name, rates in serializers.items():
+        print(f"{name:10} {rates}", file=sys.stderr)
+    return serializers
+
+
+def benchmark_calendar(num_shows):
+    calendar = calendar_benchmark(num_shows)
+    print(f"calendar   {calendar}", file=sys.stderr)
+    return calendar
+
+
+def benchmark_datetime_filter(num_values):
+    datetime_filter = datetime_filter_benchmark(num_values)
+    print(f"datetime   {datetime_filter}", file=sys.stderr)
+    return datetime_filter
+
+
+def benchmark_servers(names, route_list, concurrency, duration):
+    servers = {}
+    for name in names:
+        servers[name] = server_benchmark(name, route_list, concurrency, duration)
+        print(f"{name:10} {servers[name].get('throughput_rps')} req/s, "
+              f"{servers[name].get('errors')} errors", file=sys.stderr)
+    return servers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', help='defaults to DATABASE_URL')
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--shows', type=int, help='number of shows, overrides --scale')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--cold', action='store_true',
+                        help='clear the detail page cache before every request')
+    parser.add_argument('--skip-seed', action='store_true',
+                        help='benchmark the data already in the database')
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help='threads of the load test, 0 to skip it')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds the load test runs')
+    parser.add_argument('--servers', default='',
+                        help=f"comma separated servers to compare over HTTP ({', '.join(SERVERS)})")
+    parser.add_argument('--serializers', type=int, default=0, metavar='N',
+                        help='compare the dict conversions and JSON encoders on N objects per model')
+    parser.add_argument('--routes', help='regular expression on the route names to benchmark')
+    parser.add_argument('--calendar', type=int, default=0, metavar='N',
+                        help='time the double booking checks on an in-memory calendar of N shows')
+    parser.add_argument('--datetime-filter', type=int, default=0, metavar='N',
+                        help='time the datetime filter on N distinct datetimes, cold and memoized')
+    parser.add_argument('--output', help='JSON file, stdout by default')
+    args = parser.parse_args(argv)
+    server_names = list(filter(None, args.servers.split(',')))
+    for name in server_names:
+        if name not in SERVERS:
+            parser.error(f"unknown server {name!r}")
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    # config.py reads DATABASE_URL at import time
+    from forms import VenueForm
+    from models import db, Venue, Artist, Show
+    import app as fyyur
+
+    app = fyyur.app
+    app.config['WTF_CSRF_ENABLED'] = False
+    # keep the per-request log lines out of the report
+    app.logger.setLevel(logging.WARNING)
+    states = [value for value, label in VenueForm.state.kwargs['choices']]
+    genres = [value for value, label in VenueForm.genres.kwargs['choices']]
+
+    with app.app_context():
+        dataset = None
+        if not args.skip_seed:
+            if db.engine.dialect.name == 'sqlite':
+                db.create_all()
+            started = time.perf_counter()
+            dataset = seed(db, Venue, Artist, Show, args.shows or SCALES[args.scale],
+                           states, genres)
+            dataset['seconds'] = round(time.perf_counter() - started, 2)
+            print(f"seeded {dataset}", file=sys.stderr)
+        route_list = routes(db, Venue, Artist, Show, states, genres)
+        if args.routes:
+            route_list = [route for route in route_list if re.search(args.routes, route[0])]
+        dialect = db.engine.dialect.name
+        engine = db.engine
+        counter = [0]
+        # every engine, including the async API's
+        event.listen(Engine, 'before_cursor_execute',
+                     lambda *args: counter.__setitem__(0, counter[0] + 1))
+
+    results = benchmark_routes(app, route_list, args.iterations, counter, args.cold)
+    load = benchmark_load(app, engine, route_list, args.concurrency, args.duration) if args.concurrency else None
+    with app.app_context():
+        serializers = benchmark_serializers(db, (Venue, Artist, Show), args.serializers) if args.serializers else None
+        calendar = benchmark_calendar(args.calendar) if args.calendar else None
+    datetime_filter = benchmark_datetime_filter(args.datetime_filter) if args.datetime_filter else None
+    servers = benchmark_servers(server_names, route_list, args.concurrency or 8, args.duration)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "database": dialect,
+            "dataset": dataset,
+            "iterations": args.iterations,
+            "cold": args.cold,
+        },
+        "routes": results,
+        "load_test": load,
+        "servers": servers,
+        "serializers": serializers,
+        "calendar": calendar,
+        "datetime_filter": datetime_filter,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+"""
+The measurements run by benchmark.py, one module per kind of benchmark.
+"""
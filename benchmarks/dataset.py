@@ -0,0 +1,79 @@
+"""
+Reproducible synthetic dataset of venues, artists and shows.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+
+def synthetic_shows(rng, num_shows, num_venues, num_artists):
+    """
+    Generates one-hour shows on the hour, over two years of history and one
+    year ahead, with no venue or artist booked twice at the same time
+    Returns:
+      Iterator[Dict[venue_id, artist_id, start_time, end_time]]
+    """
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=730)
+    venue_slots, artist_slots = set(), set()
+    while len(venue_slots) < num_shows:
+        venue_id, artist_id = rng.randint(1, num_venues), rng.randint(1, num_artists)
+        hour = rng.randrange(1095 * 24)
+        if (venue_id, hour) not in venue_slots and (artist_id, hour) not in artist_slots:
+            venue_slots.add((venue_id, hour))
+            artist_slots.add((artist_id, hour))
+            yield {"venue_id": venue_id, "artist_id": artist_id,
+                   "start_time": start + timedelta(hours=hour),
+                   "end_time": start + timedelta(hours=hour + 1)}
+
+
+def seed(db, Venue, Artist, Show, num_shows, states, genres, batch_size=10_000):
+    """
+    Inserts a reproducible synthetic dataset
+    Returns:
+      Dict with the number of venues, artists and shows inserted
+    """
+    rng = random.Random(42)
+    num_venues = max(1, num_shows // 20)
+    num_artists = max(1, num_shows // 10)
+    # a few hundred cities spread over the states
+    cities = [(f"City {i}", states[i % len(states)]) for i in range(max(1, num_venues // 10))]
+
+    def insert_rows(model, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                db.session.execute(insert(model), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(model), batch)
+        db.session.commit()
+
+    def venues():
+        for i in range(num_venues):
+            city, state = rng.choice(cities)
+            yield {"name": f"Venue {i} {rng.choice(genres)} Hall", "city": city,
+                   "state": state, "address": f"{i} Main Street",
+                   "phone": "555-555-5555", "genres": rng.sample(genres, 2),
+                   "image_link": f"https://example.com/venues/{i}.jpg",
+                   "seeking_talent": rng.random() < 0.5}
+
+    def artists():
+        for i in range(num_artists):
+            city, state = rng.choice(cities)
+            yield {"name": f"Artist {i} {rng.choice(genres)} Band", "city": city,
+                   "state": state, "phone": "555-555-5555",
+                   "genres": rng.sample(genres, 2),
+                   "image_link": f"https://example.com/artists/{i}.jpg",
+                   "seeking_venue": rng.random() < 0.5}
+
+    insert_rows(Venue, venues())
+    insert_rows(Artist, artists())
+    insert_rows(Show, synthetic_shows(rng, num_shows, num_venues, num_artists))
+    # the bulk inserts bypass the ORM events maintaining the counters
+    from show_counters import refresh_show_counters
+    for model in (Venue, Artist):
+        refresh_show_counters(db.session, model, datetime.now())
+    db.session.commit()
+    return {"venues": num_venues, "artists": num_artists, "shows": num_shows}
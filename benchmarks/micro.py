@@ -0,0 +1,148 @@
+"""
+Benchmarks of single components on in-memory data: the serializers and
+JSON encoders, the double booking check of scheduling.py and the datetime
+filter of the templates.
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.dataset import synthetic_shows
+
+
+def serializer_benchmark(db, models, limit, repeat=5):
+    """
+    Compares the throughput (objects per second) of the column walk that
+    class_to_dict did with the compiled serializers, and of the standard
+    json module with orjson, on up to limit instances of each model
+    Returns:
+      Dict of the rates by model and the JSON encoding rates
+    """
+    from serializers import json_default, model_serializer, orjson
+
+    def rate(convert, objects):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            convert(objects)
+        return round(repeat * len(objects) / (time.perf_counter() - started))
+
+    def class_to_dict(obj):
+        return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+    results = {}
+    dicts = []
+    for model in models:
+        objects = db.session.query(model).limit(limit).all()
+        if not objects:
+            continue
+        to_dict = model_serializer(model)
+        results[model.__name__] = {
+            "objects": len(objects),
+            "class_to_dict_per_s": rate(lambda objects: [class_to_dict(obj) for obj in objects], objects),
+            "serializer_per_s": rate(lambda objects: [to_dict(obj) for obj in objects], objects),
+        }
+        dicts += [to_dict(obj) for obj in objects]
+    results["json"] = {
+        "objects": len(dicts),
+        "json_per_s": rate(lambda dicts: json.dumps(dicts, default=json_default), dicts),
+        "orjson_per_s": rate(lambda dicts: orjson.dumps(dicts, default=json_default), dicts)
+        if orjson is not None else None,
+    }
+    return results
+
+
+def calendar_benchmark(num_shows, checks=10_000, scanned_checks=20):
+    """
+    Times the double booking check of scheduling.py on an in-memory
+    calendar of num_shows shows (as seed() makes them): CalendarIndex
+    interval tree searches against scanning every show, on random two-hour
+    slots
+    Returns:
+      Dict with the index build time, microseconds per check of both and
+      the share of slots found booked
+    """
+    from models import Venue, Artist
+    from scheduling import CalendarIndex
+
+    rng = random.Random(42)
+    num_venues, num_artists = max(1, num_shows // 20), max(1, num_shows // 10)
+    shows = [(show_id, show["venue_id"], show["artist_id"], show["start_time"], show["end_time"])
+             for show_id, show in enumerate(synthetic_shows(rng, num_shows, num_venues, num_artists))]
+    started = time.perf_counter()
+    index = CalendarIndex().build(shows)
+    build_seconds = time.perf_counter() - started
+
+    first = min(show[3] for show in shows)
+    slots = []
+    for _ in range(checks):
+        start = first + timedelta(minutes=rng.randrange(1095 * 24 * 60))
+        slots.append((rng.randint(1, num_venues), rng.randint(1, num_artists),
+                      start, start + timedelta(hours=2)))
+
+    def indexed(venue_id, artist_id, start, end):
+        return (index.overlapping(Venue, venue_id, start, end) is not None
+                or index.overlapping(Artist, artist_id, start, end) is not None)
+
+    def scanned(venue_id, artist_id, start, end):
+        return any((show[1] == venue_id or show[2] == artist_id) and show[3] < end and show[4] > start
+                   for show in shows)
+
+    started = time.perf_counter()
+    booked = sum(indexed(*slot) for slot in slots)
+    index_us = (time.perf_counter() - started) * 1e6 / checks
+    started = time.perf_counter()
+    for slot in slots[:scanned_checks]:
+        if scanned(*slot) != indexed(*slot):
+            raise AssertionError(f"the index and the scan disagree on {slot}")
+    scan_us = (time.perf_counter() - started) * 1e6 / min(checks, scanned_checks)
+    return {
+        "shows": num_shows,
+        "build_seconds": round(build_seconds, 2),
+        "index_us_per_check": round(index_us, 2),
+        "scan_us_per_check": round(scan_us, 2),
+        "booked_share": round(booked / checks, 4),
+    }
+
+
+def datetime_filter_benchmark(num_values, repeat=5):
+    """
+    Compares the microseconds per call of the datetime Jinja filter before
+    it was compiled and memoized (dateutil and babel.dates.format_datetime
+    on every call) with format_datetime on a cache miss and on a hit, for
+    num_values distinct datetimes and their ISO strings, 'full' format
+    Returns:
+      Dict of the microseconds per call by implementation and input type
+    """
+    import babel.dates
+    import dateutil.parser
+    from app import DATETIME_FORMATS, format_datetime, memoized_format_datetime
+
+    def former(value, format='full'):
+        date = dateutil.parser.parse(value) if isinstance(value, str) else value
+        return babel.dates.format_datetime(date, DATETIME_FORMATS[format], locale='en')
+
+    def us_per_call(convert, values, clear=False):
+        elapsed = 0
+        for _ in range(repeat):
+            if clear:
+                memoized_format_datetime.cache_clear()
+            started = time.perf_counter()
+            for value in values:
+                convert(value, 'full')
+            elapsed += time.perf_counter() - started
+        return round(elapsed * 1e6 / (repeat * len(values)), 2)
+
+    first = datetime(2025, 1, 1, 20)
+    dates = [first + timedelta(hours=hours) for hours in range(num_values)]
+    strings = [date.isoformat() for date in dates]
+    results = {}
+    for name, values in (("datetime", dates), ("iso_string", strings)):
+        results[name] = {
+            "former_us": us_per_call(former, values),
+            "miss_us": us_per_call(format_datetime, values, clear=True),
+            # the same values again, e.g. a page rendered twice
+            "hit_us": us_per_call(format_datetime, values),
+        }
+    memoized_format_datetime.cache_clear()
+    return results
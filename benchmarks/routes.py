@@ -0,0 +1,183 @@
+"""
+Latency, statements and memory of every route through the Flask test
+client, and the load test of the GET routes from several threads.
+"""
+import statistics
+import threading
+import time
+import tracemalloc
+
+from sqlalchemy import func
+
+
+def routes(db, Venue, Artist, Show, states, genres):
+    """
+    Returns:
+      List of (name, method, path, form data) covering every route in app.py
+      and async_api.py except the venue deletion
+    """
+    venue_id = db.session.query(func.min(Venue.id)).scalar()
+    artist_id = db.session.query(func.min(Artist.id)).scalar()
+    # the busiest venue and artist make the heaviest detail pages
+    busy_venue = db.session.query(Show.venue_id).group_by(Show.venue_id).order_by(
+        func.count().desc()).limit(1).scalar() or venue_id
+    busy_artist = db.session.query(Show.artist_id).group_by(Show.artist_id).order_by(
+        func.count().desc()).limit(1).scalar() or artist_id
+    first_show = db.session.query(Show.start_time, Show.id).order_by(
+        Show.start_time, Show.id).first()
+    cursor = f"{first_show[0].isoformat()}_{first_show[1]}" if first_show else ''
+    venue_form = {"name": "Benchmark Venue", "city": "Benchmark City",
+                  "state": states[0], "address": "1 Bench Street",
+                  "phone": "555-555-5555", "genres": genres[0],
+                  "facebook_link": "", "image_link": "", "website_link": "",
+                  "seeking_description": ""}
+    artist_form = dict(venue_form, name="Benchmark Artist")
+    del artist_form["address"]
+    show_form = {"artist_id": str(artist_id), "venue_id": str(venue_id),
+                 "start_time": "2030-01-01 20:00:00"}
+    # a night of shows at 100 venues: scheduled once, then rejected as
+    # double bookings, both after the same checks
+    venue_ids = [venue for venue, in db.session.query(Venue.id).order_by(Venue.id).limit(100)]
+    artist_ids = [artist for artist, in db.session.query(Artist.id).order_by(Artist.id).limit(100)]
+    show_batch = [{"venue_id": venue, "artist_id": artist, "start_time": "2031-01-01T20:00:00"}
+                  for venue, artist in zip(venue_ids, artist_ids)]
+    return [
+        ('index', 'GET', '/', None),
+        ('venues', 'GET', '/venues', None),
+        ('search_venues', 'POST', '/venues/search', {"search_term": "Hall"}),
+        ('show_venue', 'GET', f'/venues/{busy_venue}', None),
+        ('create_venue_form', 'GET', '/venues/create', None),
+        ('create_venue_submission', 'POST', '/venues/create', venue_form),
+        ('edit_venue', 'GET', f'/venues/{venue_id}/edit', None),
+        ('edit_venue_submission', 'POST', f'/venues/{venue_id}/edit', venue_form),
+        ('artists', 'GET', '/artists', None),
+        ('search_artists', 'POST', '/artists/search', {"search_term": "Band"}),
+        ('show_artist', 'GET', f'/artists/{busy_artist}', None),
+        ('edit_artist', 'GET', f'/artists/{artist_id}/edit', None),
+        ('edit_artist_submission', 'POST', f'/artists/{artist_id}/edit', artist_form),
+        ('create_artist_form', 'GET', '/artists/create', None),
+        ('create_artist_submission', 'POST', '/artists/create', artist_form),
+        ('shows', 'GET', '/shows', None),
+        ('shows_next_page', 'GET', f'/shows?after={cursor}', None),
+        ('create_shows', 'GET', '/shows/create', None),
+        ('create_show_submission', 'POST', '/shows/create', show_form),
+        ('create_shows_bulk', 'POST', '/shows/bulk', show_batch),
+        ('api_venues', 'GET', '/api/v1/venues', None),
+        ('api_venue', 'GET', f'/api/v1/venues/{busy_venue}', None),
+        ('api_artists', 'GET', '/api/v1/artists', None),
+        ('api_artist', 'GET', f'/api/v1/artists/{busy_artist}', None),
+        ('api_shows', 'GET', '/api/v1/shows', None),
+        ('api_search', 'GET', '/api/v1/search?q=Hall', None),
+    ]
+
+
+# ----------------------------------------------------------------------------#
+# Measurements.
+# ----------------------------------------------------------------------------#
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def measure(client, method, path, data, iterations, counter, before_request):
+    """
+    Requests one route iterations times
+    Returns:
+      Dict with status, latency statistics (ms), statements per request and
+      peak traced memory (KiB) of a single request
+    """
+    def request():
+        before_request()
+        if method == 'POST' and isinstance(data, list):
+            return client.post(path, json=data)
+        if method == 'POST':
+            return client.post(path, data=data)
+        return client.get(path)
+
+    status = request().status_code     # warm up
+    latencies, statements = [], []
+    for _ in range(iterations):
+        counter[0] = 0
+        started = time.perf_counter()
+        request()
+        latencies.append((time.perf_counter() - started) * 1000)
+        statements.append(counter[0])
+    # memory is traced on a separate request, tracing slows everything down
+    tracemalloc.start()
+    request()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "status": status,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 3),
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p90": round(percentile(latencies, 0.90), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "statements": max(statements),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def load_test(app, engine, route_list, concurrency, duration):
+    """
+    Requests the GET routes from concurrency threads for duration seconds
+    Returns:
+      Dict with request count, throughput, errors, latency percentiles (ms)
+      and the peak number of pooled connections checked out
+    """
+    paths = [path for name, method, path, data in route_list if method == 'GET']
+    latencies, errors = [], []
+    peak = {"checked_out": 0, "overflow": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        client = app.test_client()
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                status = client.get(path).status_code
+                error = f"{path}: HTTP {status}" if status >= 500 else None
+            except Exception as e:
+                error = f"{path}: {type(e).__name__}: {e}"
+            elapsed = (time.perf_counter() - started) * 1000
+            pool = engine.pool
+            with lock:
+                latencies.append(elapsed)
+                if error:
+                    errors.append(error)
+                if hasattr(pool, 'checkedout'):
+                    peak["checked_out"] = max(peak["checked_out"], pool.checkedout())
+                    peak["overflow"] = max(peak["overflow"], pool.overflow())
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3) if latencies else None,
+            "p99": round(percentile(latencies, 0.99), 3) if latencies else None,
+        },
+        "pool": {
+            "class": type(engine.pool).__name__,
+            "size": engine.pool.size() if hasattr(engine.pool, 'size') else None,
+            "peak_checked_out": peak["checked_out"],
+            "peak_overflow": peak["overflow"],
+        },
+    }
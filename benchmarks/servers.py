@@ -0,0 +1,117 @@
+"""
+Throughput over HTTP of the servers running the app: the development
+server and gunicorn, each started in turn on the same database.
+"""
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.routes import percentile
+
+
+SERVERS = {
+    # what `python app.py` runs, minus the reloader which does not serve
+    'dev': ['{python}', '-c', 'import app; app.app.run(port={port}, use_reloader=False)'],
+    'gunicorn': ['{python}', '-m', 'gunicorn', '--bind', '127.0.0.1:{port}', 'wsgi:app'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def http_load_test(port, paths, concurrency, duration):
+    """
+    Requests paths over HTTP from concurrency threads for duration seconds,
+    reusing connections where the server keeps them alive
+    Returns:
+      Dict with request count, throughput, errors and latency percentiles (ms)
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            for attempt in range(2):
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    response.read()
+                    error = f"{path}: HTTP {response.status}" if response.status >= 500 else None
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    error = f"{path}: {type(e).__name__}: {e}"
+                    connection.close()
+                    # a kept-alive connection the server closed (idle or
+                    # recycled worker) is retried once on a new connection
+                    if not isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError)):
+                        break
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if error:
+                    errors.append(error)
+        connection.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3) if latencies else None,
+            "p99": round(percentile(latencies, 0.99), 3) if latencies else None,
+        },
+    }
+
+
+def server_benchmark(name, route_list, concurrency, duration, startup_timeout=30):
+    """
+    Starts one of SERVERS on a free port and load tests its GET routes
+    Returns:
+      Dict of http_load_test, or with an error if the server did not start
+    """
+    port = free_port()
+    command = [part.format(python=sys.executable, port=port) for part in SERVERS[name]]
+    env = dict(os.environ, PORT=str(port),
+               FYYUR_ENV='development' if name == 'dev' else 'production')
+    # own process group: gunicorn's workers are stopped with it
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, start_new_session=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    return {"error": f"{' '.join(command)} did not start"}
+                time.sleep(0.2)
+        paths = [path for route, method, path, data in route_list if method == 'GET']
+        return http_load_test(port, paths, concurrency, duration)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+from models import app
+
+try:
+    import orjson
+except ImportError:  # optional, the standard json module is used without it
+    orjson = None
+
+
+# ----------------------------------------------------------------------------#
+# Backends.
+# ----------------------------------------------------------------------------#
+
+class LRUCache:
+    """
+    In-process cache keeping at most maxsize entries, each for ttl seconds.
+    The least recently used entry is evicted when the cache is full.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()    # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {"backend": "memory", "size": len(self.entries),
+                "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+def tag(value):
+    # dates are stored as tagged objects, so they are read back as dates
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def untag(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and "__datetime__" in value:
+            return datetime.fromisoformat(value["__datetime__"])
+        if len(value) == 1 and "__date__" in value:
+            return date.fromisoformat(value["__date__"])
+        return {key: untag(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [untag(item) for item in value]
+    return value
+
+
+def dumps(value):
+    if orjson is None:
+        return json.dumps(value, default=tag)
+    return orjson.dumps(value, default=tag, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def loads(data):
+    return untag(json.loads(data) if orjson is None else orjson.loads(data))
+
+
+class RedisCache:
+    """
+    Cache stored in Redis, shared by all workers. client is anything with
+    the get/set(ex=)/delete methods of redis.Redis, so a local fake can
+    stand in for it. Values are stored as JSON (dates included, see tag),
+    never unpickled from what Redis holds; Redis evicts on its own, so
+    evictions are not counted here.
+
+    While Redis is unreachable (one of errors is raised) the cache does
+    nothing for retry_after seconds: every get misses and the pages are
+    built from the database. Deletes made meanwhile are lost, the entries
+    they invalidated live until their TTL.
+    """
+
+    def __init__(self, client, ttl=300, prefix='fyyur:', errors=(OSError,), retry_after=5):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.errors = errors
+        self.retry_after = retry_after
+        self.down_until = 0
+        self.hits = self.misses = self.failures = 0
+
+    def key(self, key):
+        return self.prefix + ':'.join(str(part) for part in key)
+
+    def call(self, function, *args, **kwargs):
+        """
+        Returns:
+          the result of function, calling the client, None while Redis is
+          down
+        """
+        if time.monotonic() < self.down_until:
+            return None
+        try:
+            return function(*args, **kwargs)
+        except self.errors as e:
+            self.failures += 1
+            self.down_until = time.monotonic() + self.retry_after
+            app.logger.warning('redis cache unreachable, bypassed for %ss: %s', self.retry_after, e)
+            return None
+
+    def get(self, key):
+        data = self.call(self.client.get, self.key(key))
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return loads(data)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        # redis expiries are whole seconds
+        self.call(self.client.set, self.key(key), dumps(value), ex=max(1, int(ttl + 0.999)))
+
+    def delete(self, *keys):
+        if keys:
+            self.call(self.client.delete, *[self.key(key) for key in keys])
+
+    def clear(self):
+        keys = self.call(lambda: list(self.client.scan_iter(self.prefix + '*')))
+        if keys:
+            self.call(self.client.delete, *keys)
+
+    def stats(self):
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses,
+                "evictions": 0, "failures": self.failures}
+
+
+def make_cache(config):
+    """
+    Builds the cache backend selected by CACHE_BACKEND ('memory' or 'redis')
+    """
+    if config['CACHE_BACKEND'] == 'redis':
+        # optional dependency, only needed with the redis backend
+        import redis
+        # a request waits at most this long on an unreachable Redis
+        client = redis.Redis.from_url(config['CACHE_REDIS_URL'], socket_timeout=0.5,
+                                      socket_connect_timeout=0.5)
+        return RedisCache(client, ttl=config['CACHE_TTL'], errors=(redis.RedisError, OSError))
+    return LRUCache(maxsize=config['CACHE_MAX_ENTRIES'], ttl=config['CACHE_TTL'])
+
+
+# venue and artist detail pages, keyed by ('venue', id) / ('artist', id)
+detail_cache = make_cache(app.config)
+
+
+def cached(cache, key, build, ttl=None):
+    """
+    Read-through lookup: returns the cached value or builds, stores and
+    returns it. None results (e.g. missing entities) are not cached.
+    Args:
+      ttl: function of the built value returning its seconds in the cache,
+        None for the cache's TTL
+    """
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        if value is not None:
+            cache.set(key, value, ttl=ttl(value) if ttl else None)
+    return value
@@ -0,0 +1,64 @@
+import gzip
+
+from flask import g, request
+
+from models import app
+
+try:
+    import brotli
+except ImportError:  # optional, responses are only gzipped without it
+    brotli = None
+
+
+# ----------------------------------------------------------------------------#
+# Response compression.
+# ----------------------------------------------------------------------------#
+
+def breach_exposed(response):
+    """
+    Returns:
+      True for the HTML pages holding a CSRF token (flask_wtf keeps the
+      token it rendered in g), which the forms fill with the submitted
+      values when they are invalid, and for those of
+      COMPRESS_EXCLUDE_ENDPOINTS, which echo the request
+    """
+    return response.mimetype == 'text/html' and (
+        app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in g
+        or request.endpoint in app.config['COMPRESS_EXCLUDE_ENDPOINTS'])
+
+
+@app.after_request
+def compress(response):
+    """
+    Compresses text responses of COMPRESS_MIMETYPES with brotli or gzip,
+    brotli first, if the client accepts it and the body is at least
+    COMPRESS_MIN_SIZE bytes. Pages open to BREACH are not compressed, see
+    breach_exposed.
+    """
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in app.config['COMPRESS_MIMETYPES']
+            or breach_exposed(response)):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    if brotli is not None and request.accept_encodings['br']:
+        data = brotli.compress(data, quality=app.config['COMPRESS_BROTLI_QUALITY'])
+        encoding = 'br'
+    elif request.accept_encodings['gzip']:
+        # mtime=0 keeps the output identical for identical bodies
+        data = gzip.compress(data, compresslevel=app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+        encoding = 'gzip'
+    else:
+        return response
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # the encoded body is a different byte sequence: a strong ETag of the
+    # page becomes weak, If-None-Match still matches it (see http_cache.py)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
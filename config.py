@@ -1,16 +1,168 @@
 import os
 from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool
 load_dotenv()
 
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
 
-# Connect to the database
+class Config:
+    """
+    Settings shared by every environment. The class used is picked with the
+    FYYUR_ENV environment variable, see CONFIGS below.
+    """
 
+    # Must be set in production: without it each worker process draws its
+    # own key and rejects the sessions and CSRF tokens of the others.
+    SECRET_KEY = os.getenv('SECRET_KEY') or os.urandom(32)
+    DEBUG = False
 
-# DATABASE URL
-SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
\ No newline at end of file
+    # DATABASE URL
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
+
+    # Connection pool, per worker process. Connections are checked with a ping
+    # before use and replaced after DB_POOL_RECYCLE seconds, so connections
+    # dropped by a Postgres failover are not handed to requests.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        # names the pool in the logs and on /metrics (replica and async for
+        # the others)
+        'pool_logging_name': 'primary',
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    # Behind PgBouncer in transaction mode, PgBouncer does the pooling: no
+    # connection is kept in the worker, and only transaction-scoped settings
+    # (SET LOCAL) are used.
+    PGBOUNCER_TRANSACTION_MODE = os.getenv('DB_PGBOUNCER_TRANSACTION_MODE', '').lower() in ('1', 'true', 'yes')
+    if PGBOUNCER_TRANSACTION_MODE:
+        SQLALCHEMY_ENGINE_OPTIONS['poolclass'] = NullPool
+    elif not (SQLALCHEMY_DATABASE_URI or '').startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS.update({
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            # seconds a request waits for a connection before failing
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        })
+
+    # Postgres statement_timeout (ms) set for each transaction of a request:
+    # 'read' for GET/HEAD requests, 'write' for the others
+    STATEMENT_TIMEOUT_MS = {
+        'read': int(os.getenv('DB_READ_STATEMENT_TIMEOUT_MS', 5000)),
+        'write': int(os.getenv('DB_WRITE_STATEMENT_TIMEOUT_MS', 30000)),
+    }
+
+    # Number of shows listed per page on /shows (?per_page= can override it up to
+    # the maximum)
+    SHOWS_PER_PAGE = 30
+    SHOWS_MAX_PER_PAGE = 200
+    # Maximum number of shows scheduled by one POST /shows/bulk
+    SHOWS_BULK_MAX = 1000
+    # Length of the shows scheduled without an end_time, and the longest
+    # show accepted (it bounds the search for overlapping shows)
+    SHOW_DEFAULT_DURATION_MINUTES = 120
+    SHOW_MAX_DURATION_MINUTES = 24 * 60
+
+    # /venues lists every venue unless ?per_page= asks for pages of venues,
+    # up to this maximum
+    VENUES_MAX_PER_PAGE = 200
+
+    # Maximum number of results returned by the venue and artist searches
+    SEARCH_RESULTS_LIMIT = 50
+
+    # Cache of the venue and artist detail pages: 'memory' (per process LRU) or
+    # 'redis' (shared, needs the redis package and CACHE_REDIS_URL)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_MAX_ENTRIES = 1024
+    # seconds a cached page is served before being rebuilt
+    CACHE_TTL = 300
+
+    # Cache-Control sent with the conditional GET pages, by endpoint name.
+    # 'no-cache' lets browsers/CDN keep a copy but revalidate it with its ETag:
+    # a max-age would let a shared cache serve a listing older than the write
+    # a client was just redirected from.
+    HTTP_CACHE_CONTROL_DEFAULT = 'no-cache'
+    HTTP_CACHE_CONTROL = {
+        'venues': 'public, no-cache',
+        'artists': 'public, no-cache',
+        'shows': 'public, no-cache',
+        'show_venue': 'no-cache',
+        'show_artist': 'no-cache',
+    }
+
+    # Per-request instrumentation: Server-Timing header and one log line per
+    # request, statements slower than SLOW_QUERY_MS are logged, and a statement
+    # repeated more than N_PLUS_ONE_THRESHOLD times in a request is flagged
+    INSTRUMENTATION_ENABLED = True
+    SLOW_QUERY_MS = 100
+    N_PLUS_ONE_THRESHOLD = 10
+
+    # Upper bounds (seconds) of the request latency histogram served on /metrics
+    METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    # Directory through which the worker processes add up their metrics (the
+    # variable of prometheus_client's multiprocess mode), written every
+    # METRICS_FLUSH_SECONDS; unset, /metrics shows the serving process only
+    METRICS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    METRICS_FLUSH_SECONDS = 1
+
+    # Read replicas (comma separated URLs in DATABASE_REPLICA_URLS) used by the
+    # read-only pages, round-robin, each checked at most every
+    # REPLICA_HEALTH_CHECK_INTERVAL seconds. After a write, the client reads
+    # from the primary for READ_YOUR_WRITES_SECONDS.
+    SQLALCHEMY_REPLICA_URIS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    REPLICA_HEALTH_CHECK_INTERVAL = 10
+    READ_YOUR_WRITES_SECONDS = 5
+
+    # Database of the async JSON API (/api/...), defaults to DATABASE_URL
+    # with its asyncio driver (asyncpg, aiosqlite)
+    ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URL')
+
+    # Responses of these types, of at least COMPRESS_MIN_SIZE bytes, are
+    # compressed with brotli (if installed) or gzip when the client accepts it
+    COMPRESS_MIMETYPES = ('application/json', 'text/html', 'text/css', 'application/javascript')
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5
+    # BREACH: an attacker who can inject text into a compressed page can
+    # guess a secret on it from the response sizes. Pages carrying a CSRF
+    # token, and these endpoints reflecting the request, are sent as is.
+    COMPRESS_EXCLUDE_ENDPOINTS = ('search_venues', 'search_artists')
+
+    # Bearer token of the admin endpoints (/admin/...), which are disabled
+    # while it is unset. A bulk delete takes at most ADMIN_DELETE_MAX_IDS ids.
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+    ADMIN_DELETE_MAX_IDS = 1000
+
+
+class DevelopmentConfig(Config):
+    # debugger and reloader of the development server (python app.py)
+    DEBUG = True
+
+
+class ProductionConfig(Config):
+    # served by gunicorn, see wsgi.py and gunicorn.conf.py
+    DEBUG = False
+    # the workers must share the detail page cache: with the per process
+    # 'memory' one, a page changed through one worker is still served by
+    # the others until CACHE_TTL (gunicorn.conf.py refuses it)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis')
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config(env=None):
+    """
+    Args:
+      env: name of the environment, defaults to FYYUR_ENV or 'development'
+    Returns:
+      the config class of that environment
+    """
+    env = env or os.getenv('FYYUR_ENV', 'development')
+    if env not in CONFIGS:
+        raise ValueError(f"unknown FYYUR_ENV {env!r}, expected one of {', '.join(CONFIGS)}")
+    return CONFIGS[env]
@@ -6,13 +6,30 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        # the suite of tests/, on a temporary SQLite database
+        result = local("python -m pytest -q", capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def benchmark(scale="1k"):
+    # seeds a throwaway SQLite DB and benchmarks every route, see benchmark.py
+    local(
+        "rm -f benchmark.db && python benchmark.py --database-url sqlite:///benchmark.db "
+        "--scale {0} --output benchmark-{0}.json".format(scale)
+    )
+
+
+def serve():
+    # production server, see wsgi.py and gunicorn.conf.py
+    local("gunicorn wsgi:app")
+
+
+def reload():
+    # new workers pick up the config, old ones finish their requests
+    local("kill -HUP $(cat gunicorn.pid)")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -38,18 +55,11 @@ def heroku():
     local("git push heroku master")
 
 
-def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
-
-
 def deploy():
     pull()
     test()
     commit()
     heroku()
-    heroku_test()
 
 # rollback
 
@@ -0,0 +1,115 @@
+"""
+gunicorn settings, read automatically when gunicorn is started from this
+folder: gunicorn wsgi:app
+
+Every setting can be overridden from the environment (or the .env file):
+
+  PORT                         port to listen on (8000)
+  GUNICORN_WORKER_CLASS        'gthread' (default) or 'gevent'
+  GUNICORN_WORKERS             worker processes, from the CPU count by default
+  GUNICORN_THREADS             threads per gthread worker (4)
+  GUNICORN_WORKER_CONNECTIONS  concurrent requests per gevent worker (50)
+  GUNICORN_PRELOAD             import the app once in the master (true,
+                               false with gevent)
+  PROMETHEUS_MULTIPROC_DIR     directory through which /metrics adds up
+                               the metrics of all the workers, emptied
+                               on start
+
+Reloads are graceful: `kill -HUP <master pid>` starts new workers and lets
+the old ones finish their requests (up to graceful_timeout seconds). With
+preload_app the code is imported by the master, so deploying new code
+needs `kill -USR2` (new master) then `kill -TERM` of the old master.
+"""
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+
+# ----------------------------------------------------------------------------#
+# Workers.
+# ----------------------------------------------------------------------------#
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+cpus = multiprocessing.cpu_count()
+if worker_class == 'gevent':
+    # one process per CPU, each serving many requests while they wait on the
+    # database; keep worker_connections close to the DB pool size
+    # (DB_POOL_SIZE + DB_MAX_OVERFLOW) or requests queue on the pool
+    workers = int(os.getenv('GUNICORN_WORKERS', cpus))
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 50))
+else:
+    # the usual 2 x CPUs + 1 processes, with a few threads each to overlap
+    # database round trips; threads must not exceed the DB pool size
+    workers = int(os.getenv('GUNICORN_WORKERS', cpus * 2 + 1))
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# The 'memory' detail page cache is per process: another worker would keep
+# serving a page after a write invalidated it in this one.
+from config import get_config  # noqa: E402
+
+if workers > 1 and get_config(os.getenv('FYYUR_ENV', 'production')).CACHE_BACKEND == 'memory':
+    raise RuntimeError("CACHE_BACKEND = memory is not shared between the gunicorn workers: "
+                       "use redis (CACHE_REDIS_URL) or set GUNICORN_WORKERS to 1")
+
+# Importing the app (Flask, SQLAlchemy models, templates setup) once in the
+# master shares that memory and start-up time across workers. gevent must
+# monkey patch before anything is imported, so it is off by default there.
+preload_app = env_bool('GUNICORN_PRELOAD', worker_class != 'gevent')
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then, with jitter so they don't all restart at once
+max_requests = 1000
+max_requests_jitter = 100
+
+pidfile = os.getenv('GUNICORN_PIDFILE', 'gunicorn.pid')
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')  # e.g. '-' for stdout
+errorlog = '-'
+
+
+# ----------------------------------------------------------------------------#
+# Hooks.
+# ----------------------------------------------------------------------------#
+
+def on_starting(server):
+    # the worker metrics of a previous run (see metrics.ProcessFiles)
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.json.tmp')):
+            os.remove(os.path.join(directory, name))
+
+
+def post_fork(server, worker):
+    # A preloaded app was created in the master: its database connections
+    # must not be shared with the forked workers, which open their own.
+    if not server.cfg.preload_app:
+        return
+    from models import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+    replicas = app.extensions.get('replicas')
+    for engine in replicas.engines if replicas else ():
+        engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # psycopg2 blocks the whole gevent worker unless told to yield
+    # (optional dependency, only needed with gevent)
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
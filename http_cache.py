@@ -0,0 +1,155 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import get_flashed_messages, make_response, request, session
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, scoped_session
+
+from models import db, app, Venue, Artist, Show, TableVersion
+
+
+# ----------------------------------------------------------------------------#
+# Table versions.
+# ----------------------------------------------------------------------------#
+
+def mark_written(connection, *models):
+    """
+    Records that the transaction of connection writes to the tables of
+    models: their TableVersion rows are bumped when it commits. The ORM
+    writes are recorded by collect_written_tables, the Core writes must
+    call it.
+    Args:
+      connection: connection (or session) running the writes
+      models: model classes
+    """
+    if isinstance(connection, (Session, scoped_session)):
+        connection = connection.connection()
+    connection.info.setdefault('written_tables', set()).update(
+        model.__tablename__ for model in models)
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_written_tables(db_session, flush_context):
+    models = {type(entity) for entity in db_session.new | db_session.deleted}
+    models.update(type(entity) for entity in db_session.dirty if db_session.is_modified(entity))
+    if models & {Venue, Artist} & {type(entity) for entity in db_session.deleted}:
+        # their shows are deleted by the database
+        models.add(Show)
+    if models:
+        mark_written(db_session.connection(), *models)
+
+
+def upsert_table_versions(dialect_name):
+    statement = {'postgresql': postgresql, 'sqlite': sqlite}[dialect_name].insert(TableVersion.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'version': TableVersion.version + 1, 'updated_at': statement.excluded.updated_at})
+
+
+@event.listens_for(Engine, 'commit')
+def bump_table_versions(connection):
+    # last statement of the transaction: the rows stay locked only for the
+    # commit, and are locked in name order, so concurrent writers can't
+    # deadlock on them
+    tables = connection.info.pop('written_tables', None)
+    if tables:
+        now = datetime.now()
+        connection.execute(upsert_table_versions(connection.dialect.name), [
+            {'name': name, 'version': 1, 'updated_at': now} for name in sorted(tables)])
+
+
+@event.listens_for(Engine, 'rollback')
+def discard_written_tables(connection):
+    connection.info.pop('written_tables', None)
+
+
+def table_versions(*models):
+    """
+    Versions of whole tables, from one primary key lookup
+    Args:
+      models: model classes
+    Returns:
+      Tuple with, for each model, the version of its table and when it was
+      last bumped (0 and None before any write): any committed insert,
+      update or delete changes them
+    """
+    names = [model.__tablename__ for model in models]
+    versions = {name: (version, updated_at) for name, version, updated_at in db.session.execute(
+        db.select(TableVersion.name, TableVersion.version, TableVersion.updated_at).where(
+            TableVersion.name.in_(names)))}
+    return tuple(value for name in names for value in versions.get(name, (0, None)))
+
+
+# ----------------------------------------------------------------------------#
+# Conditional GET.
+# ----------------------------------------------------------------------------#
+
+def has_session():
+    """
+    Tells whether the client sent a session cookie: the session is only read
+    then, as reading it makes the response vary on Cookie
+    """
+    return app.config['SESSION_COOKIE_NAME'] in request.cookies
+
+
+@app.template_global('get_flashed_messages')
+def get_session_flashed_messages(*args, **kwargs):
+    # the layouts render the flash messages of every page: a client without
+    # a session has none
+    return get_flashed_messages(*args, **kwargs) if has_session() else []
+
+
+def conditional(version):
+    """
+    Makes a GET view answer conditional requests. version receives the view
+    arguments and returns a tuple that changes whenever the rendered page
+    would (None to skip validation, e.g. for a missing entity). The ETag is
+    a hash of that tuple and of the request path and query string, so a
+    matching If-None-Match gets a 304 without the view, and its templates,
+    being run; without If-None-Match, If-Modified-Since is checked against
+    the latest datetime of the tuple, sent as Last-Modified. The
+    Cache-Control policy comes from HTTP_CACHE_CONTROL, keyed by endpoint
+    name, and is private for the clients with a session.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # pages render the pending flash messages, they must not be
+            # replaced by a cached copy
+            private = has_session()
+            state = None if private and '_flashes' in session else version(**kwargs)
+            if state is None:
+                return view(**kwargs)
+            etag = hashlib.sha1(
+                repr((request.full_path, state)).encode()).hexdigest()
+            # the timestamps are naive local times (datetime.now), HTTP dates
+            # are UTC and to the second
+            modified = [value.astimezone(timezone.utc).replace(microsecond=0)
+                        for value in state if isinstance(value, datetime)]
+            last_modified = max(modified, default=None)
+            if request.if_none_match:
+                # weak comparison: compressed pages carry a weak ETag
+                fresh = request.if_none_match.contains_weak(etag)
+            else:
+                fresh = (last_modified is not None and request.if_modified_since is not None
+                         and last_modified <= request.if_modified_since)
+            if fresh:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(view(**kwargs))
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            if private:
+                # the page may show what the client just wrote, read from the
+                # primary (see routing.replica_reads): no shared copy of it
+                response.headers['Cache-Control'] = 'private, no-cache'
+            else:
+                response.headers['Cache-Control'] = app.config['HTTP_CACHE_CONTROL'].get(
+                    request.endpoint, app.config['HTTP_CACHE_CONTROL_DEFAULT'])
+            return response
+        return wrapper
+    return decorator
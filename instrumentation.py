@@ -0,0 +1,106 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from flask.logging import default_handler, has_level_handler
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import app
+
+# one line per request, on stderr: kept out of app.logger, whose error.log
+# file is for warnings and errors
+request_log = logging.getLogger('fyyur.requests')
+request_log.setLevel(logging.INFO)
+if not has_level_handler(request_log):
+    # as Flask does for app.logger
+    request_log.addHandler(default_handler)
+
+
+# ----------------------------------------------------------------------------#
+# Per-request SQL and template timings.
+# ----------------------------------------------------------------------------#
+
+def statement_shape(statement):
+    """Collapses whitespace and expanded IN lists so repeated queries compare equal"""
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return re.sub(r'IN \((?:[^()]|\([^()]*\))*\)', 'IN (...)', statement)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['statement_started'].pop()
+    if not has_request_context() or 'sql_count' not in g:
+        return
+    g.sql_count += 1
+    g.sql_time += elapsed
+    g.sql_shapes[statement_shape(statement)] += 1
+    if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+        app.logger.warning('slow query %.1fms on %s %s: %s', elapsed * 1000,
+                           request.method, request.path, statement_shape(statement))
+
+
+@before_render_template.connect_via(app)
+def start_render(sender, template, context, **extra):
+    if 'render_started' in g:
+        g.render_started = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def end_render(sender, template, context, **extra):
+    if g.get('render_started'):
+        g.render_time += time.perf_counter() - g.render_started
+        g.render_started = 0
+
+
+@app.before_request
+def start_request():
+    if not app.config['INSTRUMENTATION_ENABLED']:
+        return
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+    g.sql_shapes = Counter()
+    g.render_started = 0
+    g.render_time = 0.0
+
+
+@app.after_request
+def report_request(response):
+    """
+    Adds a Server-Timing header and logs one JSON line per request with the
+    statement count, DB and template time, flagging N+1 patterns: the same
+    statement shape run more than N_PLUS_ONE_THRESHOLD times
+    """
+    if 'request_started' not in g:
+        return response
+    total = time.perf_counter() - g.request_started
+    response.headers['Server-Timing'] = (
+        f'db;dur={g.sql_time * 1000:.1f};desc="{g.sql_count} statements", '
+        f'tpl;dur={g.render_time * 1000:.1f}, total;dur={total * 1000:.1f}')
+    repeated = {shape: count for shape, count in g.sql_shapes.items()
+                if count > app.config['N_PLUS_ONE_THRESHOLD']}
+    line = {
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "total_ms": round(total * 1000, 1),
+        "db_ms": round(g.sql_time * 1000, 1),
+        "statements": g.sql_count,
+        "template_ms": round(g.render_time * 1000, 1),
+    }
+    if repeated:
+        line["n_plus_one"] = repeated
+        request_log.warning('request %s', json.dumps(line))
+    else:
+        request_log.info('request %s', json.dumps(line))
+    return response
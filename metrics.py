@@ -0,0 +1,320 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from models import db, app
+from cache import detail_cache
+
+
+# ----------------------------------------------------------------------------#
+# Metrics.
+# ----------------------------------------------------------------------------#
+
+class Metrics:
+    """
+    Counters, gauges and histograms of this process, kept in memory. Labels
+    are limited to endpoint names, status classes, exception class names
+    and pool names, so their number stays bounded whatever the URLs
+    requested (ids never become labels).
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)      # (name, labels) -> value
+        self.gauges = defaultdict(float)
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            self.counters[name, labels] += value
+
+    def add(self, name, labels=(), value=1):
+        with self.lock:
+            self.gauges[name, labels] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            histogram = self.histograms.setdefault(
+                (name, labels), [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        """
+        Returns:
+          Dict of the counters, gauges and histograms, as lists of
+          [name, labels, value] that survive a JSON round trip
+        """
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, labels, value] for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, labels, list(value)]
+                               for (name, labels), value in self.histograms.items()],
+            }
+
+
+def merge(snapshots):
+    """
+    Adds up snapshots of Metrics, e.g. of several processes
+    Returns:
+      Dict of the counters, gauges and histograms, by (name, labels)
+    """
+    merged = {'counters': defaultdict(float), 'gauges': defaultdict(float), 'histograms': {}}
+    for snapshot in snapshots:
+        for kind in ('counters', 'gauges'):
+            for name, labels, value in snapshot.get(kind, ()):
+                merged[kind][name, tuple(map(tuple, labels))] += value
+        for name, labels, histogram in snapshot.get('histograms', ()):
+            key = name, tuple(map(tuple, labels))
+            total = merged['histograms'].get(key, [0] * len(histogram))
+            merged['histograms'][key] = [a + b for a, b in zip(total, histogram)]
+    return merged
+
+
+def render(merged, buckets):
+    """
+    Returns:
+      str, the Prometheus text exposition of merged metrics
+    """
+    def labels_text(labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+    lines = []
+    typed = set()
+    for kind in ('counter', 'gauge'):
+        for (name, labels), value in sorted(merged[kind + 's'].items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} {kind}')
+                typed.add(name)
+            lines.append(f'{name}{labels_text(labels)} {value!r}')
+    for (name, labels), histogram in sorted(merged['histograms'].items()):
+        if name not in typed:
+            lines.append(f'# TYPE {name} histogram')
+            typed.add(name)
+        for bound, count in zip(buckets, histogram):
+            lines.append(f'{name}_bucket{labels_text(labels, [("le", f"{bound:g}")])} {count}')
+        lines.append(f'{name}_bucket{labels_text(labels, [("le", "+Inf")])} {histogram[-1]}')
+        lines.append(f'{name}_sum{labels_text(labels)} {histogram[-2]!r}')
+        lines.append(f'{name}_count{labels_text(labels)} {histogram[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+# ----------------------------------------------------------------------------#
+# Worker processes.
+# ----------------------------------------------------------------------------#
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ProcessFiles:
+    """
+    Shares the metrics of the processes of a server (e.g. the gunicorn
+    workers) through a directory: each process writes its own to
+    <pid>.json every flush_interval seconds, from a daemon thread, and
+    /metrics adds up the files of the others to its own, whichever process
+    serves it. The counters and histograms of the processes that exited
+    are kept, so the totals don't go down when a worker is recycled, their
+    gauges are not. The directory must be emptied when the server starts
+    (see on_starting in gunicorn.conf.py).
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def start(self, snapshot):
+        # (re)started lazily in each process: threads don't survive a fork
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                os.makedirs(self.directory, exist_ok=True)
+                threading.Thread(target=self.run, args=(snapshot,), name='metrics-files',
+                                 daemon=True).start()
+                # the requests served since the last flush
+                atexit.register(self.write, snapshot)
+                self.pid = os.getpid()
+
+    def run(self, snapshot):
+        while True:
+            time.sleep(self.flush_interval)
+            self.write(snapshot)
+
+    def write(self, snapshot):
+        path = self.path(os.getpid())
+        # written aside then renamed: readers never see half a file
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def read(self):
+        """
+        Returns:
+          List of the snapshots of the other processes
+        """
+        snapshots = []
+        for name in os.listdir(self.directory):
+            pid, extension = os.path.splitext(name)
+            if extension != '.json' or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not alive(int(pid)):
+                snapshot.pop('gauges', None)
+            snapshots.append(snapshot)
+        return snapshots
+
+
+metrics = Metrics(app.config['METRICS_LATENCY_BUCKETS'])
+process_files = (ProcessFiles(app.config['METRICS_MULTIPROC_DIR'], app.config['METRICS_FLUSH_SECONDS'])
+                 if app.config['METRICS_MULTIPROC_DIR'] else None)
+
+
+def endpoint_label():
+    # unknown URLs (404s) share a single label
+    return request.endpoint if request.endpoint in app.view_functions else 'unmatched'
+
+
+# ----------------------------------------------------------------------------#
+# Requests.
+# ----------------------------------------------------------------------------#
+
+@app.before_request
+def start_metrics():
+    if process_files is not None:
+        process_files.start(process_snapshot)
+    g.metrics_started = time.perf_counter()
+    metrics.add('fyyur_requests_in_flight', (('endpoint', endpoint_label()),))
+
+
+@app.after_request
+def count_response(response):
+    labels = (('endpoint', endpoint_label()),
+              ('status', f'{response.status_code // 100}xx'))
+    metrics.inc('fyyur_requests_total', labels)
+    if response.status_code >= 500:
+        metrics.inc('fyyur_errors_total', labels)
+    return response
+
+
+@app.teardown_request
+def end_metrics(exc):
+    # runs even when the view raised, so the in-flight gauge stays right
+    if 'metrics_started' not in g:
+        return
+    endpoint = (('endpoint', endpoint_label()),)
+    metrics.add('fyyur_requests_in_flight', endpoint, -1)
+    metrics.observe('fyyur_request_duration_seconds', endpoint,
+                    time.perf_counter() - g.metrics_started)
+    if exc is not None:
+        metrics.inc('fyyur_exceptions_total',
+                    endpoint + (('exception', type(exc).__name__),))
+
+
+# ----------------------------------------------------------------------------#
+# Connection pool.
+# ----------------------------------------------------------------------------#
+
+@event.listens_for(Pool, 'connect')
+def count_connect(dbapi_connection, connection_record):
+    metrics.inc('fyyur_db_pool_connections_created_total')
+
+
+@event.listens_for(Engine, 'engine_connect')
+def count_checkout(connection):
+    # a Connection checks a connection out of its engine's pool; the pools
+    # are named by their pool_logging_name: primary, replica or async
+    metrics.inc('fyyur_db_pool_checkouts_total',
+                (('pool', connection.engine.pool.logging_name or 'other'),))
+
+
+@event.listens_for(Pool, 'invalidate')
+def count_invalidate(dbapi_connection, connection_record, exception):
+    metrics.inc('fyyur_db_pool_invalidations_total')
+
+
+def pool_gauges():
+    """
+    Returns:
+      List of ((name, labels), value) describing the pool right now
+    """
+    pool = db.engine.pool
+    gauges = []
+    for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+        # not every pool class (e.g. SQLite's) has all of them
+        if hasattr(pool, name):
+            gauges.append([f'fyyur_db_pool_{name}', (('pool', 'primary'),), getattr(pool, name)()])
+    return gauges
+
+
+CACHE_LABELS = (('cache', 'detail'),)
+
+
+def cache_counters():
+    # counted by the cache itself, since this process started
+    stats = detail_cache.stats()
+    return [[f'fyyur_cache_{name}_total', CACHE_LABELS, stats[name]]
+            for name in ('hits', 'misses', 'evictions')]
+
+
+def process_snapshot():
+    """
+    Returns:
+      snapshot of the metrics of this process, see Metrics.snapshot
+    """
+    snapshot = metrics.snapshot()
+    snapshot['counters'] += cache_counters()
+    # also called from the ProcessFiles thread
+    with app.app_context():
+        snapshot['gauges'] += pool_gauges()
+    return snapshot
+
+
+def render_metrics():
+    """
+    Returns:
+      str, the metrics of this process, added up with those of the other
+      processes with METRICS_MULTIPROC_DIR, in the Prometheus text format
+    """
+    snapshots = [process_snapshot()]
+    if process_files is not None:
+        process_files.start(process_snapshot)
+        snapshots += process_files.read()
+    merged = merge(snapshots)
+    lookups = sum(merged['counters'][f'fyyur_cache_{name}_total', CACHE_LABELS]
+                  for name in ('hits', 'misses'))
+    merged['gauges']['fyyur_cache_hit_ratio', CACHE_LABELS] = (
+        merged['counters']['fyyur_cache_hits_total', CACHE_LABELS] / lookups if lookups else 0)
+    return render(merged, metrics.buckets)
@@ -0,0 +1,30 @@
+"""Table versions validating the listing pages
+
+Revision ID: 3b8e6f2a9c71
+Revises: d27f5b9e4c13
+Create Date: 2026-10-18 21:14:03.552817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8e6f2a9c71'
+down_revision = 'd27f5b9e4c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the rows are created by the first commit writing to each table
+    op.create_table('TableVersion',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('TableVersion')
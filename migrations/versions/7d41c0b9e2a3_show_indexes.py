@@ -0,0 +1,31 @@
+"""Index the hot Show predicates
+
+Revision ID: 7d41c0b9e2a3
+Revises: 25ac7cc208cd
+Create Date: 2026-10-18 09:12:40.118305
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7d41c0b9e2a3'
+down_revision = '25ac7cc208cd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.create_index('ix_Show_venue_id_start_time', ['venue_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_Show_artist_id_start_time', ['artist_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_Show_start_time', ['start_time'], unique=False)
+        batch_op.create_unique_constraint('uq_Show_venue_id_artist_id_start_time', ['venue_id', 'artist_id', 'start_time'])
+
+
+def downgrade():
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_Show_venue_id_artist_id_start_time', type_='unique')
+        batch_op.drop_index('ix_Show_start_time')
+        batch_op.drop_index('ix_Show_artist_id_start_time')
+        batch_op.drop_index('ix_Show_venue_id_start_time')
@@ -0,0 +1,46 @@
+"""Area rollup without the venue lists, venues paged by area from Venue
+
+Revision ID: 9c5e2d7b4a18
+Revises: 3b8e6f2a9c71
+Create Date: 2026-10-18 23:42:16.803154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c5e2d7b4a18'
+down_revision = '3b8e6f2a9c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Area', schema=None) as batch_op:
+        batch_op.drop_column('venues')
+
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.drop_index('ix_Venue_state_city')
+    op.create_index('ix_Venue_area', 'Venue', [
+        sa.text("coalesce(state, '')"), sa.text("coalesce(city, '')"), 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_area', table_name='Venue')
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.create_index('ix_Venue_state_city', ['state', 'city'], unique=False)
+
+    with op.batch_alter_table('Area', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('venues', sa.JSON(), nullable=False, server_default='[]'))
+    # the venue lists, as areas.py maintained them
+    bind = op.get_bind()
+    venues = bind.execute(sa.text(
+        'SELECT city, state, id, name, upcoming_show_count FROM "Venue" ORDER BY id'))
+    areas = {}
+    for city, state, id, name, count in venues:
+        areas.setdefault((city or '', state or ''), []).append(
+            {"id": id, "name": name, "num_upcoming_shows": count})
+    area = sa.table('Area', sa.column('city'), sa.column('state'), sa.column('venues', sa.JSON()))
+    for (city, state), rows in areas.items():
+        bind.execute(area.update().where(area.c.city == city, area.c.state == state).values(venues=rows))
@@ -0,0 +1,34 @@
+"""Delete the shows of a venue or artist with it, in the database
+
+Revision ID: a9d4c7e2b815
+Revises: f81b3c6d0e52
+Create Date: 2026-10-18 17:48:31.602914
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4c7e2b815'
+down_revision = 'f81b3c6d0e52'
+branch_labels = None
+depends_on = None
+
+# names postgres gave the unnamed foreign keys of the initial migration,
+# also used to find them when SQLite recreates the table
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def replace_foreign_keys(ondelete):
+    with op.batch_alter_table('Show', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        for table, column in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+            batch_op.drop_constraint(f'Show_{column}_fkey', type_='foreignkey')
+            batch_op.create_foreign_key(f'Show_{column}_fkey', table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
@@ -0,0 +1,33 @@
+"""Trigram indexes for the venue and artist name search
+
+Revision ID: b3e98f1a5c27
+Revises: 7d41c0b9e2a3
+Create Date: 2026-10-18 10:05:12.504871
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e98f1a5c27'
+down_revision = '7d41c0b9e2a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.create_index('ix_Venue_name_trgm', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+    with op.batch_alter_table('Artist', schema=None) as batch_op:
+        batch_op.create_index('ix_Artist_name_trgm', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    with op.batch_alter_table('Artist', schema=None) as batch_op:
+        batch_op.drop_index('ix_Artist_name_trgm', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.drop_index('ix_Venue_name_trgm', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
@@ -0,0 +1,40 @@
+"""Upcoming show counters on venues and artists
+
+Revision ID: c4d2e8a71b06
+Revises: e5a1f03c9d84
+Create Date: 2026-10-18 15:21:40.218734
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2e8a71b06'
+down_revision = 'e5a1f03c9d84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, show_fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('next_show_at', sa.DateTime(), nullable=True))
+            batch_op.create_index(f'ix_{table}_next_show_at', ['next_show_at'], unique=False)
+        # start times are naive local times, as written by the app
+        op.get_bind().execute(sa.text(
+            f'UPDATE "{table}" SET '
+            f'upcoming_show_count = (SELECT count(*) FROM "Show" WHERE "Show".{show_fk} = "{table}".id AND "Show".start_time >= :now), '
+            f'next_show_at = (SELECT min("Show".start_time) FROM "Show" WHERE "Show".{show_fk} = "{table}".id AND "Show".start_time >= :now)'
+        ), {"now": datetime.now()})
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_next_show_at')
+            batch_op.drop_column('next_show_at')
+            batch_op.drop_column('upcoming_show_count')
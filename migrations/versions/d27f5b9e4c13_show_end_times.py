@@ -0,0 +1,73 @@
+"""Show end times and no overlapping shows per venue or artist
+
+Revision ID: d27f5b9e4c13
+Revises: a9d4c7e2b815
+Create Date: 2026-10-18 18:36:54.218069
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd27f5b9e4c13'
+down_revision = 'a9d4c7e2b815'
+branch_labels = None
+depends_on = None
+
+# SHOW_DEFAULT_DURATION_MINUTES when this migration was written
+DEFAULT_DURATION_MINUTES = 120
+
+
+def upgrade():
+    bind = op.get_bind()
+    # shows starting at the same time at a venue or with an artist can't
+    # be given an end time, they have to be resolved by hand first
+    double_booked = bind.execute(sa.text(
+        'SELECT DISTINCT "Show".id FROM "Show" JOIN "Show" other ON other.id != "Show".id '
+        'AND other.start_time = "Show".start_time '
+        'AND (other.venue_id = "Show".venue_id OR other.artist_id = "Show".artist_id) '
+        'ORDER BY "Show".id')).scalars().all()
+    if double_booked:
+        raise RuntimeError(
+            f"{len(double_booked)} shows start at the same time as another show of their venue "
+            f"or artist, delete or move them before upgrading: {double_booked[:100]}")
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    # existing shows get the default duration, cut short by the next show at
+    # the same venue or with the same artist
+    end_time = {
+        'postgresql': f"start_time + interval '{DEFAULT_DURATION_MINUTES} minutes'",
+        # in the format of SQLAlchemy, fractional seconds included
+        'sqlite': f"strftime('%Y-%m-%d %H:%M:%S', start_time, '+{DEFAULT_DURATION_MINUTES} minutes') || substr(start_time, 20)",
+    }[bind.dialect.name]
+    op.execute(f'UPDATE "Show" SET end_time = {end_time}')
+    for show_fk in ('venue_id', 'artist_id'):
+        op.execute(
+            f'UPDATE "Show" SET end_time = COALESCE((SELECT min(next.start_time) FROM "Show" next '
+            f'WHERE next.{show_fk} = "Show".{show_fk} AND next.start_time > "Show".start_time '
+            f'AND next.start_time < "Show".end_time), end_time)')
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_Show_end_time_after_start_time', 'end_time > start_time')
+
+    if bind.dialect.name == 'postgresql':
+        # GiST equality on the integer ids
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for show_fk in ('venue_id', 'artist_id'):
+            op.create_exclude_constraint(
+                f'ex_Show_{show_fk}_time', 'Show', (show_fk, '='),
+                (sa.func.tsrange(sa.column('start_time'), sa.column('end_time')), '&&'),
+                using='gist')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for show_fk in ('artist_id', 'venue_id'):
+            op.drop_constraint(f'ex_Show_{show_fk}_time', 'Show')
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_constraint('ck_Show_end_time_after_start_time', type_='check')
+        batch_op.drop_column('end_time')
@@ -0,0 +1,32 @@
+"""Row version and updated_at columns for HTTP validators
+
+Revision ID: e5a1f03c9d84
+Revises: b3e98f1a5c27
+Create Date: 2026-10-18 11:47:03.662019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a1f03c9d84'
+down_revision = 'b3e98f1a5c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite cannot ALTER TABLE ADD COLUMN with a CURRENT_TIMESTAMP default
+    recreate = 'always' if op.get_bind().dialect.name == 'sqlite' else 'auto'
+    for table in ('Venue', 'Artist', 'Show'):
+        with op.batch_alter_table(table, schema=None, recreate=recreate) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('version')
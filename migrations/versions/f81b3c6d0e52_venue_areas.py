@@ -0,0 +1,51 @@
+"""Area rollup of the venue directory
+
+Revision ID: f81b3c6d0e52
+Revises: c4d2e8a71b06
+Create Date: 2026-10-18 17:05:12.470391
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f81b3c6d0e52'
+down_revision = 'c4d2e8a71b06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    area = op.create_table('Area',
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('venues', sa.JSON(), nullable=False),
+    sa.Column('venue_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('state', 'city')
+    )
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.create_index('ix_Venue_state_city', ['state', 'city'], unique=False)
+
+    # fill the rollup from the existing venues, as areas.py maintains it
+    venues = op.get_bind().execute(sa.text(
+        'SELECT city, state, id, name, upcoming_show_count FROM "Venue" ORDER BY id'))
+    areas = {}
+    for city, state, id, name, count in venues:
+        areas.setdefault((city or '', state or ''), []).append(
+            {"id": id, "name": name, "num_upcoming_shows": count})
+    if areas:
+        op.bulk_insert(area, [
+            {"city": city, "state": state, "venues": rows, "venue_count": len(rows),
+             "updated_at": datetime.now()}
+            for (city, state), rows in areas.items()])
+
+
+def downgrade():
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.drop_index('ix_Venue_state_city')
+
+    op.drop_table('Area')
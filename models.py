@@ -1,8 +1,16 @@
-from flask import Flask
+from datetime import datetime, timedelta
+import sqlite3
+from flask import Flask, has_request_context, request
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.dialects.postgresql import ARRAY, JSON
+from sqlalchemy.dialects.postgresql import ARRAY, JSON, ExcludeConstraint
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import object_session
+from routing import RoutingSession, pin_primary_after_writes
+from config import get_config
+from serializers import JSONProvider
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -10,18 +18,69 @@ from flask_migrate import Migrate
 
 app = Flask(__name__)
 moment = Moment(app)
-# loads config.py file and loads all the UPPERCASE variables inside it into the app config flask dictionary object
+# loads the config class of FYYUR_ENV (development by default) from config.py and all the UPPERCASE
+# variables inside it into the app config flask dictionary object
 # i.e. debug mode, local database URI, secret key
-app.config.from_object('config')
+app.config.from_object(get_config())
+# jsonify() through orjson when installed, see serializers.py
+app.json = JSONProvider(app)
 
 # connect to a local postgresql database
 # this is done above using the URI in the config.py file
-db = SQLAlchemy(app)
+# read-only requests can be routed to replicas, see routing.py
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+app.after_request(pin_primary_after_writes)
 
 # instantiate migrate client
 migrate = Migrate(app, db)
 
 
+@event.listens_for(db.session, 'after_begin')
+def set_statement_timeout(session, transaction, connection):
+    # SET LOCAL only lasts for the transaction, which keeps it safe behind
+    # PgBouncer in transaction mode
+    if connection.dialect.name != 'postgresql' or not has_request_context():
+        return
+    request_class = 'read' if request.method in ('GET', 'HEAD') else 'write'
+    timeout = int(app.config['STATEMENT_TIMEOUT_MS'][request_class])
+    connection.exec_driver_sql(f'SET LOCAL statement_timeout = {timeout}')
+
+
+def invalidate_after_commit(session, *indexes):
+    """
+    Invalidates in-process indexes (search.TrigramIndex,
+    scheduling.CalendarIndex) once the session commits: invalidated any
+    earlier, a concurrent rebuild could read the data as it was before the
+    commit and be taken as up to date
+    """
+    session.info.setdefault('invalidate_after_commit', set()).update(indexes)
+
+
+def invalidate_on_commit(index):
+    """
+    Returns:
+      mapper event listener invalidating index once the session of the
+      written object commits, see invalidate_after_commit
+    """
+    def listener(mapper, connection, target):
+        invalidate_after_commit(object_session(target), index)
+    return listener
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_committed(session):
+    for index in session.info.pop('invalidate_after_commit', ()):
+        index.invalidate()
+
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys, and so cascades deletes, when asked
+    # to on each connection
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys = ON')
+
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
@@ -39,11 +98,30 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     #description = db.Column(db.String(500))
-    genres = db.Column(ARRAY(db.String))         # allows to query Venue.query.filter(Venue.genres.any('Jazz')).all() - alternative is genres = db.Column(JSON)
+    genres = db.Column(ARRAY(db.String).with_variant(JSON, 'sqlite'))         # allows to query Venue.query.filter(Venue.genres.any('Jazz')).all() - alternative is genres = db.Column(JSON)
     #capacity = db.Column(db.Integer)
     seeking_talent = db.Column(db.Boolean, nullable=False, default=True)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='venue', lazy=True, cascade="all, delete")
+    # the database deletes the shows (ON DELETE CASCADE), they are not loaded for it
+    shows = db.relationship('Show', backref='venue', lazy=True, cascade="all, delete", passive_deletes=True)
+    # bumped on every write, used to build the HTTP validators (ETag, Last-Modified)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=db.func.now())
+    __mapper_args__ = {'version_id_col': version}
+    # shows starting now or later, maintained on write and aged by show_counters.py
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+
+    # trigram index serving the case-insensitive partial name search, and
+    # the index finding the counters to age
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_next_show_at', 'next_show_at'),
+        # the venue directory (areas.directory): by area then id, missing
+        # cities and states as ''
+        db.Index('ix_Venue_area', db.func.coalesce(state, db.literal_column("''")),
+                 db.func.coalesce(city, db.literal_column("''")), 'id'),
+    )
 
 
 class Artist(db.Model):
@@ -54,23 +132,90 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(ARRAY(db.String))
+    genres = db.Column(ARRAY(db.String).with_variant(JSON, 'sqlite'))    # JSON on sqlite (benchmarks)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     #description = db.Column(db.String(500))
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=True)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='artist', lazy=True, cascade="all, delete")
+    # the database deletes the shows (ON DELETE CASCADE), they are not loaded for it
+    shows = db.relationship('Show', backref='artist', lazy=True, cascade="all, delete", passive_deletes=True)
+    # bumped on every write, used to build the HTTP validators (ETag, Last-Modified)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=db.func.now())
+    __mapper_args__ = {'version_id_col': version}
+    # shows starting now or later, maintained on write and aged by show_counters.py
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+
+    # trigram index serving the case-insensitive partial name search, and
+    # the index finding the counters to age
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_next_show_at', 'next_show_at'),
+    )
+
+
+def default_end_time(context):
+    # shows scheduled without an end last SHOW_DEFAULT_DURATION_MINUTES
+    return context.get_current_parameters()['start_time'] + timedelta(
+        minutes=app.config['SHOW_DEFAULT_DURATION_MINUTES'])
 
 
 class Show(db.Model):
     __tablename__ = 'Show'
-    
+    # postgres does not index foreign keys on its own: these cover the
+    # venue/artist detail pages, the upcoming counts and the /shows feed.
+    # The exclusion constraints (GiST, btree_gist for the ids) keep a venue
+    # or an artist from having two overlapping shows; [start, end) ranges
+    # let a show start when the previous one ends. Other databases rely on
+    # the check of scheduling.py.
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time', 'start_time'),
+        db.UniqueConstraint('venue_id', 'artist_id', 'start_time', name='uq_Show_venue_id_artist_id_start_time'),
+        db.CheckConstraint('end_time > start_time', name='ck_Show_end_time_after_start_time'),
+        ExcludeConstraint(('venue_id', '='), (db.func.tsrange(db.column('start_time'), db.column('end_time')), '&&'),
+                          name='ex_Show_venue_id_time', using='gist').ddl_if(dialect='postgresql'),
+        ExcludeConstraint(('artist_id', '='), (db.func.tsrange(db.column('start_time'), db.column('end_time')), '&&'),
+                          name='ex_Show_artist_id_time', using='gist').ddl_if(dialect='postgresql'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+    # bumped on every write, used to build the HTTP validators (ETag, Last-Modified)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=db.func.now())
+    __mapper_args__ = {'version_id_col': version}
+
+
+class Area(db.Model):
+    # areas of the venue directory by city and state and their venue counts,
+    # kept up to date from the venues by areas.py
+    __tablename__ = 'Area'
+
+    # missing cities or states are stored as ''
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    # the venues themselves are read from Venue, in ix_Venue_area order
+    venue_count = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=db.func.now())
+
+
+class TableVersion(db.Model):
+    # one row per table, bumped when a transaction writing to the table
+    # commits (see http_cache.py): the validators of the listing pages read
+    # it instead of aggregating the tables
+    __tablename__ = 'TableVersion'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
 
 """show_artist = db.Table('show_artist',
     db.Column('show_id', db.Integer, db.ForeignKey('Show.id'), primary_key=True),
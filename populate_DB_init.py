@@ -1,106 +1,433 @@
-from models import db, Venue, Artist, Show, app
+"""
+Bulk, idempotent loader for venues, artists and shows.
+
+usage: python populate_DB_init.py [--venues FILE] [--artists FILE]
+                                  [--shows FILE] [--chunk-size N]
+                                  [--format {json,ndjson,csv}]
+                                  [--no-validate]
+
+Files can be JSON arrays (.json), newline-delimited JSON (.ndjson, .jsonl)
+or CSV (.csv); '-' reads from stdin, with --format giving its format.
+Sources are streamed: JSON arrays are parsed incrementally, so memory
+stays constant whatever the file size. Venue and artist records are
+validated with the rules of forms.VenueForm / forms.ArtistForm and
+invalid records, malformed lines included, are reported and skipped.
+Shows are checked like the scheduled ones (scheduling.check_shows): those
+of a missing venue or artist, or double booking one, are invalid too.
+Records are inserted chunk by chunk: each chunk is checked against the
+rows already in the DB with one query on the natural key (name, city, state for venues and artists,
+venue_id, artist_id, start_time for shows), then inserted with a single
+multi-row INSERT ... ON CONFLICT DO NOTHING. Running it twice inserts
+nothing new.
+"""
+import argparse
+import csv
 import json
+import sys
+import time
+from datetime import datetime
+from contextlib import nullcontext
+from itertools import islice
 
+from sqlalchemy import and_, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from werkzeug.datastructures import MultiDict
 
-# Load JSON data
-with open("venues.json") as f:
-    venues_data = json.load(f)
+from forms import VenueForm, ArtistForm
+from models import db, Venue, Artist, Show, app, invalidate_after_commit
+from show_counters import refresh_show_counters
+from areas import adjust_areas, area_counts
+from search import fallback_indexes
+from http_cache import mark_written
+from scheduling import calendar_index, calendar_lock, check_shows, show_row, uses_calendar_index
 
-with open("artists.json") as f:
-    artists_data = json.load(f)
 
-with open("shows.json") as f:
-    shows_data = json.load(f)
+# ----------------------------------------------------------------------------#
+# Readers.
+# ----------------------------------------------------------------------------#
 
-with app.app_context():
-    for v in venues_data:
-        # Check if venue already exists (by name + city + state)
-        existing = Venue.query.filter_by(
-            name=v.get("name"),
-            city=v.get("city"),
-            state=v.get("state")
-        ).first()
+def iter_json_array(f, buffer_size=1 << 16):
+    """
+    Incrementally parses a JSON array, yielding one element at a time
+    Args:
+      f: text file object containing a JSON array
+      buffer_size: int, number of characters read at once
+    Returns:
+      Iterator over the array elements; only the element being parsed and
+      one read buffer are held in memory
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
 
-        if existing:
-            print(f"Skipping existing venue: {v.get('name')} ({v.get('city')}, {v.get('state')})")
-            continue
+    def fill():
+        # drops what has been parsed and appends the next read
+        nonlocal buffer, pos, eof
+        data = f.read(buffer_size)
+        eof = not data
+        buffer, pos = buffer[pos:] + data, 0
 
-        # Parse capacity if numeric
-        capacity_val = None
-        if v.get("capacity"):
-            to_process = v.get("capacity").split(" ")
-            numbers = [''.join(filter(str.isdigit, str(i))) for i in to_process]
-            if numbers:
-                capacity_val = max(numbers)
-            else:
-                capacity_val = None
-
-        # Create and add new venue
-        venue = Venue(
-            name=v.get("name"),
-            city=v.get("city"),
-            state=v.get("state"),
-            address=v.get("address"),
-            phone=v.get("phone"),
-            image_link=v.get("image_link"),
-            website_link=v.get("website"),
-            facebook_link=v.get("facebook_link",None),
-            #description=v.get("description","") + "\n\nCapacity: " + v.get("capacity","n.a."),
-            #capacity= capacity_val,
-            seeking_talent=v.get("seeking_talent",False),
-            seeking_description=v.get("seeking_description",None),
-            genres=v.get("genres",None),
-
-        )
-        db.session.add(venue)
-
-    for a in artists_data:
-        # Check if artist already exists (by name + city + state)
-        existing = Artist.query.filter_by(
-            name=a.get("name"),
-            city=a.get("city"),
-            state=a.get("state")
-        ).first()
-
-        if existing:
-            print(f"Skipping existing artist: {a.get('name')} ({a.get('city')}, {a.get('state')})")
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] != '[':
+        raise ValueError('expected a JSON array')
+    pos += 1
+    expect_value = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError('unterminated JSON array')
+        char = buffer[pos]
+        if char == ']':
+            return
+        if not expect_value:
+            if char != ',':
+                raise ValueError(f"expected ',' or ']' in JSON array, got {char!r}")
+            pos += 1
+            expect_value = True
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
             continue
-    
-        # Create and add new artist
-        artist = Artist(
-            name=a.get("name"),
-            city=a.get("city"),
-            state=a.get("state"),
-            phone=a.get("phone"),
-            image_link=a.get("image_link"),
-            facebook_link=a.get("facebook_link",None),
-            #description=a.get("description"),
-            seeking_venue=a.get("seeking_venue",False),
-            seeking_description=a.get("seeking_description",None),
-            genres=a.get("genres",None),
-            website_link=a.get("website",None),
-        )
-        db.session.add(artist)
-
-
-    for s in shows_data:
-        existing = Show.query.filter_by(
-            venue_id=s.get("venue_id"),
-            artist_id=s.get("artist_id"),
-            start_time=s.get("start_time")
-        ).first()
-
-        if existing:
-            print(f"Skipping existing show: {s.get('venue_id')} ({s.get('artist_id')}, {s.get('start_time')})")
+        delimiter = end
+        while delimiter < len(buffer) and buffer[delimiter].isspace():
+            delimiter += 1
+        if buffer[delimiter:delimiter + 1] not in (',', ']') and not eof:
+            # a number may continue in the next read: only accept the value
+            # once the delimiter following it has been read
+            fill()
             continue
+        pos = end
+        expect_value = False
+        yield value
+
+
+class InvalidRecord:
+    """
+    Stands in the records for one that could not be parsed
+    Attributes:
+      error: str
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_records(path, format=None):
+    """
+    Iterates over the records of a JSON array, NDJSON or CSV source. A
+    malformed NDJSON line is an InvalidRecord; past a syntax error in a
+    JSON array or CSV file the records can't be told apart, so an
+    InvalidRecord ends the iteration.
+    Args:
+      path: str, file path, or '-' for stdin
+      format: 'json', 'ndjson' or 'csv', guessed from the extension if None
+    Returns:
+      Iterator[Dict or InvalidRecord]
+    """
+    if format is None:
+        if path.endswith('.csv'):
+            format = 'csv'
+        elif path.endswith(('.ndjson', '.jsonl')):
+            format = 'ndjson'
+        else:
+            format = 'json'
+    if path == '-':
+        source = nullcontext(sys.stdin)
+    else:
+        source = open(path, newline='', encoding='utf-8')
+    with source as f:
+        try:
+            if format == 'csv':
+                yield from csv.DictReader(f)
+            elif format == 'ndjson':
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        record = InvalidRecord(f"line {number}: {e}")
+                    yield record
+            else:
+                yield from iter_json_array(f)
+        except (ValueError, csv.Error) as e:  # includes undecodable text
+            yield InvalidRecord(f"unreadable {format}, the rest of {path} is skipped: {e}")
+
+
+def chunks(records, size):
+    """Groups an iterator of records into lists of at most size records"""
+    records = iter(records)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+
+# ----------------------------------------------------------------------------#
+# Record to row conversion.
+# ----------------------------------------------------------------------------#
+
+def as_list(value):
+    # CSV cells hold lists as comma separated strings
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return value
+
+
+def as_bool(value):
+    # CSV cells hold booleans as strings
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 't', 'yes', 'y', '1')
+    return bool(value)
+
+
+def venue_row(record):
+    return {
+        "name": record.get("name"),
+        "city": record.get("city"),
+        "state": record.get("state"),
+        "address": record.get("address"),
+        "phone": record.get("phone") or None,
+        "image_link": record.get("image_link"),
+        "website_link": record.get("website") or None,
+        "facebook_link": record.get("facebook_link") or None,
+        "seeking_talent": as_bool(record.get("seeking_talent", False)),
+        "seeking_description": record.get("seeking_description") or None,
+        "genres": as_list(record.get("genres")),
+    }
+
 
-        show = Show(
-            venue_id=s.get("venue_id"),
-            artist_id=s.get("artist_id"),
-            start_time=s.get("start_time"),
-        )
-        db.session.add(show)
+def artist_row(record):
+    return {
+        "name": record.get("name"),
+        "city": record.get("city"),
+        "state": record.get("state"),
+        "phone": record.get("phone") or None,
+        "image_link": record.get("image_link"),
+        "facebook_link": record.get("facebook_link") or None,
+        "seeking_venue": as_bool(record.get("seeking_venue", False)),
+        "seeking_description": record.get("seeking_description") or None,
+        "genres": as_list(record.get("genres")),
+        "website_link": record.get("website") or None,
+    }
 
+
+# ----------------------------------------------------------------------------#
+# Validation.
+# ----------------------------------------------------------------------------#
+
+def form_validator(form_class):
+    """
+    Builds a row validator applying the field rules of a form
+    Args:
+      form_class: VenueForm or ArtistForm
+    Returns:
+      Function taking a row dict and returning the form errors (empty dict
+      when the row is valid)
+    """
+    def validate(row):
+        formdata = MultiDict()
+        for key, value in row.items():
+            if isinstance(value, list):
+                formdata.setlist(key, value)
+            elif isinstance(value, bool):
+                # unchecked boxes are simply absent from a submitted form
+                if value:
+                    formdata[key] = 'y'
+            elif value is not None:
+                formdata[key] = str(value)
+        form = form_class(formdata=formdata, meta={'csrf': False})
+        form.validate()
+        return form.errors
+    return validate
+
+
+def no_validation(row):
+    return {}
+
+
+# (model, record to row conversion, row validator, natural key columns)
+ENTITIES = {
+    "venues": (Venue, venue_row, form_validator(VenueForm),
+               ("name", "city", "state")),
+    "artists": (Artist, artist_row, form_validator(ArtistForm),
+                ("name", "city", "state")),
+    "shows": (Show, show_row, no_validation,
+              ("venue_id", "artist_id", "start_time")),
+}
+
+
+# ----------------------------------------------------------------------------#
+# Loader.
+# ----------------------------------------------------------------------------#
+
+def insert_ignoring_conflicts(table):
+    dialects = {'postgresql': postgresql, 'sqlite': sqlite}
+    dialect = dialects.get(db.engine.dialect.name)
+    if dialect is None:
+        return db.insert(table)
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+def existing_keys(model, keys, key_columns):
+    """
+    Returns:
+      Set of the natural keys among keys that are in the DB, read with one
+      query
+    """
+    columns = [model.__table__.c[column] for column in key_columns]
+    # NULL never equals NULL in a tuple IN: the keys with a missing city or
+    # state are compared one by one
+    null_keys = [and_(*[column.is_not_distinct_from(value) for column, value in zip(columns, key)])
+                 for key in keys if None in key]
+    return {tuple(key) for key in db.session.execute(select(*columns).where(or_(
+        tuple_(*columns).in_([key for key in keys if None not in key]), *null_keys)))}
+
+
+def check_new_shows(rows, key_columns):
+    """
+    Checks the shows of a chunk that are not in the DB yet for double
+    bookings and missing venues or artists, see scheduling.check_shows;
+    insert_chunk skips the others
+    Args:
+      rows: Dict[index, row] of show_row rows, by record number
+    Returns:
+      List[Dict[index, error]] of the invalid rows
+    """
+    keys = {index: tuple(row[column] for column in key_columns) for index, row in rows.items()}
+    seen = existing_keys(Show, set(keys.values()), key_columns)
+    new_rows = {}
+    for index, row in rows.items():
+        if keys[index] not in seen:
+            seen.add(keys[index])
+            new_rows[index] = row
+    return check_shows(new_rows) if new_rows else []
+
+
+def insert_chunk(model, rows, key_columns):
+    """
+    Inserts the rows whose natural key is not in the DB yet
+    Returns:
+      int, number of rows actually inserted
+    """
+    table = model.__table__
+    # dedupe inside the chunk, then against the DB in one query
+    new_rows = {tuple(row[column] for column in key_columns): row
+                for row in rows}
+    for existing_key in existing_keys(model, list(new_rows), key_columns):
+        new_rows.pop(existing_key, None)
+    if not new_rows:
+        return 0
+    returning = [table.c.id]
+    if model is Show:
+        returning += [table.c.venue_id, table.c.artist_id, table.c.start_time, table.c.end_time]
+    inserted = db.session.execute(
+        insert_ignoring_conflicts(table).returning(*returning),
+        list(new_rows.values())).all()
+    # bulk inserts bypass the ORM events
+    mark_written(db.session, model)
+    if model in fallback_indexes:
+        invalidate_after_commit(db.session, fallback_indexes[model])
+    if model is Venue:
+        # bulk inserts bypass the ORM: add the venues to the directory in the
+        # same transaction
+        adjust_areas(db.session, area_counts(db.session, Venue.id.in_([row.id for row in inserted])))
+    if model is Show:
+        # bulk inserts bypass the ORM: refresh the upcoming show counters of
+        # the venues and artists in the same transaction
+        now = datetime.now()
+        refresh_show_counters(db.session, Venue, now, Venue.id.in_(
+            {row['venue_id'] for row in new_rows.values()}))
+        refresh_show_counters(db.session, Artist, now, Artist.id.in_(
+            {row['artist_id'] for row in new_rows.values()}))
     db.session.commit()
+    if model is Show and uses_calendar_index():
+        # like schedule_shows, keeps the calendar of this process current
+        calendar_index.committed(inserted)
+    return len(inserted)
+
+
+def load(entity, path, chunk_size, format=None, validate_records=True):
+    """
+    Loads one source and prints inserted/skipped/invalid counts and
+    throughput
+    Returns:
+      Tuple (inserted[int], skipped[int], invalid[int])
+    """
+    model, to_row, validate, key_columns = ENTITIES[entity]
+    if not validate_records:
+        validate = no_validation
+    inserted = skipped = invalid = 0
+    started = time.perf_counter()
+    for number, chunk in enumerate(chunks(read_records(path, format), chunk_size)):
+        rows = {}  # record number -> row
+        for offset, record in enumerate(chunk):
+            try:
+                if isinstance(record, InvalidRecord):
+                    raise ValueError(record.error)
+                if not isinstance(record, dict):
+                    raise TypeError(f"expected an object, got {type(record).__name__}")
+                row = to_row(record)
+                errors = validate(row)
+            except (TypeError, ValueError) as e:
+                errors = str(e)
+            if errors:
+                invalid += 1
+                print(f"Invalid {entity} record #{number * chunk_size + offset}: {errors}")
+                continue
+            rows[number * chunk_size + offset] = row
+        # the shows are checked and inserted with no scheduling in between
+        with calendar_lock() if model is Show else nullcontext():
+            if model is Show and rows:
+                for error in check_new_shows(rows, key_columns):
+                    invalid += 1
+                    print(f"Invalid {entity} record #{error['index']}: {error['error']}")
+                    del rows[error['index']]
+            if rows:
+                count = insert_chunk(model, list(rows.values()), key_columns)
+                inserted += count
+                skipped += len(rows) - count
+            # when nothing was inserted, ends the transaction of the checks
+            # and releases its lock
+            db.session.commit()
+    elapsed = time.perf_counter() - started
+    rate = (inserted + skipped + invalid) / elapsed if elapsed else 0
+    print(f"{entity}: {inserted} inserted, {skipped} skipped, {invalid} invalid "
+          f"in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return inserted, skipped, invalid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--venues', default='venues.json')
+    parser.add_argument('--artists', default='artists.json')
+    parser.add_argument('--shows', default='shows.json')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--format', choices=('json', 'ndjson', 'csv'),
+                        help="source format, needed when reading stdin ('-')")
+    parser.add_argument('--no-validate', dest='validate', action='store_false',
+                        help='skip the VenueForm/ArtistForm field rules')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        # shows reference venues and artists, so they are loaded last
+        for entity in ("venues", "artists", "shows"):
+            path = getattr(args, entity)
+            if path:
+                load(entity, path, args.chunk_size, args.format, args.validate)
+
+    print("Database populated successfully!")
+
 
-    print("Database populated successfully!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+
+
+# ----------------------------------------------------------------------------#
+# Read replicas.
+# ----------------------------------------------------------------------------#
+
+class ReplicaSet:
+    """
+    Engines of the read replicas, handed out round-robin. A replica is
+    checked with SELECT 1 in a background thread, again once its last
+    check is health_check_interval seconds old, and skipped while it has
+    not passed a check: requests only read the last result.
+    """
+
+    def __init__(self, urls, engine_options, health_check_interval):
+        self.engines = [create_engine(url, **dict(engine_options, pool_logging_name='replica'))
+                        for url in urls]
+        self.health_check_interval = health_check_interval
+        self.health = {engine: (False, None) for engine in self.engines}  # engine -> (healthy, checked_at)
+        self.checks = {}  # engine -> Thread of its running check
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def check(self, engine):
+        try:
+            with engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
+            healthy = True
+        except Exception:
+            healthy = False
+        self.health[engine] = (healthy, time.monotonic())
+
+    def healthy(self, engine):
+        """
+        Returns:
+          the result of the last check of engine, False before the first
+          one; a new check is started if it is due
+        """
+        healthy, checked_at = self.health[engine]
+        if checked_at is None or time.monotonic() - checked_at >= self.health_check_interval:
+            with self.lock:
+                # a check started before a fork has no thread in the child
+                running = self.checks.get(engine)
+                if running is None or not running.is_alive():
+                    self.checks[engine] = threading.Thread(target=self.check, args=(engine,), daemon=True)
+                    self.checks[engine].start()
+        return healthy
+
+    def pick(self):
+        """
+        Returns:
+          the next healthy replica engine, None if there is none
+        """
+        for _ in range(len(self.engines)):
+            with self.lock:
+                engine = self.engines[self.next % len(self.engines)]
+                self.next += 1
+            if self.healthy(engine):
+                return engine
+        return None
+
+
+def replicas(app):
+    # engines are created on first use, once per process
+    if 'replicas' not in app.extensions:
+        app.extensions['replicas'] = ReplicaSet(
+            app.config['SQLALCHEMY_REPLICA_URIS'],
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+            app.config['REPLICA_HEALTH_CHECK_INTERVAL'])
+    return app.extensions['replicas']
+
+
+class RoutingSession(Session):
+    """
+    Session sending the statements of read-only requests (see replica_reads)
+    to the replica picked for the request; everything else, and every
+    flush, goes to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context()
+                and g.get('read_replica') and g.get('replica') is not None):
+            return g.replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_reads(view):
+    """
+    Lets a read-only view query a replica, one for the whole request so its
+    reads see a single state, unless the client wrote something in the
+    last READ_YOUR_WRITES_SECONDS: it then reads from the primary so it
+    sees its own changes despite replication lag
+    """
+    @wraps(view)
+    def wrapper(**kwargs):
+        # the session is only read when the client has one: reading it
+        # makes the response vary on Cookie
+        g.read_replica = (
+            current_app.config['SESSION_COOKIE_NAME'] not in request.cookies
+            or session.get('primary_until', 0) < time.time())
+        if g.read_replica and current_app.config['SQLALCHEMY_REPLICA_URIS']:
+            g.replica = replicas(current_app).pick()
+        return view(**kwargs)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """
+    Sends the reads of the block to the primary, e.g. those filling a cache
+    shared with the requests that must see their own writes
+    """
+    read_replica = g.get('read_replica')
+    g.read_replica = False
+    try:
+        yield
+    finally:
+        g.read_replica = read_replica
+
+
+def pin_primary_after_writes(response):
+    # searches are POSTed but go through replica_reads, they write nothing
+    if (request.method not in ('GET', 'HEAD', 'OPTIONS') and 'read_replica' not in g
+            and current_app.config['SQLALCHEMY_REPLICA_URIS']):
+        session['primary_until'] = time.time() + current_app.config['READ_YOUR_WRITES_SECONDS']
+    return response
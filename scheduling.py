@@ -0,0 +1,502 @@
+"""
+Scheduling of shows, one or many at once.
+
+A batch of shows is validated as a whole before anything is written: the
+venue and artist ids are checked with one IN query each, and double
+bookings (a venue or an artist with two overlapping shows, in the batch
+or already scheduled) are found in one pass over the batch. A valid
+batch is inserted with a single multi-row INSERT; an invalid one is
+rejected with the errors of every record.
+
+Shows last from start_time to end_time, [start, end). On Postgres the
+exclusion constraints of models.Show enforce that they don't overlap and
+the scheduled shows near the batch are fetched with one indexed query;
+elsewhere (e.g. SQLite test runs) the in-process CalendarIndex stands in
+for both.
+"""
+import csv
+import io
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+import dateutil.parser
+from sqlalchemy import and_, event, func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Venue, Artist, Show, app, invalidate_on_commit
+from show_counters import refresh_show_counters
+from http_cache import mark_written, table_versions
+
+
+class SchedulingError(Exception):
+    """
+    A batch of shows that cannot be scheduled
+    Attributes:
+      errors: List[Dict[index, error]], index of the record in the batch,
+        None for errors of the whole batch
+    """
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid shows")
+        self.errors = errors
+
+
+# ----------------------------------------------------------------------------#
+# Calendar index.
+# ----------------------------------------------------------------------------#
+
+class IntervalNode:
+    __slots__ = ('interval', 'left', 'right', 'height', 'max_end')
+
+    def __init__(self, interval, left=None, right=None):
+        self.interval = interval  # (start, end, show_id)
+        self.left, self.right = left, right
+        self.update()
+
+    def update(self):
+        # height and latest end from the children, run for every node built
+        height, max_end = 0, self.interval[1]
+        for child in (self.left, self.right):
+            if child is not None:
+                height = max(height, child.height)
+                max_end = max(max_end, child.max_end)
+        self.height, self.max_end = height + 1, max_end
+
+
+def height(node):
+    return node.height if node is not None else 0
+
+
+def rotate(node, side):
+    # side 'left' brings the right child up, 'right' the left one
+    other = 'right' if side == 'left' else 'left'
+    top = getattr(node, other)
+    setattr(node, other, getattr(top, side))
+    node.update()
+    setattr(top, side, node)
+    top.update()
+    return top
+
+
+def rebalance(node):
+    node.update()
+    balance = height(node.left) - height(node.right)
+    if balance > 1:
+        if height(node.left.left) < height(node.left.right):
+            node.left = rotate(node.left, 'left')
+        return rotate(node, 'right')
+    if balance < -1:
+        if height(node.right.right) < height(node.right.left):
+            node.right = rotate(node.right, 'right')
+        return rotate(node, 'left')
+    return node
+
+
+class IntervalTree:
+    """
+    Intervals [start, end) in an AVL tree ordered by (start, end, show_id),
+    each node holding the latest end of its subtree: inserting is
+    O(log n), and finding an overlap skips the subtrees that end before
+    the interval starts, however long their intervals are.
+    """
+
+    def __init__(self, intervals=()):
+        """
+        Args:
+          intervals: sorted list of (start, end, show_id), built into a
+            balanced tree in O(n)
+        """
+        def build(low, high):
+            if low >= high:
+                return None
+            middle = (low + high) // 2
+            return IntervalNode(intervals[middle], build(low, middle), build(middle + 1, high))
+        self.root = build(0, len(intervals))
+
+    def insert(self, interval):
+        def insert(node):
+            if node is None:
+                return IntervalNode(interval)
+            if interval < node.interval:
+                node.left = insert(node.left)
+            else:
+                node.right = insert(node.right)
+            return rebalance(node)
+        self.root = insert(self.root)
+
+    def overlapping(self, start, end):
+        """
+        Returns:
+          (start, end, show_id) of the latest starting interval overlapping
+          [start, end), None if there is none
+        """
+        def search(node):
+            if node is None or node.max_end <= start:
+                return None
+            if node.interval[0] >= end:
+                # this node and its right subtree start too late
+                return search(node.left)
+            return (search(node.right)
+                    or (node.interval if node.interval[1] > start else None)
+                    or search(node.left))
+        return search(self.root)
+
+
+class CalendarIndex:
+    """
+    Booked intervals of each venue and artist, in interval trees, so
+    finding the shows overlapping an interval is a tree search instead of
+    a scan of the shows, whatever the length of the stored shows.
+
+    calendar_index holds every show, for the databases without exclusion
+    constraints. Like search.TrigramIndex it is built on first use and
+    rebuilt after any committed write to the shows, with the same
+    generations: the ORM writes invalidate it on commit, the Core deletes
+    (app.delete_entities) explicitly; schedule_shows and the loader add
+    their own shows.
+
+    Limits: every show is held in memory, in each process. The index is
+    only correct while its users hold calendar_lock, which serializes the
+    schedulings of this process with its RLock and those of the other
+    processes with SQLite's write lock, and rebuilds the index when the
+    version of the Show table (http_cache.table_versions) shows a write
+    from another process. Shows written without bumping that version,
+    e.g. by hand in SQL, are only seen after a restart.
+    """
+
+    def __init__(self):
+        self.intervals = {}  # (model, id) -> IntervalTree
+        self.generation = 0
+        self.built_generation = None
+        self.table_version = None  # version of the Show table it holds
+        self.lock = threading.RLock()
+
+    @property
+    def stale(self):
+        return self.built_generation != self.generation
+
+    def invalidate(self, *args):
+        self.generation += 1
+
+    def add(self, venue_id, artist_id, start, end, show_id):
+        for key in ((Venue, venue_id), (Artist, artist_id)):
+            self.intervals.setdefault(key, IntervalTree()).insert((start, end, show_id))
+
+    def committed(self, shows):
+        """
+        Adds the shows a transaction holding calendar_lock has just
+        committed: its commit bumped the version of the Show table
+        Args:
+          shows: iterable of (id, venue_id, artist_id, start_time, end_time)
+        """
+        if not self.stale:
+            for show_id, venue_id, artist_id, start, end in shows:
+                self.add(venue_id, artist_id, start, end, show_id)
+        if self.table_version is not None:
+            self.table_version += 1
+
+    def build(self, shows=None):
+        """
+        Args:
+          shows: iterable of (id, venue_id, artist_id, start_time,
+            end_time), every show in the database if None
+        Returns:
+          self
+        """
+        generation = self.generation
+        if shows is None:
+            shows = db.session.execute(select(
+                Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time))
+        intervals = defaultdict(list)
+        for show_id, venue_id, artist_id, start, end in shows:
+            intervals[Venue, venue_id].append((start, end, show_id))
+            intervals[Artist, artist_id].append((start, end, show_id))
+        for booked in intervals.values():
+            booked.sort()
+        self.intervals = {key: IntervalTree(booked) for key, booked in intervals.items()}
+        self.built_generation = generation
+        return self
+
+    def overlapping(self, model, entity_id, start, end):
+        """
+        Returns:
+          Tuple (start, end, show_id) of a show of the venue or artist
+          overlapping [start, end), the latest starting one, None if there
+          is none
+        """
+        booked = self.intervals.get((model, entity_id))
+        return booked.overlapping(start, end) if booked is not None else None
+
+
+calendar_index = CalendarIndex()
+
+# deleting a venue or an artist deletes its shows in the database
+for model, event_names in ((Show, ('after_insert', 'after_update', 'after_delete')),
+                           (Venue, ('after_delete',)), (Artist, ('after_delete',))):
+    for event_name in event_names:
+        event.listen(model, event_name, invalidate_on_commit(calendar_index))
+
+
+def uses_calendar_index():
+    return db.engine.dialect.name != 'postgresql'
+
+
+@contextmanager
+def calendar_lock():
+    """
+    Keeps the checks and the insert of shows from interleaving with another
+    scheduling where no exclusion constraint does (uses_calendar_index):
+    the RLock of calendar_index between the threads of this process, the
+    SQLite write lock (BEGIN IMMEDIATE, held until the commit or rollback)
+    between processes. calendar_index is rebuilt if the Show table was
+    written since it was built, e.g. by another process.
+    """
+    if not uses_calendar_index():
+        yield
+        return
+    with calendar_index.lock:
+        connection = db.session.connection()
+        # a transaction that has written already holds the write lock
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        version, _ = table_versions(Show)
+        if version != calendar_index.table_version:
+            calendar_index.invalidate()
+            calendar_index.table_version = version
+        yield
+
+
+def booked_calendar(rows):
+    """
+    Returns:
+      CalendarIndex holding at least the scheduled shows that overlap the
+      rows
+    """
+    if uses_calendar_index():
+        if calendar_index.stale:
+            calendar_index.build()
+        return calendar_index
+    # one query, each condition a search of the GiST index of an exclusion
+    # constraint of models.Show, on (venue_id or artist_id, period)
+    period = func.tsrange(Show.start_time, Show.end_time)
+    conditions = [
+        and_(fk == row[key], period.op('&&')(func.tsrange(row['start_time'], row['end_time'])))
+        for row in rows for fk, key in ((Show.venue_id, 'venue_id'), (Show.artist_id, 'artist_id'))]
+    return CalendarIndex().build(db.session.execute(select(
+        Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time).where(or_(*conditions))))
+
+
+# ----------------------------------------------------------------------------#
+# Constraint violations.
+# ----------------------------------------------------------------------------#
+
+# what a constraint of models.Show violated by a validated batch means: a
+# concurrent request changed the data between the checks and the insert
+CONSTRAINT_ERRORS = {
+    'ex_Show_venue_id_time': "the venue was booked at this time by a show scheduled meanwhile",
+    'ex_Show_artist_id_time': "the artist was booked at this time by a show scheduled meanwhile",
+    'Show_venue_id_fkey': "the venue was deleted meanwhile",
+    'Show_artist_id_fkey': "the artist was deleted meanwhile",
+    'uq_Show_venue_id_artist_id_start_time': "the same show was scheduled meanwhile",
+}
+
+
+def constraint_error(error):
+    """
+    Args:
+      error: IntegrityError raised by the insert of a validated batch
+    Returns:
+      str, the error of CONSTRAINT_ERRORS of the violated constraint, None
+      for any other constraint
+    """
+    # Postgres drivers name the constraint, SQLite only tells its kind
+    name = getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+    if name is not None:
+        return CONSTRAINT_ERRORS.get(name)
+    message = str(error.orig)
+    if message.startswith('FOREIGN KEY constraint failed'):
+        return "the venue or the artist was deleted meanwhile"
+    if message.startswith('UNIQUE constraint failed: Show.venue_id, Show.artist_id, Show.start_time'):
+        return CONSTRAINT_ERRORS['uq_Show_venue_id_artist_id_start_time']
+    return None
+
+
+# ----------------------------------------------------------------------------#
+# Readers.
+# ----------------------------------------------------------------------------#
+
+def read_csv(text):
+    """
+    Records of a CSV document with artist_id, venue_id, start_time and
+    optionally end_time columns
+    """
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def as_naive_datetime(value):
+    # timestamps are stored as naive local times (compared to datetime.now()):
+    # an explicit offset, e.g. '2025-09-10T21:30:00.000Z', is converted
+    value = dateutil.parser.parse(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def as_id(record, key):
+    # ints, or their digits in a CSV: not 1.9 or true
+    value = record.get(key)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"{key} must be an integer")
+
+
+def show_row(record):
+    start_time = as_naive_datetime(record.get("start_time"))
+    if record.get("end_time"):
+        end_time = as_naive_datetime(record["end_time"])
+    else:
+        end_time = start_time + timedelta(minutes=app.config['SHOW_DEFAULT_DURATION_MINUTES'])
+    max_duration = app.config['SHOW_MAX_DURATION_MINUTES']
+    if not start_time < end_time <= start_time + timedelta(minutes=max_duration):
+        raise ValueError(f"end_time must be after start_time, by at most {max_duration} minutes")
+    return {
+        "venue_id": as_id(record, "venue_id"),
+        "artist_id": as_id(record, "artist_id"),
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+
+
+# ----------------------------------------------------------------------------#
+# Validation.
+# ----------------------------------------------------------------------------#
+
+def existing_ids(model, ids):
+    return {entity_id for entity_id, in db.session.execute(
+        select(model.id).where(model.id.in_(ids)))}
+
+
+def validate_shows(records):
+    """
+    Converts and checks a batch of show records
+    Args:
+      records: list of dicts with venue_id, artist_id, start_time and
+        optionally end_time (SHOW_DEFAULT_DURATION_MINUTES after the start
+        by default)
+    Returns:
+      Tuple (rows[List[Dict]], errors[List[Dict[index, error]]]), the rows
+      of the valid records
+    """
+    rows, errors = {}, []
+    for index, record in enumerate(records):
+        try:
+            rows[index] = show_row(record)
+        except (AttributeError, TypeError):
+            errors.append({"index": index, "error": "expected venue_id, artist_id and start_time"})
+        except (ValueError, OverflowError) as e:
+            errors.append({"index": index, "error": f"invalid show: {e}"})
+    if rows:
+        errors.extend(check_shows(rows))
+    errors.sort(key=itemgetter('index'))
+    invalid = {error['index'] for error in errors}
+    return [rows[index] for index in sorted(rows) if index not in invalid], errors
+
+
+def check_shows(rows):
+    """
+    Checks show rows against the venues, the artists, the scheduled shows
+    and each other
+    Args:
+      rows: Dict[index, row], rows of show_row by record index
+    Returns:
+      List[Dict[index, error]] of the invalid rows
+    """
+    errors = []
+    venue_ids = existing_ids(Venue, {row['venue_id'] for row in rows.values()})
+    artist_ids = existing_ids(Artist, {row['artist_id'] for row in rows.values()})
+    booked = booked_calendar(list(rows.values()))
+    # the accepted shows of the batch, by record index
+    batch = CalendarIndex().build(())
+    for index, row in rows.items():
+        if row['venue_id'] not in venue_ids:
+            errors.append({"index": index, "error": f"venue {row['venue_id']} does not exist"})
+            continue
+        if row['artist_id'] not in artist_ids:
+            errors.append({"index": index, "error": f"artist {row['artist_id']} does not exist"})
+            continue
+        error = conflict(booked, batch, row)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            batch.add(row['venue_id'], row['artist_id'], row['start_time'], row['end_time'], index)
+    return errors
+
+
+def conflict(booked, batch, row):
+    """
+    Returns:
+      str describing the first show overlapping row at its venue or with
+      its artist, None if there is none
+    """
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        name = model.__name__.lower()
+        show = booked.overlapping(model, row[key], row['start_time'], row['end_time'])
+        if show is not None:
+            return (f"{name} {row[key]} already has a show from {show[0].isoformat()} "
+                    f"to {show[1].isoformat()} (show {show[2]})")
+        show = batch.overlapping(model, row[key], row['start_time'], row['end_time'])
+        if show is not None:
+            return f"{name} {row[key]} is also booked at this time by show #{show[2]}"
+    return None
+
+
+# ----------------------------------------------------------------------------#
+# Scheduling.
+# ----------------------------------------------------------------------------#
+
+def schedule_shows(records):
+    """
+    Inserts a batch of shows, all of them or none, and commits
+    Args:
+      records: list of dicts with venue_id, artist_id, start_time and
+        optionally end_time
+    Returns:
+      List of the new shows, dicts with id, venue_id, artist_id,
+      start_time and end_time, by id
+    Raises:
+      SchedulingError: some records are invalid, nothing was inserted
+    """
+    with calendar_lock():
+        rows, errors = validate_shows(records)
+        if errors:
+            raise SchedulingError(errors)
+        if not rows:
+            return []
+        # one multi-row INSERT ... RETURNING; asking for the rows in parameter
+        # order would make SQLite insert them one by one
+        try:
+            shows = db.session.execute(insert(Show).returning(
+                Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time), rows).mappings().all()
+        except IntegrityError as e:
+            db.session.rollback()
+            error = constraint_error(e)
+            if error is None:
+                raise
+            raise SchedulingError([{"index": None, "error": error}])
+        # bulk inserts bypass the ORM: refresh the upcoming show counters (and
+        # so the venue directory) in the same transaction
+        mark_written(db.session, Show)
+        now = datetime.now()
+        refresh_show_counters(db.session, Venue, now, Venue.id.in_({row['venue_id'] for row in rows}))
+        refresh_show_counters(db.session, Artist, now, Artist.id.in_({row['artist_id'] for row in rows}))
+        db.session.commit()
+        shows = sorted((dict(show) for show in shows), key=itemgetter('id'))
+        if uses_calendar_index():
+            calendar_index.committed(itemgetter('id', 'venue_id', 'artist_id', 'start_time', 'end_time')(show)
+                                     for show in shows)
+    return shows
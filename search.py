@@ -0,0 +1,147 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, func
+
+from models import db, Venue, Artist, invalidate_on_commit
+
+
+# ----------------------------------------------------------------------------#
+# In-process trigram index.
+# ----------------------------------------------------------------------------#
+
+def trigrams(text):
+    """
+    Splits a string into the set of its lowercase 3-character substrings
+    Args:
+      text: str
+    Returns:
+      Set[str], empty for strings shorter than 3 characters
+    """
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(term, name):
+    """
+    Ranks a name against a search term like postgres pg_trgm similarity():
+    shared trigrams of the space-padded words over all trigrams
+    Returns:
+      float between 0 and 1
+    """
+    def padded(text):
+        return set().union(*[trigrams(f"  {word} ") for word in text.split()])
+    term_grams, name_grams = padded(term), padded(name)
+    if not term_grams or not name_grams:
+        return 0.0
+    return len(term_grams & name_grams) / len(term_grams | name_grams)
+
+
+class TrigramIndex:
+    """
+    Maps trigrams to the ids of the names containing them, so a substring
+    search only checks the names sharing every trigram of the term instead
+    of scanning the whole table. Used when the database has no pg_trgm
+    (e.g. SQLite test runs). The index is rebuilt lazily after any
+    committed write to the model: the ORM writes invalidate it on commit,
+    the Core inserts and deletes (populate_DB_init.insert_chunk,
+    app.delete_entities) explicitly.
+
+    Each invalidation starts a new generation; a build only makes the
+    index current for the generation it started in, so an invalidation
+    arriving while it reads the names is not lost.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.names = {}
+        self.postings = defaultdict(set)
+        self.generation = 0
+        self.built_generation = None
+        self.lock = threading.Lock()
+
+    @property
+    def stale(self):
+        return self.built_generation != self.generation
+
+    def invalidate(self, *args):
+        self.generation += 1
+
+    def build(self):
+        generation = self.generation
+        names = dict(db.session.query(self.model.id, self.model.name))
+        postings = defaultdict(set)
+        for id, name in names.items():
+            for gram in trigrams(name or ''):
+                postings[gram].add(id)
+        self.names, self.postings = names, postings
+        self.built_generation = generation
+
+    def search(self, term, limit):
+        """
+        Returns:
+          List[Tuple[id, name]] of names containing term (case-insensitive),
+          best ranked first, at most limit entries
+        """
+        with self.lock:
+            if self.stale:
+                self.build()
+            names, postings = self.names, self.postings
+        grams = trigrams(term)
+        if grams:
+            candidates = set.intersection(
+                *[postings.get(gram, set()) for gram in grams])
+        else:
+            # terms shorter than a trigram have to check every name
+            candidates = names.keys()
+        term_lower = term.lower()
+        matches = [(id, names[id]) for id in candidates
+                   if term_lower in (names[id] or '').lower()]
+        matches.sort(key=lambda match: (
+            -similarity(term, match[1] or ''), match[1] or '', match[0]))
+        return matches[:limit]
+
+
+fallback_indexes = {Venue: TrigramIndex(Venue), Artist: TrigramIndex(Artist)}
+
+
+for model, index in fallback_indexes.items():
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, invalidate_on_commit(index))
+
+
+# ----------------------------------------------------------------------------#
+# Search.
+# ----------------------------------------------------------------------------#
+
+def search(model, search_term, limit):
+    """
+    Case-insensitive partial name search on venues or artists
+    Args:
+      model: Venue or Artist
+      search_term: str
+      limit: int, maximum number of results
+    Returns:
+      Dict[count, data[List[Dict[id, name, num_upcoming_shows]]]], best
+      matches first
+    """
+    # a single-table read: the counts are maintained on the rows
+    query = db.session.query(
+        model.id, model.name, model.upcoming_show_count.label('num_upcoming_shows'))
+
+    if db.engine.dialect.name == 'postgresql':
+        # the pg_trgm GIN index on name serves the ILIKE, similarity() ranks
+        rows = query.filter(
+            model.name.icontains(search_term, autoescape=True)
+        ).order_by(
+            func.similarity(model.name, search_term).desc(), model.name, model.id
+        ).limit(limit).all()
+    else:
+        ranked = fallback_indexes[model].search(search_term, limit)
+        counts = {row.id: row for row in query.filter(
+            model.id.in_([id for id, name in ranked]))}
+        rows = [counts[id] for id, name in ranked if id in counts]
+
+    data = [{"id": row.id, "name": row.name,
+             "num_upcoming_shows": row.num_upcoming_shows} for row in rows]
+    return {"count": len(data), "data": data}
@@ -0,0 +1,90 @@
+from datetime import date, datetime
+from functools import lru_cache
+from operator import attrgetter
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, the standard json module is used without it
+    orjson = None
+
+
+# ----------------------------------------------------------------------------#
+# Serializers.
+# ----------------------------------------------------------------------------#
+
+@lru_cache(maxsize=None)
+def columns(model):
+    """
+    Returns:
+      Tuple of the column keys of a model, in table order
+    """
+    return tuple(column.key for column in model.__table__.columns)
+
+
+# bounded: keys come from the ?fields= of API requests
+@lru_cache(maxsize=1024)
+def serializer(keys):
+    """
+    Compiles the conversion of model instances, or rows, to dicts. The
+    attribute lookups are resolved once per tuple of keys instead of walking
+    the table columns for every object.
+    Args:
+      keys: tuple of attribute names
+    Returns:
+      function(obj) -> Dict[key, value]
+    """
+    if not keys:
+        return lambda obj: {}
+    if len(keys) == 1:
+        # attrgetter of a single key returns the value, not a tuple
+        key, = keys
+        get = attrgetter(key)
+        return lambda obj: {key: get(obj)}
+    get = attrgetter(*keys)
+    return lambda obj: dict(zip(keys, get(obj)))
+
+
+def model_serializer(model):
+    """Compiled serializer of all the columns of a model"""
+    return serializer(columns(model))
+
+
+# ----------------------------------------------------------------------------#
+# JSON encoding.
+# ----------------------------------------------------------------------------#
+
+def json_default(value):
+    # ISO 8601 dates, as orjson writes them, rather than Flask's HTTP dates
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Encodes jsonify() responses with orjson when it is installed, the
+    standard json module otherwise; both write dates in ISO 8601. orjson
+    output is compact and keeps the key order of the dicts.
+    """
+
+    default = staticmethod(json_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=json_default).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        # skips the str round trip of dumps
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=json_default), mimetype=self.mimetype)
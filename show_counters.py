@@ -0,0 +1,218 @@
+"""
+Upcoming show counters of venues and artists.
+
+usage: python show_counters.py {age,check,rebuild} [--fix]
+
+Venue and Artist keep upcoming_show_count and next_show_at so listings and
+searches read them without counting shows. They are updated in the
+transaction that adds or deletes shows (see update_show_counters). As time
+passes, shows start and must leave the counts: `age`, run periodically
+(e.g. every minute from cron), recomputes the entities whose next show has
+started. `check` compares the counters with the live aggregate, after
+aging, and lists the differences (--fix recomputes them). `rebuild`
+recomputes every counter and recounts the venue directory (areas.py),
+e.g. after a bulk load.
+"""
+import argparse
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import and_, case, event, func, inspect, or_, select
+
+from models import Venue, Artist, Show, db, app
+from areas import rebuild_areas, touch_areas
+
+
+# ----------------------------------------------------------------------------#
+# Counters.
+# ----------------------------------------------------------------------------#
+
+def show_fk(model):
+    return Show.venue_id if model is Venue else Show.artist_id
+
+
+def counterpart(model):
+    # the other side of the shows of a venue or artist, and its key in Show
+    return (Artist, Show.artist_id) if model is Venue else (Venue, Show.venue_id)
+
+
+def counterpart_ids(connection, model, ids):
+    """
+    Returns:
+      List of the artist ids playing at the venues ids, or of the venue ids
+      hosting the artists ids
+    """
+    other, other_fk = counterpart(model)
+    return [other_id for other_id, in connection.execute(
+        select(other_fk).where(show_fk(model).in_(ids)).distinct())]
+
+
+def refresh_show_counters(connection, model, now, *criteria):
+    """
+    Recomputes the counters of the venues or artists matching criteria
+    from their shows
+    Args:
+      connection: connection (or session) running the update
+      model: Venue or Artist
+      now: datetime, shows starting at or after this time are upcoming
+      criteria: SQLAlchemy filter expressions on model, all rows if none
+    Returns:
+      int, number of rows updated
+    """
+    upcoming = and_(show_fk(model) == model.id, Show.start_time >= now)
+    result = connection.execute(model.__table__.update().where(*criteria).values(
+        upcoming_show_count=select(func.count(Show.id)).where(upcoming).scalar_subquery(),
+        next_show_at=select(func.min(Show.start_time)).where(upcoming).scalar_subquery(),
+        updated_at=now))
+    if model is Venue and result.rowcount:
+        # the venue directory shows the counts
+        touch_areas(connection)
+    return result.rowcount
+
+
+def age_show_counters(connection, now):
+    """
+    Moves the shows that started since the last run out of the counters
+    Returns:
+      int, number of venues and artists updated
+    """
+    return sum(refresh_show_counters(connection, model, now, model.next_show_at <= now)
+               for model in (Venue, Artist))
+
+
+def check_show_counters(connection, model, now):
+    """
+    Compares the counters with the live aggregate of the shows
+    Returns:
+      List of (id, upcoming_show_count, live count, next_show_at, live next show)
+      for the rows that differ
+    """
+    live_count = func.count(case((Show.start_time >= now, Show.id)))
+    live_next = func.min(case((Show.start_time >= now, Show.start_time)))
+    rows = connection.execute(select(
+        model.id, model.upcoming_show_count, live_count, model.next_show_at, live_next
+    ).outerjoin(Show, show_fk(model) == model.id).group_by(
+        model.id, model.upcoming_show_count, model.next_show_at
+    ).having(or_(
+        model.upcoming_show_count != live_count,
+        # IS DISTINCT FROM: both NULL is a match
+        model.next_show_at.is_distinct_from(live_next),
+    )).order_by(model.id))
+    return [tuple(row) for row in rows]
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_cascaded_shows(session, flush_context, instances):
+    """
+    The database deletes the shows of a deleted venue or artist (ON DELETE
+    CASCADE) without the session seeing them: the counterparts of these
+    shows are collected while the shows still exist, for
+    update_show_counters to recompute them
+    """
+    for model in (Venue, Artist):
+        ids = [entity.id for entity in session.deleted if isinstance(entity, model)]
+        if ids:
+            other, _ = counterpart(model)
+            session.info.setdefault('cascaded_shows', defaultdict(set))[other].update(
+                counterpart_ids(session.connection(), model, ids))
+
+
+@event.listens_for(db.session, 'after_flush')
+def update_show_counters(session, flush_context):
+    """
+    Keeps the counters in step with the shows written by the ORM, in the
+    same transaction. A new show increments the counters in place, which
+    stays right under concurrent inserts (the row lock serializes them);
+    deleted or moved shows make the counters of their venue and artist be
+    recomputed, as are the counterparts of deleted venues and artists (see
+    collect_cascaded_shows). Shows written with bulk statements are not
+    seen here: their writer must refresh the counters (populate_DB_init.py
+    and delete_entities in app.py do), or run `python show_counters.py
+    rebuild` after them.
+    """
+    now = datetime.now()
+    added = defaultdict(list)       # (model, id) -> start times of upcoming shows
+    stale = session.info.pop('cascaded_shows', defaultdict(set))  # model -> ids to recompute
+    for show in session.new:
+        if isinstance(show, Show):
+            if show.start_time >= now:
+                added[Venue, show.venue_id].append(show.start_time)
+                added[Artist, show.artist_id].append(show.start_time)
+            else:
+                # counts unchanged, but the pages listing the show are
+                # validated with updated_at (app.detail_page_version)
+                stale[Venue].add(show.venue_id)
+                stale[Artist].add(show.artist_id)
+    for show in session.deleted:
+        if isinstance(show, Show):
+            stale[Venue].add(show.venue_id)
+            stale[Artist].add(show.artist_id)
+    for show in session.dirty:
+        if isinstance(show, Show):
+            state = inspect(show)
+            for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+                history = state.attrs[key].history
+                if history.has_changes() or state.attrs.start_time.history.has_changes():
+                    stale[model].update(id for id in history.sum() if id is not None)
+    if not added and not stale:
+        return
+
+    connection = session.connection()
+    for (model, entity_id), start_times in added.items():
+        if entity_id in stale[model]:
+            continue
+        first = min(start_times)
+        connection.execute(model.__table__.update().where(model.id == entity_id).values(
+            upcoming_show_count=model.upcoming_show_count + len(start_times),
+            next_show_at=case(
+                (or_(model.next_show_at.is_(None), model.next_show_at > first), first),
+                else_=model.next_show_at),
+            updated_at=now))
+    if any(model is Venue for model, _ in added):
+        touch_areas(connection)
+    for model, ids in stale.items():
+        if ids:
+            refresh_show_counters(connection, model, now, model.id.in_(ids))
+
+
+# ----------------------------------------------------------------------------#
+# Jobs.
+# ----------------------------------------------------------------------------#
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('command', choices=('age', 'check', 'rebuild'))
+    parser.add_argument('--fix', action='store_true',
+                        help='with check, recompute the counters that differ')
+    args = parser.parse_args(argv)
+
+    now = datetime.now()
+    with app.app_context(), db.engine.begin() as connection:
+        if args.command == 'rebuild':
+            for model in (Venue, Artist):
+                count = refresh_show_counters(connection, model, now)
+                print(f"{model.__name__}: {count} rows recomputed", file=sys.stderr)
+            # also drops the areas left without venues
+            rebuild_areas(connection)
+            return 0
+        aged = age_show_counters(connection, now)
+        print(f"{aged} venues and artists aged", file=sys.stderr)
+        if args.command == 'age':
+            return 0
+        differences = 0
+        for model in (Venue, Artist):
+            rows = check_show_counters(connection, model, now)
+            differences += len(rows)
+            for row in rows:
+                print(f"{model.__name__} {row[0]}: count {row[1]} != {row[2]} "
+                      f"or next show {row[3]} != {row[4]}")
+            if rows and args.fix:
+                refresh_show_counters(connection, model, now, model.id.in_([row[0] for row in rows]))
+        print(f"{differences} counters differ" + (", fixed" if differences and args.fix else ""),
+              file=sys.stderr)
+        return 1 if differences and not args.fix else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from models import Venue, Artist, Show
+
+
+# ----------------------------------------------------------------------------#
+# Show queries, shared by the pages of app.py and the JSON API.
+# ----------------------------------------------------------------------------#
+
+def show_projection(*criteria):
+    """
+    Selects shows joined with their artist and venue in a single query
+    Args:
+      criteria: SQLAlchemy filter expressions on Show, e.g. Show.venue_id == 1
+    Returns:
+      Select of light rows with show_id, start_time, artist_id, artist_name,
+      artist_image_link, venue_id, venue_name, venue_image_link, ordered by
+      start_time
+    """
+    return select(
+        Show.id.label('show_id'),
+        Show.start_time,
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link')
+    ).join(Artist, Artist.id == Show.artist_id).join(
+        Venue, Venue.id == Show.venue_id
+    ).where(*criteria).order_by(Show.start_time, Show.id)
+
+
+def encode_show_cursor(row):
+    """
+    Encodes the position of a show row for keyset pagination
+    Args:
+      row: row with start_time and show_id attributes
+    Returns:
+      str cursor of the form '<iso start_time>_<show id>'
+    """
+    return f"{row.start_time.isoformat()}_{row.show_id}"
+
+
+def decode_show_cursor(cursor):
+    """
+    Decodes a cursor built by encode_show_cursor
+    Args:
+      cursor: str, '<iso start_time>_<show id>'
+    Returns:
+      Tuple (start_time[datetime], show_id[int])
+    Raises:
+      ValueError if the cursor is malformed
+    """
+    start_time, _, show_id = cursor.rpartition('_')
+    return datetime.fromisoformat(start_time), int(show_id)
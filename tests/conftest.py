@@ -0,0 +1,98 @@
+"""
+Fixtures of the test suite: the app on a temporary SQLite database (or the
+database of TEST_DATABASE_URL, e.g. a scratch Postgres database), emptied
+before each test, and a counter of the SQL statements it sends.
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+
+# the settings are read when models.py is imported
+os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL') or 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='fyyur-tests-'), 'fyyur.db')
+os.environ.setdefault('FYYUR_ENV', 'development')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as fyyur  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+from cache import detail_cache  # noqa: E402
+from scheduling import calendar_index  # noqa: E402
+from search import fallback_indexes  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    fyyur.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with fyyur.app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            # the trigram indexes and the exclusion constraints
+            with db.engine.begin() as connection:
+                connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+                connection.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+        db.drop_all()
+        db.create_all()
+    detail_cache.clear()
+    calendar_index.invalidate()
+    for index in fallback_indexes.values():
+        index.invalidate()
+    return fyyur.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    """
+    Adds venues in two cities, artists and shows of each venue, half of
+    them past and half upcoming
+    Returns:
+      function (num_venues, num_artists, shows_per_venue)
+    """
+    def seed(num_venues=3, num_artists=2, shows_per_venue=2):
+        now = datetime.now()
+        with app.app_context():
+            venues = [Venue(name=f'Venue {i}', city=('San Francisco', 'New York')[i % 2],
+                            state=('CA', 'NY')[i % 2], genres=['Jazz'], seeking_talent=True)
+                      for i in range(num_venues)]
+            artists = [Artist(name=f'Artist {i}', city='San Francisco', state='CA',
+                              genres=['Jazz'], seeking_venue=False)
+                       for i in range(num_artists)]
+            db.session.add_all(venues + artists)
+            db.session.flush()
+            for i, venue in enumerate(venues):
+                for j in range(shows_per_venue):
+                    db.session.add(Show(venue_id=venue.id, artist_id=artists[(i + j) % num_artists].id,
+                                        start_time=now + timedelta(days=j - shows_per_venue // 2, hours=i * 3)))
+            db.session.commit()
+    return seed
+
+
+@pytest.fixture
+def statements(app):
+    """
+    Returns:
+      context manager counting the statements sent while it is entered,
+      into the list it yields
+    """
+    @contextmanager
+    def count():
+        executed = []
+
+        def record(conn, cursor, statement, *args):
+            executed.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield executed
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+    return count
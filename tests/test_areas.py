@@ -0,0 +1,75 @@
+"""
+The venue directory counts the venues of each area in the Area rollup,
+pages through the venues within the areas, and leaves the rollup rows
+alone when only the show counters change.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from app import venue_areas
+from models import db, Venue, Area
+
+
+def area_rows():
+    return {(area.city, area.state): area.venue_count for area in db.session.query(Area)}
+
+
+def live_areas():
+    return Counter((venue.city or '', venue.state or '') for venue in db.session.query(Venue))
+
+
+def test_areas_count_their_venues(app, client, seed):
+    seed(num_venues=5)
+    with app.app_context():
+        assert area_rows() == live_areas() == {('San Francisco', 'CA'): 3, ('New York', 'NY'): 2}
+        # moved to a new area, without a state
+        venue = db.session.get(Venue, 2)
+        venue.city, venue.state = 'Austin', None
+        db.session.commit()
+        assert area_rows() == live_areas()
+        assert area_rows()[('Austin', '')] == 1
+    assert client.delete('/venues/2').json['success']
+    app.config['ADMIN_TOKEN'] = 'secret'
+    try:
+        response = client.post('/admin/venues/delete', json={'ids': [1, 3]},
+                               headers={'Authorization': 'Bearer secret'})
+    finally:
+        app.config['ADMIN_TOKEN'] = None
+    assert response.json['deleted'] == [1, 3]
+    with app.app_context():
+        assert area_rows() == live_areas() == {('San Francisco', 'CA'): 1, ('New York', 'NY'): 1}
+
+
+def test_pages_split_the_areas(app, seed):
+    seed(num_venues=5)
+    with app.app_context():
+        everything, next_venue = venue_areas()
+        assert next_venue is None
+        listed, after, pages = [], None, 0
+        while True:
+            areas, after = venue_areas(2, after)
+            pages += 1
+            for area in areas:
+                assert area['venue_count'] == {'San Francisco': 3, 'New York': 2}[area['city']]
+                listed += [(area['state'], area['city'], venue['id']) for venue in area['venues']]
+            if after is None:
+                break
+        assert pages == 3
+        # by state, city then id, each venue once
+        assert listed == [('CA', 'San Francisco', 1), ('CA', 'San Francisco', 3),
+                          ('CA', 'San Francisco', 5), ('NY', 'New York', 2), ('NY', 'New York', 4)]
+        assert listed == [(area['state'], area['city'], venue['id'])
+                          for area in everything for venue in area['venues']]
+
+
+def test_counter_changes_leave_the_area_rows(app, client, seed, statements):
+    seed()
+    start = (datetime.now().replace(microsecond=0) + timedelta(days=30)).isoformat()
+    with statements() as executed:
+        response = client.post('/shows/bulk', json=[{'venue_id': 1, 'artist_id': 1, 'start_time': start}])
+    assert response.status_code == 201
+    assert not [statement for statement in executed if '"Area"' in statement]
+    body = client.get('/venues').get_data(as_text=True)
+    assert 'Venue 0' in body
+    with app.app_context():
+        assert db.session.get(Venue, 1).upcoming_show_count >= 1
@@ -0,0 +1,97 @@
+"""
+The cached venue and artist pages follow the passing of time and expire;
+in Redis they are stored as JSON, and an unreachable Redis is bypassed.
+"""
+import json
+import time
+from datetime import datetime, timedelta
+
+import app as app_module
+from app import refresh_split
+from cache import LRUCache, RedisCache, cached
+
+
+def show(start_time):
+    return {'show_id': 1, 'start_time': start_time}
+
+
+def test_started_shows_move_to_past_and_the_entry_is_rebuilt():
+    now = datetime.now()
+    data = {'past_shows': [show(now - timedelta(days=1))], 'past_shows_count': 1,
+            'upcoming_shows': [show(now + timedelta(hours=1)), show(now + timedelta(days=1))],
+            'upcoming_shows_count': 2}
+    cache = LRUCache(ttl=60)
+    cache.set(('venue', 1), data)
+    assert refresh_split(cache, ('venue', 1), data, now) is data
+    later = refresh_split(cache, ('venue', 1), data, now + timedelta(hours=2))
+    assert (later['past_shows_count'], later['upcoming_shows_count']) == (2, 1)
+    # not stored back with a new TTL
+    assert cache.get(('venue', 1)) is None
+    assert data['upcoming_shows_count'] == 2
+
+
+def test_entries_expire_when_their_next_show_starts(app, client, seed):
+    seed()
+    with app.app_context():
+        data = app_module.venue_detail(1)
+    cache = LRUCache(ttl=app.config['CACHE_TTL'])
+    soon = datetime.now() + timedelta(seconds=0.2)
+    data = dict(data, upcoming_shows=[show(soon)] + data['upcoming_shows'])
+    cached(cache, ('venue', 1), lambda: data, ttl=app_module.split_ttl)
+    assert cache.get(('venue', 1)) is data
+    time.sleep(0.3)
+    assert cache.get(('venue', 1)) is None
+    # no upcoming show: the cache TTL
+    assert app_module.split_ttl(dict(data, upcoming_shows=[])) == app.config['CACHE_TTL']
+
+
+class FakeRedis:
+    """Stores the raw bytes like redis.Redis, or fails like an unreachable one"""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def check(self):
+        if self.down:
+            raise ConnectionRefusedError('redis is down')
+
+    def get(self, key):
+        self.check()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.check()
+        self.data[key] = value if isinstance(value, bytes) else value.encode()
+
+    def delete(self, *keys):
+        self.check()
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, pattern):
+        self.check()
+        return iter([key for key in self.data if key.startswith(pattern.rstrip('*'))])
+
+
+def test_redis_entries_are_json_with_dates():
+    client = FakeRedis()
+    cache = RedisCache(client)
+    data = {'name': 'Hall', 'genres': ['Jazz'], 'upcoming_shows': [show(datetime(2035, 5, 1, 20))]}
+    cache.set(('venue', 1), data)
+    assert json.loads(client.data['fyyur:venue:1'])['name'] == 'Hall'
+    assert cache.get(('venue', 1)) == data
+
+
+def test_unreachable_redis_is_bypassed(app, client, seed):
+    seed()
+    redis = FakeRedis()
+    redis.down = True
+    original = app_module.detail_cache
+    app_module.detail_cache = RedisCache(redis, retry_after=60)
+    try:
+        assert client.get('/venues/1').status_code == 200
+        assert client.get('/artists/1').status_code == 200
+        assert app_module.detail_cache.stats()['failures'] == 1
+    finally:
+        app_module.detail_cache = original
@@ -0,0 +1,34 @@
+"""
+HTML pages are compressed, except those open to BREACH: the forms holding a
+CSRF token and the search results echoing the search term.
+"""
+import pytest
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+@pytest.fixture
+def csrf_client(app, client):
+    app.config['WTF_CSRF_ENABLED'] = True
+    yield client
+    app.config['WTF_CSRF_ENABLED'] = False
+
+
+def test_listing_is_compressed(client, seed):
+    seed(num_venues=20)
+    response = client.get('/venues', headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_form_with_csrf_token_is_not_compressed(csrf_client):
+    response = csrf_client.get('/venues/create', headers=GZIP)
+    assert b'csrf_token' in response.data
+    assert 'Content-Encoding' not in response.headers
+
+
+@pytest.mark.parametrize('url', ['/venues/search', '/artists/search'])
+def test_search_results_are_not_compressed(client, seed, url):
+    seed(num_venues=20, num_artists=20)
+    response = client.post(url, data={'search_term': 'a'}, headers=GZIP)
+    assert response.status_code == 200 and len(response.data) > 500
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,71 @@
+"""
+Requests served at the same time from several threads get the same pages
+as one at a time, without errors, and concurrent schedulings of the same
+slot book it once.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import db, Show
+
+THREADS = 8
+PAGES = ['/venues', '/artists', '/shows', '/venues/1', '/venues/2', '/artists/1',
+         '/api/v1/venues', '/api/v1/shows']
+
+
+def run_concurrently(app, requests):
+    """
+    Runs each request(client) from THREADS threads started together
+    Returns:
+      List of (result, exception) in the order of requests
+    """
+    barrier = threading.Barrier(min(THREADS, len(requests)))
+
+    def run(request):
+        client = app.test_client()
+        barrier.wait()
+        try:
+            return request(client), None
+        except Exception as e:
+            return None, e
+    with ThreadPoolExecutor(THREADS) as executor:
+        return list(executor.map(run, requests))
+
+
+def test_concurrent_reads_return_the_pages(app, client, seed):
+    seed(num_venues=10, num_artists=4, shows_per_venue=6)
+    expected = {url: client.get(url).get_data() for url in PAGES}
+
+    def reader(offset):
+        def request(client):
+            pages = []
+            for i in range(25):
+                url = PAGES[(offset + i) % len(PAGES)]
+                response = client.get(url)
+                pages.append((url, response.status_code, response.get_data()))
+            return pages
+        return request
+    results = run_concurrently(app, [reader(n) for n in range(THREADS)])
+    assert [error for pages, error in results if error] == []
+    for pages, error in results:
+        for url, status, body in pages:
+            assert status == 200, url
+            assert body == expected[url], url
+
+
+def test_concurrent_schedulings_book_a_slot_once(app, seed):
+    seed(num_venues=2, num_artists=THREADS, shows_per_venue=1)
+
+    def schedule(artist_id):
+        def request(client):
+            return client.post('/shows/bulk', data=json.dumps([
+                {'venue_id': 1, 'artist_id': artist_id, 'start_time': '2099-01-01T20:00:00'}]),
+                content_type='application/json').status_code
+        return request
+    results = run_concurrently(app, [schedule(artist_id) for artist_id in range(1, THREADS + 1)])
+    assert [error for status, error in results if error] == []
+    assert sorted(status for status, error in results) == [201] + [422] * (THREADS - 1)
+    with app.app_context():
+        assert db.session.query(Show).filter(Show.venue_id == 1, Show.start_time >= datetime(2099, 1, 1)).count() == 1
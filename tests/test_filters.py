@@ -0,0 +1,38 @@
+"""
+The datetime filter of the templates is compiled once per format and
+memoized per value, zone included.
+"""
+from datetime import datetime, timedelta, timezone
+
+import babel.dates
+import dateutil.parser
+
+from app import DATETIME_FORMATS, format_datetime, memoized_format_datetime
+
+
+def former(value, format):
+    # the filter before it was compiled and memoized
+    date = dateutil.parser.parse(value) if isinstance(value, str) else value
+    return babel.dates.format_datetime(date, DATETIME_FORMATS.get(format, format), locale='en')
+
+
+def test_memoized_filter_matches_babel():
+    memoized_format_datetime.cache_clear()
+    values = [datetime(2025, 9, 10, 21, 30), '2025-09-10T21:30:00', '2025-09-10 9:30pm',
+              datetime(2025, 9, 10, 21, 30, tzinfo=timezone(timedelta(hours=2)))]
+    for format in ('full', 'medium', 'yyyy-MM-dd HH:mm zzzz'):
+        for value in values:
+            assert format_datetime(value, format) == former(value, format)
+            # the second time from the memo
+            assert format_datetime(value, format) == former(value, format)
+    info = memoized_format_datetime.cache_info()
+    assert info.hits == info.misses == 12
+
+
+def test_same_instant_in_other_zones_is_not_shared():
+    utc = datetime(2025, 9, 10, 19, 30, tzinfo=timezone.utc)
+    paris = utc.astimezone(timezone(timedelta(hours=2)))
+    # equal, and hash alike
+    assert utc == paris and hash(utc) == hash(paris)
+    assert format_datetime(utc, 'HH:mm') == '19:30'
+    assert format_datetime(paris, 'HH:mm') == '21:30'
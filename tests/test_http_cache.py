@@ -0,0 +1,130 @@
+"""
+The listing pages answer conditional requests from the table versions,
+which every committed write bumps, ORM and Core alike.
+"""
+import json
+from datetime import datetime, timezone
+
+from models import db, Artist, Show, TableVersion
+
+LISTINGS = ['/venues', '/artists', '/shows']
+
+
+def etags(client):
+    return {url: client.get(url).headers['ETag'] for url in LISTINGS}
+
+
+def test_unchanged_listing_is_not_modified(client, seed, statements):
+    seed()
+    for url in LISTINGS:
+        etag = client.get(url).headers['ETag']
+        with statements() as executed:
+            response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        # one primary key lookup
+        assert len(executed) == 1 and 'TableVersion' in executed[0]
+
+
+def test_listings_are_shared_but_revalidated(client, seed):
+    seed()
+    for url in LISTINGS:
+        response = client.get(url)
+        assert response.headers['Cache-Control'] == 'public, no-cache'
+        # no session cookie, no session read
+        assert 'Cookie' not in response.headers.get('Vary', '')
+
+
+def test_pages_of_clients_with_a_session_are_private(app, client, seed):
+    seed()
+    client.set_cookie(app.config['SESSION_COOKIE_NAME'], 'unsigned')
+    for url in LISTINGS + ['/venues/1']:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_unchanged_listing_is_not_modified_since(app, client, seed):
+    seed()
+    response = client.get('/artists')
+    with app.app_context():
+        updated_at = db.session.get(TableVersion, 'Artist').updated_at
+    # a naive local time, sent in UTC
+    assert response.last_modified == updated_at.astimezone(timezone.utc).replace(microsecond=0)
+    last_modified = response.headers['Last-Modified']
+    assert client.get('/artists', headers={'If-Modified-Since': last_modified}).status_code == 304
+    # If-None-Match takes precedence
+    assert client.get('/artists', headers={
+        'If-Modified-Since': last_modified, 'If-None-Match': '"stale"'}).status_code == 200
+    assert client.get('/artists', headers={
+        'If-Modified-Since': 'Sat, 01 Jan 2000 00:00:00 GMT'}).status_code == 200
+
+
+def test_form_writes_change_the_etags(client, seed):
+    seed()
+    before = etags(client)
+    client.post('/artists/1/edit', data={
+        'name': 'Renamed', 'city': 'Austin', 'state': 'TX', 'phone': '512-555-0100',
+        'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/renamed'},
+        follow_redirects=True)  # renders the flashed message
+    after = etags(client)
+    assert after['/artists'] != before['/artists']
+    assert after['/shows'] != before['/shows']
+    assert after['/venues'] == before['/venues']
+
+
+def test_bulk_writes_change_the_etags(app, client, seed):
+    seed()
+    before = etags(client)
+    response = client.post('/shows/bulk', data=json.dumps(
+        [{'venue_id': 1, 'artist_id': 1, 'start_time': '2099-01-01T20:00:00'}]),
+        content_type='application/json')
+    assert response.status_code == 201
+    scheduled = etags(client)
+    assert scheduled['/shows'] != before['/shows']
+    assert scheduled['/venues'] != before['/venues']  # upcoming counts
+    app.config['ADMIN_TOKEN'] = 'secret'
+    try:
+        response = client.post('/admin/venues/delete', json={'ids': [1]},
+                               headers={'Authorization': 'Bearer secret'})
+    finally:
+        app.config['ADMIN_TOKEN'] = None
+    assert response.json['deleted'] == [1]
+    deleted = etags(client)
+    assert deleted['/shows'] != scheduled['/shows']
+    assert deleted['/venues'] != scheduled['/venues']
+
+
+def test_rolled_back_writes_do_not_bump(app, seed):
+    seed()
+    with app.app_context():
+        versions = dict(db.session.query(TableVersion.name, TableVersion.version))
+        artist = db.session.get(Artist, 1)
+        artist.name = 'Never saved'
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+        assert dict(db.session.query(TableVersion.name, TableVersion.version)) == versions
+
+
+def test_unchanged_detail_page_is_not_modified_without_reading_shows(client, seed, statements):
+    seed()
+    etag = client.get('/venues/1').headers['ETag']
+    with statements() as executed:
+        response = client.get('/venues/1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert len(executed) == 2 and not any('"Show"' in statement for statement in executed)
+
+
+def test_detail_etag_follows_the_shows_and_counterparts(app, client, seed):
+    seed()
+    etag = client.get('/venues/1').headers['ETag']
+    with app.app_context():
+        # a show in the past changes no counter
+        db.session.add(Show(venue_id=1, artist_id=2, start_time=datetime(2001, 1, 1, 20)))
+        db.session.commit()
+    past_show = client.get('/venues/1').headers['ETag']
+    assert past_show != etag
+    with app.app_context():
+        db.session.get(Artist, 2).name = 'Renamed'
+        db.session.commit()
+    assert client.get('/venues/1').headers['ETag'] != past_show
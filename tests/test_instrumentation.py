@@ -0,0 +1,14 @@
+"""
+Each request is logged on its own logger, not on app.logger whose file
+(error.log) is kept for warnings and errors.
+"""
+import json
+import logging
+
+
+def test_request_lines_have_their_own_logger(app, client, caplog):
+    with caplog.at_level(logging.INFO):
+        client.get('/venues')
+    lines = [record for record in caplog.records if record.getMessage().startswith('request ')]
+    assert [record.name for record in lines] == ['fyyur.requests']
+    assert json.loads(lines[0].getMessage()[len('request '):])['endpoint'] == 'venues'
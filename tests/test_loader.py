@@ -0,0 +1,84 @@
+"""
+populate_DB_init reports the records it can't load and goes on with the
+others.
+"""
+import io
+import json
+import os
+
+from models import db, Venue, Artist, Show
+from populate_DB_init import InvalidRecord, iter_json_array, load, read_records
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def venue(name):
+    return {'name': name, 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+            'phone': '512-555-0100', 'genres': ['Jazz']}
+
+
+def venue_names(app):
+    with app.app_context():
+        return {name for name, in db.session.query(Venue.name)}
+
+
+def test_malformed_ndjson_lines_are_invalid_records(app, tmp_path):
+    path = tmp_path / 'venues.ndjson'
+    path.write_text('\n'.join([json.dumps(venue('First')), '{"name": "Broken', '',
+                               json.dumps(['not', 'an', 'object']), json.dumps(venue('Last'))]))
+    with app.app_context():
+        assert load('venues', str(path), chunk_size=1) == (2, 0, 2)
+    assert venue_names(app) == {'First', 'Last'}
+
+
+def test_json_syntax_error_ends_the_source(app, tmp_path):
+    path = tmp_path / 'venues.json'
+    path.write_text(json.dumps([venue('First'), venue('Second')])[:-1] + ', {"name": }]')
+    records = list(read_records(str(path)))
+    assert [record['name'] for record in records[:2]] == ['First', 'Second']
+    assert isinstance(records[2], InvalidRecord) and len(records) == 3
+    with app.app_context():
+        assert load('venues', str(path), chunk_size=1) == (2, 0, 1)
+
+
+def test_json_array_split_across_reads():
+    values = [{'id': i, 'name': ' ' * i} for i in range(50)] + [12345, 'x']
+    text = json.dumps(values, indent=3)
+    assert list(iter_json_array(io.StringIO(text), buffer_size=7)) == values
+
+
+def test_bundled_sample_data_loads(app):
+    with app.app_context():
+        for entity in ('venues', 'artists', 'shows'):
+            inserted, skipped, invalid = load(entity, os.path.join(ROOT, f'{entity}.json'), chunk_size=1000)
+            assert inserted > 0 and skipped == invalid == 0
+        assert db.session.query(Show).count() == 7
+
+
+def test_reloading_rows_without_city_or_state_inserts_nothing(app, tmp_path):
+    path = tmp_path / 'artists.ndjson'
+    path.write_text('\n'.join(json.dumps(record) for record in [
+        {'name': 'Nowhere Band'}, {'name': 'Stateless Trio', 'city': 'Austin'}, {'name': 'Complete', 'city': 'Austin', 'state': 'TX'}]))
+    with app.app_context():
+        assert load('artists', str(path), chunk_size=10, validate_records=False) == (3, 0, 0)
+        assert load('artists', str(path), chunk_size=10, validate_records=False) == (0, 3, 0)
+        assert db.session.query(Artist).count() == 3
+
+
+def test_double_booked_shows_are_invalid(app, client, seed, tmp_path):
+    seed(num_venues=2, num_artists=2, shows_per_venue=0)
+    path = tmp_path / 'shows.ndjson'
+    path.write_text('\n'.join(json.dumps(record) for record in [
+        {'venue_id': 1, 'artist_id': 1, 'start_time': '2035-05-01T20:00:00'},
+        # the artist plays elsewhere at this time
+        {'venue_id': 2, 'artist_id': 1, 'start_time': '2035-05-01T21:00:00'},
+        {'venue_id': 9, 'artist_id': 2, 'start_time': '2035-05-01T20:00:00'},
+        {'venue_id': 2, 'artist_id': 2, 'start_time': '2035-05-01T20:00:00'}]))
+    with app.app_context():
+        assert load('shows', str(path), chunk_size=2) == (2, 0, 2)
+        assert load('shows', str(path), chunk_size=2) == (0, 2, 2)
+    # the scheduling sees the loaded shows
+    response = client.post('/shows/bulk', json=[
+        {'venue_id': 1, 'artist_id': 2, 'start_time': '2035-05-01T20:30:00'}])
+    assert response.status_code == 422
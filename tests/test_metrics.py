@@ -0,0 +1,70 @@
+"""
+/metrics serves the request, pool and cache metrics in the Prometheus text
+format, added up across the worker processes sharing a directory.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import metrics
+from metrics import ProcessFiles
+
+
+def scrape(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    samples, types = {}, {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('# TYPE '):
+            name, kind = line[len('# TYPE '):].split()
+            types[name] = kind
+        else:
+            sample, value = line.rsplit(' ', 1)
+            samples[sample] = float(value)
+    return samples, types
+
+
+def test_requests_pools_and_cache_are_exported(client, seed):
+    seed()
+    before, _ = scrape(client)
+    client.get('/venues/1')
+    client.get('/venues/1')
+    client.get('/nowhere')
+    samples, types = scrape(client)
+    requests = 'fyyur_requests_total{endpoint="show_venue",status="2xx"}'
+    assert samples[requests] - before.get(requests, 0) == 2
+    assert samples['fyyur_requests_total{endpoint="unmatched",status="4xx"}'] >= 1
+    assert samples['fyyur_request_duration_seconds_count{endpoint="show_venue"}'] >= 2
+    assert samples['fyyur_db_pool_checkouts_total{pool="primary"}'] > 0
+    for name in ('hits', 'misses', 'evictions'):
+        assert types[f'fyyur_cache_{name}_total'] == 'counter'
+    assert samples['fyyur_cache_hits_total{cache="detail"}'] >= 1
+    assert types['fyyur_cache_hit_ratio'] == 'gauge'
+    assert types['fyyur_request_duration_seconds'] == 'histogram'
+
+
+def test_workers_are_added_up(client, monkeypatch, tmp_path):
+    # an exited worker: its counters stay, its gauges go
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True).stdout.strip()
+    (tmp_path / f'{exited}.json').write_text(json.dumps({
+        'counters': [['fyyur_requests_total', [['endpoint', 'venues'], ['status', '2xx']], 40]],
+        'gauges': [['fyyur_requests_in_flight', [['endpoint', 'venues']], 3]],
+        'histograms': [],
+    }))
+    files = ProcessFiles(str(tmp_path), flush_interval=60)
+    monkeypatch.setattr(metrics, 'process_files', files)
+    before, _ = scrape(client)
+    client.get('/venues')
+    samples, _ = scrape(client)
+    requests = 'fyyur_requests_total{endpoint="venues",status="2xx"}'
+    assert before[requests] >= 40
+    assert samples[requests] - before[requests] == 1
+    assert samples.get('fyyur_requests_in_flight{endpoint="venues"}', 0) == 0
+    # the scraping process writes its own file for the others
+    files.write(metrics.process_snapshot)
+    counters = json.loads((tmp_path / f'{os.getpid()}.json').read_text())['counters']
+    assert ['fyyur_requests_total', [['endpoint', 'venues'], ['status', '2xx']],
+            samples[requests] - 40] in counters
@@ -0,0 +1,98 @@
+"""
+The detail, listing and search queries are served by the indexes of
+models.Show, Venue and Artist rather than by scans of the tables: checked
+with EXPLAIN QUERY PLAN on SQLite, and with EXPLAIN on Postgres when
+TEST_DATABASE_URL points to one.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, text, tuple_
+
+from app import show_projection
+from areas import directory
+from models import db, Venue, Artist, Show
+
+
+@pytest.fixture
+def dataset(app, seed):
+    seed(num_venues=200, num_artists=50, shows_per_venue=20)
+    with app.app_context():
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        yield db.engine.dialect.name
+
+
+def query_plan(query):
+    """
+    Returns:
+      str, the plan of the query, one line per step
+    """
+    statement = query.statement if hasattr(query, 'statement') else query
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', params)
+        return '\n'.join(row[0] for row in rows)
+    # plain values for the driver: the plan does not depend on them
+    params = tuple(
+        value.isoformat(' ') if isinstance(value, datetime) else value
+        for value in (params[name] for name in compiled.positiontup))
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+    return '\n'.join(row[-1] for row in rows)
+
+
+def listing_query():
+    return show_projection(tuple_(Show.start_time, Show.id) > (datetime.now(), 0)).limit(31)
+
+
+# query, index of Show it must use
+SHOW_QUERIES = {
+    'venue_detail': (lambda: show_projection(Show.venue_id == 7), 'ix_Show_venue_id_start_time'),
+    'artist_detail': (lambda: show_projection(Show.artist_id == 7), 'ix_Show_artist_id_start_time'),
+    'listing': (listing_query, 'ix_Show_start_time'),
+}
+
+
+@pytest.mark.parametrize('name', SHOW_QUERIES)
+def test_show_queries_use_indexes(dataset, name):
+    query, index = SHOW_QUERIES[name]
+    plan = query_plan(query())
+    assert index in plan, plan
+    if dataset == 'sqlite':
+        # the joined artist and venue are looked up by primary key, the
+        # index gives the rows in order
+        assert 'SCAN ' not in plan and 'TEMP B-TREE' not in plan, plan
+    else:
+        assert 'Seq Scan on "Show"' not in plan, plan
+
+
+def test_search_results_looked_up_by_primary_key(dataset):
+    if dataset != 'sqlite':
+        pytest.skip('SQLite ranks the names in memory, see search.TrigramIndex')
+    query = db.session.query(Venue.id, Venue.name, Venue.upcoming_show_count).filter(
+        Venue.id.in_([3, 5, 8]))
+    plan = query_plan(query)
+    assert 'SEARCH Venue USING INTEGER PRIMARY KEY' in plan, plan
+
+
+@pytest.mark.parametrize('model', [Venue, Artist])
+def test_search_uses_trigram_index(dataset, model):
+    if dataset != 'postgresql':
+        pytest.skip('needs Postgres (TEST_DATABASE_URL) and pg_trgm')
+    query = db.session.query(model.id, model.name).filter(
+        model.name.icontains('nue 1', autoescape=True)
+    ).order_by(func.similarity(model.name, 'nue 1').desc(), model.name, model.id).limit(50)
+    plan = query_plan(query)
+    assert f'ix_{model.__name__}_name_trgm' in plan, plan
+
+
+def test_directory_pages_use_the_area_index(dataset):
+    plan = query_plan(directory(('CA', 'San Francisco', 100)).limit(51))
+    assert 'ix_Venue_area' in plan, plan
+    if dataset == 'sqlite':
+        # the index gives the venues in order, their area by primary key
+        assert 'TEMP B-TREE' not in plan, plan
+    else:
+        assert 'Seq Scan on "Venue"' not in plan, plan
@@ -0,0 +1,84 @@
+"""
+Read-only pages read from one replica per request, picked among the
+replicas whose last background health check passed.
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+from cache import detail_cache
+from models import db
+from routing import ReplicaSet, replicas
+
+
+@pytest.fixture
+def replica_set(app, tmp_path):
+    """
+    Two replicas with the schema and the data of the primary
+    Returns:
+      ReplicaSet of the app, its first checks done
+    """
+    urls = [f"sqlite:///{tmp_path / f'replica{n}.db'}" for n in range(2)]
+    app.config['SQLALCHEMY_REPLICA_URIS'] = urls
+    app.extensions.pop('replicas', None)
+    try:
+        with app.app_context():
+            replica_set = replicas(app)
+            for engine in replica_set.engines:
+                db.metadata.create_all(engine)
+                replica_set.healthy(engine)
+            for thread in replica_set.checks.values():
+                thread.join()
+        yield replica_set
+    finally:
+        app.config['SQLALCHEMY_REPLICA_URIS'] = []
+        app.extensions.pop('replicas', None)
+
+
+def test_a_request_reads_from_a_single_replica(client, replica_set):
+    used = []
+    for engine in replica_set.engines:
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args, engine=engine: used.append(engine))
+    for _ in range(4):
+        used.clear()
+        assert client.get('/shows').status_code == 200
+        # the page and its ETag
+        assert len(used) == 2 and len(set(used)) == 1
+
+
+def test_health_checks_do_not_block_the_requests(replica_set, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_check(engine):
+        started.set()
+        release.wait()
+    monkeypatch.setattr(replica_set, 'check', slow_check)
+    monkeypatch.setattr(replica_set, 'health_check_interval', 0)
+    begin = time.monotonic()
+    # the last results are used while the new checks run
+    assert replica_set.pick() in replica_set.engines
+    assert time.monotonic() - begin < 0.5
+    assert started.wait(5)
+    release.set()
+
+
+def test_unreachable_replicas_are_skipped(tmp_path):
+    replica_set = ReplicaSet([f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"], {}, 10)
+    assert replica_set.pick() is None
+    for thread in replica_set.checks.values():
+        thread.join()
+    assert replica_set.pick() is None
+    assert replica_set.health[replica_set.engines[0]][0] is False
+
+
+def test_detail_pages_are_cached_from_the_primary(app, client, seed, replica_set):
+    seed()
+    # replicas still without the data: lagging
+    assert client.get('/shows').get_data(as_text=True).count('Venue 0') == 0
+    body = client.get('/venues/1').get_data(as_text=True)
+    assert 'Venue 0' in body
+    assert detail_cache.get(('venue', 1))['name'] == 'Venue 0'
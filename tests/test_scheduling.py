@@ -0,0 +1,135 @@
+"""
+Shows scheduled in bulk are checked for double bookings; on SQLite against
+the in-process calendar index, which follows the committed writes.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+import scheduling
+from http_cache import mark_written
+from models import db, Show
+from scheduling import IntervalTree, calendar_index
+
+
+def slot(days=30):
+    return (datetime.now().replace(microsecond=0) + timedelta(days=days)).isoformat()
+
+
+def schedule(client, *shows):
+    return client.post('/shows/bulk', json=list(shows))
+
+
+def test_double_booking_is_rejected(client, seed):
+    seed()
+    start = slot()
+    assert schedule(client, {'venue_id': 1, 'artist_id': 1, 'start_time': start}).status_code == 201
+    response = schedule(client, {'venue_id': 2, 'artist_id': 1, 'start_time': start})
+    assert response.status_code == 422
+
+
+def test_records_are_converted_strictly(app, client, seed):
+    seed()
+    start = datetime.now().replace(microsecond=0) + timedelta(days=30)
+    utc = start.astimezone(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+    response = schedule(client, {'venue_id': 1, 'artist_id': 1, 'start_time': utc},
+                        {'venue_id': 1.9, 'artist_id': 1, 'start_time': slot(40)},
+                        {'venue_id': 2, 'artist_id': True, 'start_time': slot(50)})
+    assert response.status_code == 422
+    assert response.json['errors'] == [
+        {'index': 1, 'error': 'invalid show: venue_id must be an integer'},
+        {'index': 2, 'error': 'invalid show: artist_id must be an integer'}]
+    # an explicit offset is converted to the stored local time
+    response = schedule(client, {'venue_id': 1, 'artist_id': 1, 'start_time': utc})
+    assert response.status_code == 201
+    assert response.json['shows'][0]['start_time'] == start.isoformat()
+    # the digits of a CSV
+    response = client.post('/shows/bulk', data=f'venue_id,artist_id,start_time\n2,2,{slot(60)}\n',
+                           content_type='text/csv')
+    assert response.status_code == 201
+
+
+def test_malformed_batches_get_json_errors(app, client):
+    response = client.post('/shows/bulk', data='not json', content_type='application/json')
+    assert response.status_code == 400
+    assert response.json == {'errors': [{'index': None, 'error': 'expected a JSON array or CSV of shows'}]}
+    response = schedule(client, *[{}] * (app.config['SHOWS_BULK_MAX'] + 1))
+    assert response.status_code == 400
+    assert response.json['errors'][0]['error'].startswith('at most')
+
+
+def test_deleted_venue_frees_the_artist(client, seed):
+    seed()
+    start = slot()
+    assert schedule(client, {'venue_id': 1, 'artist_id': 1, 'start_time': start}).status_code == 201
+    # the show goes with the venue
+    assert client.delete('/venues/1').json['success']
+    assert schedule(client, {'venue_id': 2, 'artist_id': 1, 'start_time': start}).status_code == 201
+
+
+def test_orm_writes_invalidate_the_calendar_on_commit(app, seed):
+    seed()
+    with app.app_context():
+        calendar_index.build()
+        db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime.now() + timedelta(days=60)))
+        db.session.flush()
+        # a rebuild now would read the shows without this one
+        assert not calendar_index.stale
+        db.session.commit()
+        assert calendar_index.stale
+
+
+def test_rows_changed_after_the_checks_report_the_constraint(client, seed, monkeypatch):
+    seed()
+    start = slot()
+    assert schedule(client, {'venue_id': 1, 'artist_id': 1, 'start_time': start}).status_code == 201
+    validate_shows = scheduling.validate_shows
+
+    def unchecked(records):
+        # the checks ran before a concurrent request changed the rows
+        rows, errors = validate_shows([dict(record, venue_id=2, artist_id=2) for record in records])
+        return [dict(row, venue_id=record['venue_id'], artist_id=record['artist_id'])
+                for row, record in zip(rows, records)], errors
+    monkeypatch.setattr(scheduling, 'validate_shows', unchecked)
+    deleted = schedule(client, {'venue_id': 999, 'artist_id': 2, 'start_time': start})
+    assert deleted.status_code == 422
+    assert 'deleted meanwhile' in deleted.json['errors'][0]['error']
+    duplicate = schedule(client, {'venue_id': 1, 'artist_id': 1, 'start_time': start})
+    assert duplicate.status_code == 422
+    assert 'scheduled meanwhile' in duplicate.json['errors'][0]['error']
+
+
+def test_interval_tree_matches_a_scan():
+    rng = random.Random(7)
+    base = datetime(2035, 1, 1)
+    intervals = []
+    for show_id in range(300):
+        start = base + timedelta(hours=rng.randrange(2000))
+        # a few shows longer than today's maximum duration
+        intervals.append((start, start + timedelta(hours=rng.choice([1, 2, 3, 200])), show_id))
+    tree = IntervalTree(sorted(intervals[:150]))
+    for interval in intervals[150:]:
+        tree.insert(interval)
+    for _ in range(500):
+        start = base + timedelta(hours=rng.randrange(2000))
+        end = start + timedelta(hours=rng.choice([1, 2]))
+        overlaps = [interval for interval in intervals if interval[0] < end and interval[1] > start]
+        assert tree.overlapping(start, end) == max(overlaps, default=None)
+
+
+def test_shows_written_by_another_process_are_checked(app, client, seed):
+    seed()
+    start = datetime.now().replace(microsecond=0) + timedelta(days=30)
+    assert schedule(client, {'venue_id': 1, 'artist_id': 1, 'start_time': start.isoformat()}).status_code == 201
+    with app.app_context():
+        # a Core insert from another connection: nothing invalidates the
+        # index of this process, only the Show table version moves
+        with db.engine.begin() as connection:
+            connection.execute(insert(Show), {'venue_id': 2, 'artist_id': 2, 'start_time': start,
+                                              'end_time': start + timedelta(hours=2)})
+            mark_written(connection, Show)
+    response = schedule(client, {'venue_id': 2, 'artist_id': 1, 'start_time': (start + timedelta(hours=3)).isoformat()})
+    assert response.status_code == 201
+    response = schedule(client, {'venue_id': 3, 'artist_id': 2, 'start_time': start.isoformat()})
+    assert response.status_code == 422
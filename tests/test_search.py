@@ -0,0 +1,46 @@
+"""
+The in-process trigram index used for the searches on SQLite follows the
+committed writes, ORM and Core alike.
+"""
+from models import db, Venue
+from populate_DB_init import insert_chunk, venue_row
+from search import fallback_indexes
+
+
+def search_names(client, kind, term):
+    body = client.post(f'/{kind}/search', data={'search_term': term}).get_data(as_text=True)
+    return body
+
+
+def test_finds_venues_inserted_by_the_loader(app, client, seed):
+    seed()
+    assert 'Loaded Hall' not in search_names(client, 'venues', 'Loaded')
+    with app.app_context():
+        insert_chunk(Venue, [venue_row({'name': 'Loaded Hall', 'city': 'Austin', 'state': 'TX'})],
+                     ('name', 'city', 'state'))
+    assert 'Loaded Hall' in search_names(client, 'venues', 'Loaded')
+
+
+def test_finds_venues_created_with_the_form(app, client, seed):
+    seed()
+    assert 'Form Hall' not in search_names(client, 'venues', 'Form')
+    client.post('/venues/create', data={
+        'name': 'Form Hall', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+        'phone': '512-555-0100', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/formhall'})
+    assert 'Form Hall' in search_names(client, 'venues', 'Form')
+
+
+def test_invalidation_during_build_is_not_lost(app, seed, monkeypatch):
+    seed()
+    index = fallback_indexes[Venue]
+    query = db.session.query
+
+    def query_then_invalidate(*args):
+        # a write committed while the names are read
+        rows = query(*args).all()
+        index.invalidate()
+        return rows
+    with app.app_context():
+        monkeypatch.setattr(db.session, 'query', query_then_invalidate)
+        index.build()
+    assert index.stale
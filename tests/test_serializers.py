@@ -0,0 +1,76 @@
+"""
+The compiled serializers convert instances and rows like a walk over the
+columns, and the JSON API returns the ?fields= selected, nested show
+fields included, rejecting unknown ones.
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+from models import db, Venue, Artist, Show
+from serializers import JSONProvider, columns, model_serializer, serializer
+
+
+def test_serializers_match_the_columns(app, seed):
+    seed()
+    with app.app_context():
+        for model in (Venue, Artist, Show):
+            for obj in db.session.query(model):
+                assert model_serializer(model)(obj) == {
+                    column.key: getattr(obj, column.key) for column in model.__table__.columns}
+        artist = db.session.get(Artist, 1)
+        assert serializer(())(artist) == {}
+        # a single key is not unpacked from a tuple
+        assert serializer(('name',))(artist) == {'name': 'Artist 0'}
+        assert serializer(('id', 'name'))(artist) == {'id': 1, 'name': 'Artist 0'}
+    assert serializer(('id', 'name')) is serializer(('id', 'name'))
+
+
+def test_dates_are_iso_8601(app):
+    when = datetime(2025, 9, 10, 21, 30)
+    encoded = JSONProvider(app).dumps({'start_time': when})
+    assert json.loads(encoded) == {'start_time': '2025-09-10T21:30:00'}
+
+
+def test_fields_select_the_columns(client, seed):
+    seed()
+    assert client.get('/api/v1/artists').json[0] == {'id': 1, 'name': 'Artist 0'}
+    # in the order of the columns, whatever the order asked
+    artists = client.get('/api/v1/artists?fields=city, id').json
+    assert [list(artist) for artist in artists] == [['id', 'city']] * 2
+    every = client.get('/api/v1/artists?fields=' + ','.join(columns(Artist))).json
+    assert list(every[0]) == list(columns(Artist))
+    venue = client.get('/api/v1/venues/1?fields=name').json
+    assert venue == {'name': 'Venue 0'}
+    areas = client.get('/api/v1/venues?fields=name').json
+    assert {venue['name'] for area in areas for venue in area['venues']} == {
+        'Venue 0', 'Venue 1', 'Venue 2'}
+
+
+def test_nested_show_fields(client, seed):
+    seed()
+    venue = client.get('/api/v1/venues/2?fields=id,upcoming_shows,upcoming_shows_count').json
+    assert set(venue) == {'id', 'upcoming_shows', 'upcoming_shows_count'}
+    assert venue['upcoming_shows_count'] == len(venue['upcoming_shows']) == 1
+    show, = venue['upcoming_shows']
+    assert list(show) == ['show_id', 'start_time', 'artist_id', 'artist_name', 'artist_image_link',
+                          'venue_id', 'venue_name', 'venue_image_link']
+    assert (show['venue_id'], show['venue_name']) == (2, 'Venue 1')
+    datetime.fromisoformat(show['start_time'])
+    assert set(client.get('/api/v1/artists/1?fields=past_shows_count').json) == {'past_shows_count'}
+    shows = client.get('/api/v1/shows?fields=venue_name,show_id').json
+    assert all(list(show) == ['show_id', 'venue_name'] for show in shows['data'])
+
+
+@pytest.mark.parametrize('url', [
+    '/api/v1/artists?fields=id,password',
+    '/api/v1/venues/1?fields=name,upcoming_shows.artist_name',
+    '/api/v1/shows?fields=show_id,nope',
+    '/api/v1/search?q=a&fields=id,genres',
+])
+def test_unknown_fields_are_rejected(client, seed, url):
+    seed()
+    response = client.get(url)
+    assert response.status_code == 400
+    assert 'unknown fields' in response.get_data(as_text=True)
@@ -0,0 +1,100 @@
+"""
+The upcoming show counters of venues and artists follow the shows written
+through the ORM, the bulk scheduling and the cascading deletes, are aged
+as shows start, and `show_counters.py check` finds and fixes the drift.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+import show_counters
+from models import db, Venue, Artist, Show
+
+
+def counters(model):
+    return {entity.id: (entity.upcoming_show_count, entity.next_show_at)
+            for entity in db.session.query(model)}
+
+
+def live_counters(model, now):
+    # the counters recomputed from the shows, in Python
+    upcoming = {entity.id: [] for entity in db.session.query(model)}
+    for show in db.session.query(Show):
+        if show.start_time >= now:
+            upcoming[show.venue_id if model is Venue else show.artist_id].append(show.start_time)
+    return {entity_id: (len(starts), min(starts, default=None)) for entity_id, starts in upcoming.items()}
+
+
+def assert_counters_are_live(now=None):
+    db.session.expire_all()
+    for model in (Venue, Artist):
+        assert counters(model) == live_counters(model, now or datetime.now())
+
+
+def test_inserted_and_deleted_shows_are_counted(app, client, seed):
+    seed()
+    later = datetime.now().replace(microsecond=0) + timedelta(days=30)
+    with app.app_context():
+        assert_counters_are_live()
+        db.session.add(Show(venue_id=2, artist_id=1, start_time=later))
+        db.session.commit()
+        assert_counters_are_live()
+        assert counters(Venue)[2][0] == 2
+    response = client.post('/shows/bulk', json=[
+        {'venue_id': 1, 'artist_id': 1, 'start_time': (later + timedelta(days=1)).isoformat()},
+        {'venue_id': 3, 'artist_id': 2, 'start_time': (later + timedelta(days=2)).isoformat()}])
+    assert response.status_code == 201
+    with app.app_context():
+        assert_counters_are_live()
+        # the database deletes the shows of the venue: its artists are recomputed
+        db.session.delete(db.session.get(Venue, 1))
+        db.session.commit()
+        assert_counters_are_live()
+    app.config['ADMIN_TOKEN'] = 'secret'
+    try:
+        response = client.post('/admin/artists/delete', json={'ids': [2]},
+                               headers={'Authorization': 'Bearer secret'})
+    finally:
+        app.config['ADMIN_TOKEN'] = None
+    assert response.json['deleted'] == [2]
+    with app.app_context():
+        assert_counters_are_live()
+        assert counters(Venue)[3] == (0, None)
+
+
+def test_started_shows_are_aged_out(app, seed):
+    seed()
+    with app.app_context():
+        # its show starts in three hours
+        venue = db.session.get(Venue, 2)
+        next_show_at, count = venue.next_show_at, venue.upcoming_show_count
+        assert count == 1
+        # the next show has started
+        now = next_show_at + timedelta(minutes=1)
+        with db.engine.begin() as connection:
+            assert show_counters.age_show_counters(connection, now) >= 2
+        assert_counters_are_live(now)
+        db.session.expire_all()
+        assert (venue.upcoming_show_count, venue.next_show_at) == (0, None)
+        # nothing else has started
+        with db.engine.begin() as connection:
+            assert show_counters.age_show_counters(connection, now) == 0
+
+
+def test_check_reports_and_fixes_the_drift(app, seed, capsys):
+    seed()
+    assert show_counters.main(['check']) == 0
+    with app.app_context():
+        db.session.execute(update(Venue).where(Venue.id == 2).values(upcoming_show_count=7))
+        db.session.execute(update(Artist).where(Artist.id == 1).values(next_show_at=None))
+        db.session.commit()
+    capsys.readouterr()
+    assert show_counters.main(['check']) == 1
+    out, err = capsys.readouterr()
+    assert out.startswith('Venue 2: count 7 != 1')
+    assert 'Artist 1: count' in out
+    assert '2 counters differ' in err
+    assert show_counters.main(['check', '--fix']) == 0
+    assert show_counters.main(['check']) == 0
+    with app.app_context():
+        assert_counters_are_live()
@@ -0,0 +1,44 @@
+"""
+The listing and detail pages send a fixed number of statements, however
+many venues, artists and shows there are (no N+1 queries).
+"""
+import pytest
+
+from cache import detail_cache
+
+PAGES = ['/venues', '/venues?per_page=1', '/artists', '/shows', '/venues/1', '/artists/1']
+# statements of one page, ETag included
+MAX_STATEMENTS = 4
+
+
+def page_statements(client, statements, url, cold=True):
+    if cold:
+        detail_cache.clear()
+    with statements() as executed:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(executed)
+
+
+@pytest.mark.parametrize('url', PAGES)
+def test_statements_do_not_grow_with_rows(client, seed, statements, url):
+    seed(num_venues=2, num_artists=2, shows_per_venue=2)
+    few = page_statements(client, statements, url)
+    seed(num_venues=40, num_artists=10, shows_per_venue=10)
+    many = page_statements(client, statements, url)
+    assert many == few
+    assert many <= MAX_STATEMENTS
+
+
+def test_venues_lists_every_venue_with_upcoming_shows(client, seed):
+    seed(num_venues=4, num_artists=2, shows_per_venue=4)
+    body = client.get('/venues').get_data(as_text=True)
+    for i in range(4):
+        assert f'Venue {i}' in body
+    assert 'San Francisco' in body and 'New York' in body
+
+
+def test_cached_detail_page_is_not_rebuilt(client, seed, statements):
+    seed()
+    first = page_statements(client, statements, '/venues/1')
+    assert page_statements(client, statements, '/venues/1', cold=False) < first
@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers.
+
+usage: FYYUR_ENV=production gunicorn wsgi:app
+
+gunicorn reads its settings from gunicorn.conf.py in this folder.
+"""
+import os
+
+# before the app (and config.py) is imported
+os.environ.setdefault('FYYUR_ENV', 'production')
+
+from app import app  # noqa: E402
+
+application = app